@@ -1,11 +1,25 @@
+import asyncio
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import Optional
 from app.core.report.report_builder import build_report, build_static_report
 from app.docker.client import get_docker_client
-from app.core.github_service import extract_repo_info, get_file_content, full_bulk_pr_workflow, find_all_dockerfiles
+from app.docker.image_cache import get_image_metadata_cache
+from app.docker.layer_index import get_host_layer_index
+from app.docker.pull_manager import get_pull_manager, PullError
+from app.core.security_scanner import reevaluate_known_images, newly_vulnerable
+from app.core.github_service import extract_repo_info, get_file_content, find_all_dockerfiles
+from app.core.pr_workflow import full_bulk_pr_workflow
 from fastapi import HTTPException
 from app.core.registry_service import scan_registry_image
+from app.api.jobs import dispatch_job, submit_job, stream_job
+from app.core.repo_scanner import annotate_github_report, scan_repository
+from app.api.sse import sse_event, sse_response
+from app.core.metrics_collector import get_metrics_collector
+from app.core.llm_providers import get_llm_router
+from app.core.prompt_builder import get_prompt_stats
+from app.core.layer_content import analyze_layer_contents
+from docker.errors import ImageNotFound
 
 router = APIRouter()
 
@@ -13,30 +27,26 @@ router = APIRouter()
 @router.get("/containers")
 def list_containers():
     client = get_docker_client()
-    containers = client.containers.list(all=True)
+    # One /containers/json call plus a cached /images/json index, joined in memory,
+    # instead of a lazy image inspect per container
+    containers = client.api.containers(all=True)
+    images = get_image_metadata_cache().lookup(client, {c.get("ImageID") for c in containers})
     results = []
 
     for c in containers:
         try:
-            # Optimize: Try to get size from attributes directly to avoid extra image fetch
-            image_size_mb = 0.0
-            try:
-                if hasattr(c.image, "attrs") and "Size" in c.image.attrs:
-                    image_size_mb = round(c.image.attrs["Size"] / (1024 * 1024), 2)
-                else:
-                    # Fallback if attrs missing
-                    img = client.images.get(c.image.id)
-                    image_size_mb = round(img.attrs["Size"] / (1024 * 1024), 2)
-            except: pass
-
-            # NOTE: We skip c.stats(stream=False) here because it is too slow (blocks for ~1s per container)
+            short_id = c["Id"][:12]
+            img = images.get(c.get("ImageID"), {})
+            names = c.get("Names") or []
+
+            # NOTE: We skip per-container stats here because they are too slow (block for ~1s per container)
             # Memory usage will be fetched only during deep analysis.
             results.append({
-                "id": c.short_id,
-                "name": c.name,
-                "image": c.image.tags[0] if (hasattr(c.image, "tags") and c.image.tags) else c.short_id,
-                "status": c.status,
-                "image_size_mb": image_size_mb,
+                "id": short_id,
+                "name": names[0].lstrip("/") if names else short_id,
+                "image": img["tags"][0] if img.get("tags") else short_id,
+                "status": c.get("State"),
+                "image_size_mb": round(img.get("size", 0) / (1024 * 1024), 2),
             })
 
         except Exception:
@@ -45,6 +55,40 @@ def list_containers():
     return results
 
 
+@router.get("/images/layers")
+def image_layers(remove: Optional[str] = None):
+    """
+    Host-wide layer sharing: per-image unique vs shared bytes, the most reused layers and totals.
+    `remove` (comma-separated image IDs or tags) adds the space freed by removing those images together.
+    """
+    client = get_docker_client()
+    index = get_host_layer_index()
+    result = dict(index.summary(client))
+    if remove:
+        result["removal"] = index.reclaimable(client, [r.strip() for r in remove.split(",") if r.strip()])
+    return result
+
+
+
+METRICS_STREAM_INTERVAL = 2.0
+
+@router.get("/containers/metrics")
+def container_metrics(history: bool = False):
+    """Live CPU/memory for every running container, from the background sampler."""
+    collector = get_metrics_collector()
+    return {"source": collector.source, "containers": collector.snapshot(history=history)}
+
+@router.get("/containers/metrics/stream")
+async def container_metrics_stream():
+    collector = get_metrics_collector()
+
+    async def stream():
+        while True:
+            yield sse_event({"source": collector.source, "containers": collector.snapshot()}, event="metrics")
+            await asyncio.sleep(METRICS_STREAM_INTERVAL)
+
+    return sse_response(stream())
+
 
 class RuntimeScanRequest(BaseModel):
     image: str
@@ -52,8 +96,48 @@ class RuntimeScanRequest(BaseModel):
     dockerfile_content: Optional[str] = None
 
 @router.post("/image/report")
-def image_report(request: RuntimeScanRequest):
-    return build_report(request.image, request.dockerfile_content, container_id=request.id)
+async def image_report(request: RuntimeScanRequest, wait: bool = True):
+    return await dispatch_job(
+        "image_report",
+        request.model_dump(),
+        lambda job: build_report(request.image, request.dockerfile_content, container_id=request.id, on_event=job.stage_event),
+        wait=wait,
+    )
+
+@router.post("/image/report/stream")
+def image_report_stream(request: RuntimeScanRequest):
+    """Like /image/report, as SSE: stage progress plus the AI answer as it is generated ("ai" / "partial" events)."""
+    return stream_job(submit_job(
+        "image_report_stream",
+        request.model_dump(),
+        lambda job: build_report(request.image, request.dockerfile_content, container_id=request.id,
+                                 on_event=job.stage_event, stream_ai=True),
+    ))
+
+
+class LayerContentRequest(BaseModel):
+    image: str
+
+@router.post("/image/layers/contents")
+async def image_layer_contents(request: LayerContentRequest, wait: bool = True):
+    """Streams the image archive and reports cache files, deleted/shadowed files and duplicates per layer."""
+    def run(job):
+        try:
+            return analyze_layer_contents(
+                get_docker_client(),
+                request.image,
+                on_progress=lambda info: job.stage_event("layers", "progress", info),
+            )
+        except ImageNotFound:
+            raise HTTPException(status_code=404, detail=f"Image {request.image} not found")
+
+    return await dispatch_job("layer_contents", request.model_dump(), run, wait=wait)
+
+
+@router.get("/llm/status")
+def llm_status():
+    """Provider circuit states and cumulative prompt-compaction savings."""
+    return {"providers": get_llm_router().status(), "prompts": get_prompt_stats()}
 
 
 class DockerfileRequest(BaseModel):
@@ -63,6 +147,14 @@ class DockerfileRequest(BaseModel):
 def analyze_dockerfile(request: DockerfileRequest):
     return build_static_report(request.content)
 
+@router.post("/analyze-dockerfile/stream")
+def analyze_dockerfile_stream(request: DockerfileRequest):
+    return stream_job(submit_job(
+        "analyze_dockerfile_stream",
+        request.model_dump(),
+        lambda job: build_static_report(request.content, on_event=job.stage_event, stream_ai=True),
+    ))
+
 
 class GitHubScanRequest(BaseModel):
     url: str
@@ -70,7 +162,15 @@ class GitHubScanRequest(BaseModel):
     token: Optional[str] = None
 
 @router.post("/scan-github")
-def scan_github(request: GitHubScanRequest):
+async def scan_github(request: GitHubScanRequest, wait: bool = True):
+    return await dispatch_job(
+        "scan_github",
+        request.model_dump(),
+        lambda job: _scan_github(request, on_event=job.stage_event),
+        wait=wait,
+    )
+
+def _scan_github(request: GitHubScanRequest, on_event=None):
     owner, repo, branch = extract_repo_info(request.url)
     if not owner or not repo:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL")
@@ -80,7 +180,7 @@ def scan_github(request: GitHubScanRequest):
     token = request.token
     if not path:
         # Discovery Phase
-        all_paths = find_all_dockerfiles(owner, repo, token=token)
+        all_paths = find_all_dockerfiles(owner, repo, token=token, ref=branch)
         if not all_paths:
             raise HTTPException(status_code=404, detail="No Dockerfile found in repository")
         
@@ -96,30 +196,45 @@ def scan_github(request: GitHubScanRequest):
         path = all_paths[0]
 
     # 2. Analyze the specific path
-    content = get_file_content(owner, repo, path, token=token)
+    content = get_file_content(owner, repo, path, token=token, ref=branch)
     if not content:
         raise HTTPException(status_code=404, detail=f"Failed to fetch Dockerfile at {path}")
     
     # Use the unified static report builder (includes Trivy + AI)
-    report = build_static_report(content)
+    report = build_static_report(content, on_event=on_event)
     
     # Add GitHub metadata to the report
-    report.update({
-        "owner": owner,
-        "repo": repo,
-        "branch": branch,
-        "path": path,
-        "original_content": content,
-        "url": request.url,
-        "multi_service": False
-    })
-    
-    # Ensure ResultViewer can find the AI result
-    if "recommendation" in report:
-        rec = report["recommendation"]
-        report["optimization"] = rec.get("optimized_dockerfile") or rec.get("dockerfile")
-    
-    return report
+    return annotate_github_report(report, owner, repo, branch, path, content, request.url)
+
+class GitHubBulkScanRequest(BaseModel):
+    url: str
+    paths: Optional[list[str]] = None
+    token: Optional[str] = None
+    concurrency: Optional[int] = None
+
+@router.post("/scan-github/bulk")
+async def scan_github_bulk(request: GitHubBulkScanRequest, stream: bool = True):
+    """
+    Scans all (or the given) Dockerfiles of a repository in parallel waves.
+    Streams one SSE `file` event per Dockerfile as it completes, then a final `result`;
+    with ?stream=false returns the combined result as JSON.
+    """
+    owner, repo, branch = extract_repo_info(request.url)
+    if not owner or not repo:
+        raise HTTPException(status_code=400, detail="Invalid GitHub URL")
+
+    def run(job):
+        return scan_repository(
+            owner, repo, branch, request.url,
+            paths=request.paths,
+            token=request.token,
+            concurrency=request.concurrency,
+            on_result=lambda result: job.emit("file", result),
+        )
+
+    if not stream:
+        return await dispatch_job("scan_github_bulk", request.model_dump(), run)
+    return stream_job(submit_job("scan_github_bulk", request.model_dump(), run))
 
 class CreateBulkPRRequest(BaseModel):
     url: str
@@ -131,29 +246,86 @@ class CreateBulkPRRequest(BaseModel):
     token: Optional[str] = None
 
 @router.post("/create-bulk-pr")
-def create_bulk_pr(request: CreateBulkPRRequest):
+async def create_bulk_pr(request: CreateBulkPRRequest, wait: bool = True):
     owner, repo, branch = extract_repo_info(request.url)
     if not owner or not repo:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL")
-    
-    try:
-        pr_link = full_bulk_pr_workflow(
-            owner=owner,
-            repo=repo,
-            updates=request.updates,
-            branch_name=request.branch_name,
-            base_branch=request.base_branch,
-            pr_title=request.pr_title,
-            commit_message=request.commit_message,
-            token=request.token
-        )
-        return {"message": f"Successfully created PR: {pr_link}" if "github.com" in pr_link else pr_link}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    def run(job):
+        try:
+            pr_link = full_bulk_pr_workflow(
+                owner=owner,
+                repo=repo,
+                updates=request.updates,
+                branch_name=request.branch_name,
+                base_branch=request.base_branch,
+                pr_title=request.pr_title,
+                commit_message=request.commit_message,
+                token=request.token,
+                on_event=job.stage_event,
+            )
+            return {"message": f"Successfully created PR: {pr_link}" if "github.com" in pr_link else pr_link}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return await dispatch_job("create_bulk_pr", request.model_dump(), run, wait=wait)
+
+class PullRequest(BaseModel):
+    image: str
+
+@router.post("/images/pull")
+async def pull_image(request: PullRequest, wait: bool = True):
+    """
+    Pulls an image through the shared pull manager. Concurrent pulls of the same image run once;
+    with wait=false, per-layer progress streams from /jobs/{id}/events as "pull" stage events.
+    """
+    def run(job):
+        try:
+            return get_pull_manager().pull(
+                request.image,
+                on_progress=lambda snapshot: job.stage_event("pull", "progress", {"pull": snapshot}),
+            )
+        except PullError as e:
+            status = 404 if "not found" in str(e).lower() else 500
+            raise HTTPException(status_code=status, detail=str(e))
+
+    return await dispatch_job("image_pull", request.model_dump(), run, wait=wait)
+
+@router.get("/images/pulls")
+def active_pulls():
+    """Progress of pulls currently in flight, by reference."""
+    return get_pull_manager().in_flight()
+
+@router.post("/security/reevaluate")
+async def security_reevaluate(force: bool = False, wait: bool = True):
+    """
+    Re-scans the stored SBOM of every known image against the current vulnerability DB
+    (no image layers are read). Cheap enough to schedule hourly; also runs on its own after a DB update.
+    """
+    def run(job):
+        try:
+            return reevaluate_known_images(
+                force=force,
+                on_progress=lambda info: job.stage_event("reevaluate", "progress", info),
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    return await dispatch_job("sbom_reevaluate", {"force": force}, run, wait=wait)
+
+@router.get("/security/newly-vulnerable")
+def security_newly_vulnerable():
+    """Images with vulnerabilities the current DB reports but the previous one didn't."""
+    return {"images": newly_vulnerable()}
 
 class RegistryScanRequest(BaseModel):
     image: str
 
 @router.post("/scan-registry")
-def scan_registry(request: RegistryScanRequest):
-    return scan_registry_image(request.image)
+async def scan_registry(request: RegistryScanRequest, wait: bool = True):
+    return await dispatch_job(
+        "scan_registry",
+        request.model_dump(),
+        lambda job: scan_registry_image(request.image, on_event=job.stage_event),
+        wait=wait,
+    )
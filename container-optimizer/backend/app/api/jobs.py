@@ -0,0 +1,69 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from app.api.sse import sse_event, sse_response
+from app.core.jobs import get_job_manager, QueueFullError
+
+router = APIRouter(prefix="/jobs")
+
+EVENT_POLL_INTERVAL = 0.25
+
+
+def submit_job(kind: str, payload: dict, fn):
+    try:
+        return get_job_manager().submit(kind, payload, fn)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+async def dispatch_job(kind: str, payload: dict, fn, wait: bool = True):
+    """
+    Runs fn(job) on the job pool.
+    wait=True keeps the classic request/response contract without tying up a request thread;
+    wait=False returns 202 with a job ID to poll (/jobs/{id}) or stream (/jobs/{id}/events).
+    """
+    job = submit_job(kind, payload, fn)
+
+    if not wait:
+        return JSONResponse(status_code=202, content={
+            **job.to_dict(include_result=False),
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+        })
+
+    # Shielded so a disconnecting client doesn't cancel a job other requests may share
+    return await asyncio.shield(asyncio.wrap_future(job.future))
+
+
+def _get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    return stream_job(_get_job(job_id))
+
+
+def stream_job(job):
+    """SSE response replaying a job's events from the start, ending with its final state."""
+    async def stream():
+        cursor = 0
+        while True:
+            events, finished = job.events_since(cursor)
+            for e in events:
+                yield sse_event(e, event=e["type"])
+            cursor += len(events)
+            if finished:
+                yield sse_event(job.to_dict(), event="result")
+                return
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    return sse_response(stream())
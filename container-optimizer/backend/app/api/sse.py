@@ -0,0 +1,17 @@
+import json
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(data, event: str = None) -> str:
+    """Formats one Server-Sent Events message."""
+    payload = json.dumps(data, default=str)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+def sse_response(generator) -> StreamingResponse:
+    return StreamingResponse(
+        generator,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
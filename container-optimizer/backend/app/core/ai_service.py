@@ -1,48 +1,30 @@
 import os
-import requests
+import copy
 import json
-from dotenv import load_dotenv
+from app.core.disk_cache import DiskCache
+from app.core.memo import content_hash
+from app.core.singleflight import SingleFlight
+from app.core.json_stream import JSONObjectStream
+from app.core.prompt_builder import build_prompt, PROMPT_TOKEN_BUDGET
+from app.core.llm_providers import get_llm_router, CircuitOpenError, GROQ_MODEL
 
-load_dotenv()
+# Completions are cached by a normalized hash of everything that shapes the prompt.
+# Bump PROMPT_VERSION whenever the system message below or prompt_builder's template changes.
+PROMPT_VERSION = "2"
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+_llm_cache = DiskCache(
+    "llm_response",
+    ttl=LLM_CACHE_TTL,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+)
+_inflight = SingleFlight()
 
-def optimize_with_ai(image_context: dict, dockerfile_content: str = None):
-    """
-    Calls Groq AI to perform deep optimization of a Dockerfile or Image.
-    """
-    if not GROQ_API_KEY:
-        raise Exception("GROQ_API_KEY not found in environment")
-
-    # Construct the prompt
-    prompt = f"""
-You are an expert Docker and DevSecOps engineer. Your task is to analyze a Docker image/Dockerfile and provide an industry-ready, SECURE, and OPTIMIZED replacement.
-
-### CONTEXT:
-Image: {image_context.get('image', 'unknown')}
-Detected Runtime: {image_context.get('runtime', 'unknown')}
-Misconfigurations Found: {json.dumps(image_context.get('misconfigurations', []), indent=2)}
-
-### ORIGINAL DOCKERFILE CONTENT (If provided):
-{dockerfile_content or "Not provided. Use image metadata and misconfigurations above."}
-
-### OUTPUT FORMAT:
-Your response must be a VALID JSON object with the following keys:
-- "optimized_dockerfile": The complete string of the new Dockerfile.
-- "dockerignore": Recommended .dockerignore content.
-- "explanation": An array of strings explaining the key changes.
-- "security_warnings": An array of specific security alerts discovered.
-
-DO NOT include any conversation or markdown outside the JSON object.
-"""
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    system_message = """You are a specialized Docker Optimization AI. You ONLY output valid JSON.
+SYSTEM_MESSAGE = """You are a specialized Docker Optimization AI. You ONLY output valid JSON.
 CRITICAL MANDATES for logic accuracy:
 1. TRUTHFULNESS: 
    - NEVER suggest a tool (curl, wget, ping) in a CMD or HEALTHCHECK unless you explicitly install it in the SAME stage using a package manager (apt/apk).
@@ -66,30 +48,181 @@ CRITICAL MANDATES for logic accuracy:
    - Prefix security warnings with: `[RUN_AS_ROOT]`, `[NO_VERSION_PINNING]`, `[MISSING_HEALTHCHECK]`, `[SECRET_EXPOSURE]`, `[DEV_SERVER_IN_PROD]`.
 """
 
-    payload = {
-        "model": "openai/gpt-oss-120b",
-        "messages": [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": prompt}
-        ],
+
+def normalize_dockerfile(content: str) -> str:
+    """Line endings and trailing whitespace don't change the request; drop them before hashing."""
+    if not content:
+        return ""
+    lines = [line.rstrip() for line in content.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return "\n".join(lines).strip()
+
+
+def llm_cache_key(image_context: dict, dockerfile_content: str = None, model: str = None) -> str:
+    """
+    Normalized key over (model, prompt, Dockerfile, misconfig set). Findings are treated as a set,
+    so the same issues reported in a different order still hit the same entry. `model` is the
+    model that answered (default: the primary provider's).
+    """
+    if model is None:
+        providers = get_llm_router().providers
+        model = providers[0].model if providers else GROQ_MODEL
+    return content_hash(model, _request_hash(image_context, dockerfile_content))
+
+
+def _request_hash(image_context: dict, dockerfile_content: str = None) -> str:
+    """Everything that shapes the prompt, independent of which model ends up answering it."""
+    misconfigs = sorted(
+        json.dumps(m, sort_keys=True, default=str) for m in image_context.get("misconfigurations", [])
+    )
+    return content_hash(
+        PROMPT_VERSION,
+        PROMPT_TOKEN_BUDGET,
+        content_hash(SYSTEM_MESSAGE),
+        image_context.get("image", "unknown"),
+        image_context.get("runtime", "unknown"),
+        normalize_dockerfile(dockerfile_content),
+        misconfigs,
+    )
+
+
+def _cache_lookup_models(router) -> list:
+    """
+    Models whose cached answers may serve a request: the primary's, plus the fallbacks' while
+    the primary's circuit isn't closed (the request would be answered by a fallback anyway).
+    """
+    models = []
+    for i, provider in enumerate(router.providers):
+        if i > 0 and router.breakers[router.providers[0].name].state == "closed":
+            break
+        if provider.model not in models:
+            models.append(provider.model)
+    return models
+
+
+def optimize_with_ai(image_context: dict, dockerfile_content: str = None, deadline: float = None):
+    """
+    Calls Groq AI to perform deep optimization of a Dockerfile or Image.
+    Identical requests are answered from the response cache, and concurrent identical
+    requests share a single upstream call. `deadline` (time.monotonic()) bounds retries and failover.
+    """
+    return _cached_completion(image_context, dockerfile_content, deadline=deadline)
+
+
+def optimize_with_ai_stream(image_context: dict, dockerfile_content: str = None, on_partial=None,
+                            deadline: float = None):
+    """
+    Same as optimize_with_ai, but the completion is streamed and parsed as it arrives:
+    on_partial(event) receives Dockerfile text line by line, each explanation / security
+    warning as soon as it is complete, and a "field" event when a key is finished
+    (see JSONObjectStream). Cached or coalesced results are replayed as "field" events.
+    """
+    return _cached_completion(image_context, dockerfile_content, on_partial=on_partial, deadline=deadline)
+
+
+def _cached_completion(image_context: dict, dockerfile_content: str = None, on_partial=None, deadline: float = None):
+    router = get_llm_router()
+    if not router.providers:
+        raise Exception("GROQ_API_KEY not found in environment")
+
+    if not LLM_CACHE_ENABLED:
+        return _request_completion(_prompt(image_context, dockerfile_content), on_partial=on_partial,
+                                   deadline=deadline)[0]
+
+    request = _request_hash(image_context, dockerfile_content)
+    try:
+        for model in _cache_lookup_models(router):
+            cached = _llm_cache.get(content_hash(model, request))
+            if cached is not None:
+                _replay(cached, on_partial)
+                return cached
+    except Exception as e:
+        print(f"LLM cache read failed: {e}")
+
+    ran = []
+
+    def call():
+        ran.append(True)
+        result, model = _request_completion(_prompt(image_context, dockerfile_content), on_partial=on_partial,
+                                            deadline=deadline)
+        # Filed under the model that actually answered, which may be a fallback's
+        try:
+            _llm_cache.set(content_hash(model, request), result, tag=model)
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+        return result
+
+    # Followers get their own copy so no caller can mutate another's result
+    result = copy.deepcopy(_inflight.do(request, call))
+    if not ran:
+        _replay(result, on_partial)
+    return result
+
+
+def _prompt(image_context: dict, dockerfile_content: str = None) -> str:
+    prompt, metrics = build_prompt(image_context, dockerfile_content)
+    if metrics["run_chains_collapsed"] or metrics["lines_trimmed"] or not metrics["within_budget"]:
+        print(f"Prompt compacted: {metrics['original_tokens']} -> {metrics['prompt_tokens']} tokens "
+              f"(budget {metrics['budget']}, {metrics['lines_trimmed']} lines trimmed)")
+    return prompt
+
+
+def _replay(result: dict, on_partial):
+    if on_partial:
+        for field, value in result.items():
+            on_partial({"type": "field", "field": field, "value": value})
+
+
+def _request_completion(prompt: str, on_partial=None, deadline: float = None):
+    """Returns (parsed answer, model of the provider that answered)."""
+    messages = [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+    options = {
         "temperature": 0.1,
         "response_format": {"type": "json_object"}
     }
 
     try:
-        response = requests.post(GROQ_URL, headers=headers, json=payload, timeout=30)
-        if response.status_code != 200:
-            print(f"Groq API Error Status: {response.status_code}")
-            print(f"Groq API Error Response: {response.text}")
-            response.raise_for_status()
-            
-        data = response.json()
-        
+        router = get_llm_router()
+        if on_partial is not None:
+            provider, chunks = router.open_stream(messages, deadline=deadline, **options)
+            return _parse_stream(chunks, on_partial), provider.model
+
         # Parse the JSON string from the AI response
-        ai_response_content = data['choices'][0]['message']['content']
-            
-        return json.loads(ai_response_content)
-        
+        provider, text = router.complete_with_provider(messages, deadline=deadline, **options)
+        return json.loads(text), provider.model
+
+    except CircuitOpenError:
+        # Provider known to be down: fail fast so the report falls back to the rule-based suggestion
+        raise
     except Exception as e:
-        print(f"Groq API Error: {e}")
+        print(f"LLM API Error: {e}")
         raise Exception(f"Failed to communicate with AI: {str(e)}")
+
+
+def _parse_stream(chunks, on_partial) -> dict:
+    """Parses the streamed answer as it arrives, forwarding completed pieces of the JSON object."""
+    parser = JSONObjectStream()
+    # Dockerfile/.dockerignore text is forwarded a line at a time rather than per token
+    pending = {}
+
+    def forward(event):
+        if event["type"] == "delta":
+            text = pending.get(event["field"], "") + event["text"]
+            cut = text.rfind("\n") + 1
+            if cut:
+                on_partial({"type": "delta", "field": event["field"], "text": text[:cut]})
+            pending[event["field"]] = text[cut:]
+            return
+        if pending.get(event["field"]):
+            on_partial({"type": "delta", "field": event["field"], "text": pending.pop(event["field"])})
+        on_partial(event)
+
+    for content in chunks:
+        for event in parser.feed(content):
+            forward(event)
+
+    if not parser.done:
+        raise ValueError("AI response stream ended before the JSON object was complete")
+    return parser.result
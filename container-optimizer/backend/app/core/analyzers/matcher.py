@@ -0,0 +1,34 @@
+import re
+
+
+class PatternMatcher:
+    """
+    Finds every literal pattern occurring in a text with a single scan.
+
+    All patterns are compiled once into one alternation inside a lookahead, so matches may
+    overlap and each start position is tried against all patterns in one pass of the regex
+    engine. Alternatives are ordered longest first; patterns that are a prefix of the one
+    matched at a position are added from a precomputed table, so nothing is shadowed.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+        self._regex = None
+        if self.patterns:
+            self._regex = re.compile("(?=(" + "|".join(re.escape(p) for p in self.patterns) + "))")
+        self._prefixes = {
+            p: [q for q in self.patterns if q != p and p.startswith(q)]
+            for p in self.patterns
+        }
+
+    def find(self, text: str) -> set:
+        """Set of patterns found in `text` (expected to be lowercased already)."""
+        found = set()
+        if self._regex is None or not text:
+            return found
+        for m in self._regex.finditer(text):
+            hit = m.group(1)
+            if hit not in found:
+                found.add(hit)
+                found.update(self._prefixes[hit])
+        return found
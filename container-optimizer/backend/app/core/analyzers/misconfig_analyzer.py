@@ -1,132 +1,122 @@
+from app.core.analyzers.rules import LayerRule, ImageRule, RuleSet
+
+# Bump whenever rules are added or changed so memoized rule results are recomputed
+RULESET_VERSION = "3"
+
+HEAVY_BASE_FAMILIES = ["ubuntu", "debian", "fedora", "centos"]
+BUILD_TOOL_PACKAGES = ["gcc", "build-essential", "make", "git"]
+EXPOSE_RANGE_LIMIT = 100
+
+
 def analyze_misconfig(image_analysis: dict, runtime_analysis: dict):
     """
     Detect Docker image misconfigurations and bad practices.
+    All rules below are evaluated together in one pass over the layers (see rules.RuleSet).
     """
-    issues = []
-    layers = image_analysis.get("layers", [])
+    return MISCONFIG_RULES.evaluate(image_analysis, runtime_analysis)
 
-    def _get_clean_cmd(l):
-        cmd = (l.get("command") or "").lower()
-        return cmd.replace("#(nop)", "").strip()
 
-    # 1. Root user
+# 1. Root user
+def _run_as_root(image_analysis, runtime_analysis, scan):
     if runtime_analysis.get("runs_as_root"):
-        issues.append({
+        return {
             "id": "RUN_AS_ROOT",
             "severity": "HIGH",
             "message": "Container runs as root user",
             "recommendation": "Add a non-root USER in the Dockerfile."
-        })
+        }
+
 
-    # 2. Heavy base image
+# 2. Heavy base image
+def _heavy_base_image(image_analysis, runtime_analysis, scan):
     base_image = image_analysis.get("base_image", "")
-    if any(x in base_image.lower() for x in ["ubuntu", "debian", "fedora", "centos"]) and "slim" not in base_image.lower():
-        issues.append({
+    if any(x in base_image.lower() for x in HEAVY_BASE_FAMILIES) and "slim" not in base_image.lower():
+        return {
             "id": "HEAVY_BASE_IMAGE",
             "severity": "MEDIUM",
             "message": f"Heavy base image detected ({base_image})",
             "recommendation": "Use slim or alpine base images."
-        })
+        }
 
-    # 3. Multi-stage detection (static only check)
-    if image_analysis.get("is_static"):
-        stages = image_analysis.get("stages", [])
-        if len(stages) < 2:
-            issues.append({
-                "id": "SINGLE_STAGE",
-                "severity": "LOW",
-                "message": "Single stage build detected",
-                "recommendation": "Consider multi-stage builds to reduce image size."
-            })
 
-    # 4. Large layers (runtime only check)
-    if not image_analysis.get("is_static"):
-        large_layers = [l for l in layers if l.get("is_large")]
-        if large_layers:
-            issues.append({
-                "id": "NO_MULTI_STAGE",
-                "severity": "HIGH",
-                "message": "Large build layers detected in final image",
-                "recommendation": "Use multi-stage builds to exclude build tools."
-            })
+# 3. Multi-stage detection (static only check)
+def _single_stage(image_analysis, runtime_analysis, scan):
+    if image_analysis.get("is_static") and len(image_analysis.get("stages", [])) < 2:
+        return {
+            "id": "SINGLE_STAGE",
+            "severity": "LOW",
+            "message": "Single stage build detected",
+            "recommendation": "Consider multi-stage builds to reduce image size."
+        }
 
-    # 5. Build tools & Docker socket EXTREME risk
-    docker_socket_risk = False
-    for layer in layers:
-        cmd = _get_clean_cmd(layer)
-        
-        # Check for docker.sock mount in VOLUME or ENV
-        if "/var/run/docker.sock" in cmd:
-            docker_socket_risk = True
-            
-        if any(pkg in cmd for pkg in ["gcc", "build-essential", "make", "git"]) and not "curl" in cmd:
-            issues.append({
-                "id": "BUILD_TOOLS_PRESENT",
-                "severity": "HIGH",
-                "message": "Build tools present in final image",
-                "recommendation": "Install build tools only in builder stage."
-            })
-            break
 
-    if docker_socket_risk:
-        issues.append({
-            "id": "DOCKER_SOCKET_MOUNT",
+# 4. Large layers (runtime only check)
+def _large_layers(image_analysis, runtime_analysis, scan):
+    if not image_analysis.get("is_static") and any(l.get("is_large") for l in image_analysis.get("layers", [])):
+        return {
+            "id": "NO_MULTI_STAGE",
             "severity": "HIGH",
-            "message": "Exposure of /var/run/docker.sock detected",
-            "recommendation": "NEVER mount the Docker socket inside a container. This is an extreme security risk."
-        })
+            "message": "Large build layers detected in final image",
+            "recommendation": "Use multi-stage builds to exclude build tools."
+        }
+
+
+# 6. COPY . / (copying the whole context anywhere but the working directory)
+def _copy_all(args, found):
+    sources = [a for a in args.split() if not a.startswith("--")]
+    if len(sources) >= 2 and sources[0] == "." and sources[-1] not in (".", "./"):
+        return {
+            "id": "COPY_ALL",
+            "severity": "MEDIUM",
+            "message": "COPY . / used (potential large context)",
+            "recommendation": "Use .dockerignore and copy individual files."
+        }
 
-    # 6. COPY . /
-    for layer in layers:
-        cmd = _get_clean_cmd(layer)
-        if "copy . " in cmd and "copy . . " not in cmd: # Basic check
-            issues.append({
-                "id": "COPY_ALL",
-                "severity": "MEDIUM",
-                "message": "COPY . / used (potential large context)",
-                "recommendation": "Use .dockerignore and copy individual files."
-            })
-            break
 
-    # 7. Missing HEALTHCHECK
-    has_healthcheck = any("healthcheck" in _get_clean_cmd(l) for l in layers)
-    if not has_healthcheck:
-        issues.append({
+# 7. Missing HEALTHCHECK
+def _missing_healthcheck(image_analysis, runtime_analysis, scan):
+    if "HEALTHCHECK" not in scan["instructions"]:
+        return {
             "id": "MISSING_HEALTHCHECK",
             "severity": "LOW",
             "message": "No HEALTHCHECK instruction found",
             "recommendation": "Add a HEALTHCHECK for liveness monitoring."
-        })
-
-    # 8. Excessive EXPOSE range
-    for layer in layers:
-        cmd = _get_clean_cmd(layer)
-        if "expose" in cmd:
-            if "-" in cmd:
-                parts = cmd.split()
-                for p in parts:
-                    if "-" in p:
-                        try:
-                            start, end = map(int, p.split("-"))
-                            if end - start > 100:
-                                issues.append({
-                                    "id": "EXCESSIVE_EXPOSE",
-                                    "severity": "MEDIUM",
-                                    "message": f"Excessive port range exposed: {p}",
-                                    "recommendation": "Expose only the specific ports your application needs."
-                                })
-                        except ValueError: continue
-
-    # 9. Version pinning
+        }
+
+
+# 8. Excessive EXPOSE range
+def _excessive_expose(args, found):
+    issues = []
+    for p in args.split():
+        if "-" in p:
+            try:
+                start, end = map(int, p.split("-"))
+                if end - start > EXPOSE_RANGE_LIMIT:
+                    issues.append({
+                        "id": "EXCESSIVE_EXPOSE",
+                        "severity": "MEDIUM",
+                        "message": f"Excessive port range exposed: {p}",
+                        "recommendation": "Expose only the specific ports your application needs."
+                    })
+            except ValueError: continue
+    return issues
+
+
+# 9. Version pinning
+def _version_pinning(image_analysis, runtime_analysis, scan):
+    base_image = image_analysis.get("base_image", "")
     if "latest" in base_image.lower() or ":" not in base_image:
-        issues.append({
+        return {
             "id": "NO_VERSION_PINNING",
             "severity": "MEDIUM",
             "message": "Base image version not pinned (using 'latest')",
             "recommendation": "Pin specific version tags for reproducible builds."
-        })
+        }
+
 
-    # 10. Runtime Instance Checks
+# 10. Runtime Instance Checks
+def _runtime_instance(image_analysis, runtime_analysis, scan):
+    issues = []
     inst = runtime_analysis.get("instance", {})
     if inst:
         # Privileged mode
@@ -189,3 +179,41 @@ def analyze_misconfig(image_analysis: dict, runtime_analysis: dict):
                 })
 
     return issues
+
+
+# Registration order is the order issues are reported in
+MISCONFIG_RULES = RuleSet([
+    ImageRule("RUN_AS_ROOT", _run_as_root),
+    ImageRule("HEAVY_BASE_IMAGE", _heavy_base_image),
+    ImageRule("SINGLE_STAGE", _single_stage),
+    ImageRule("NO_MULTI_STAGE", _large_layers),
+    # 5. Build tools & Docker socket EXTREME risk
+    LayerRule(
+        "BUILD_TOOLS_PRESENT",
+        instructions={"RUN"},
+        patterns=BUILD_TOOL_PACKAGES,
+        exclude=["curl"],
+        issue={
+            "id": "BUILD_TOOLS_PRESENT",
+            "severity": "HIGH",
+            "message": "Build tools present in final image",
+            "recommendation": "Install build tools only in builder stage."
+        },
+    ),
+    # docker.sock in a VOLUME, ENV, RUN, ...
+    LayerRule(
+        "DOCKER_SOCKET_MOUNT",
+        patterns=["/var/run/docker.sock"],
+        issue={
+            "id": "DOCKER_SOCKET_MOUNT",
+            "severity": "HIGH",
+            "message": "Exposure of /var/run/docker.sock detected",
+            "recommendation": "NEVER mount the Docker socket inside a container. This is an extreme security risk."
+        },
+    ),
+    LayerRule("COPY_ALL", instructions={"COPY"}, check=_copy_all),
+    ImageRule("MISSING_HEALTHCHECK", _missing_healthcheck),
+    LayerRule("EXCESSIVE_EXPOSE", instructions={"EXPOSE"}, patterns=["-"], check=_excessive_expose, once=False),
+    ImageRule("NO_VERSION_PINNING", _version_pinning),
+    ImageRule("RUNTIME_INSTANCE", _runtime_instance),
+])
@@ -0,0 +1,143 @@
+from app.core.analyzers.matcher import PatternMatcher
+
+DOCKERFILE_KEYWORDS = {
+    "FROM", "RUN", "CMD", "LABEL", "MAINTAINER", "EXPOSE", "ENV", "ADD", "COPY", "ENTRYPOINT",
+    "VOLUME", "USER", "WORKDIR", "ARG", "ONBUILD", "STOPSIGNAL", "HEALTHCHECK", "SHELL",
+}
+_SHELL_PREFIX = "/bin/sh -c "
+# BuildKit appends this to every history entry; it is not part of the instruction
+_BUILDKIT_SUFFIX = "# buildkit"
+
+
+class LayerRule:
+    """
+    A check evaluated against single instructions during the shared pass.
+
+    - instructions: keywords the rule cares about (None = every instruction)
+    - patterns:     lowercase literals; the rule only fires on an instruction containing one of them
+    - exclude:      lowercase literals that suppress the rule for that instruction
+    - check:        optional check(args, found) -> issue, list of issues or None, for logic beyond
+                    matching (`args` is the lowercased instruction text after the keyword);
+                    without it, a match produces `issue`
+    - once:         stop evaluating the rule after its first issue
+    """
+
+    __slots__ = ("id", "instructions", "patterns", "exclude", "issue", "check", "once")
+
+    def __init__(self, id: str, issue: dict = None, instructions=None, patterns=(), exclude=(), check=None, once: bool = True):
+        self.id = id
+        self.issue = issue
+        self.instructions = frozenset(instructions) if instructions else None
+        self.patterns = frozenset(p.lower() for p in patterns)
+        self.exclude = frozenset(p.lower() for p in exclude)
+        self.check = check
+        self.once = once
+
+
+class ImageRule:
+    """
+    A check over the whole analysis, run after the instruction pass:
+    check(image_analysis, runtime_analysis, scan) -> issue, list of issues or None.
+    `scan` carries what the pass saw: {"instructions": set of keywords, "hits": {rule_id: [issues]}}.
+    """
+
+    __slots__ = ("id", "check")
+
+    def __init__(self, id: str, check):
+        self.id = id
+        self.check = check
+
+
+class RuleSet:
+    """
+    Evaluates a registry of rules with one pass over the layers.
+
+    Rules are indexed by the instruction they care about and every pattern of every rule is
+    compiled into a single matcher, so each instruction is cleaned and scanned exactly once
+    no matter how many rules exist. Issues are returned in registration order.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        layer_rules = [r for r in self.rules if isinstance(r, LayerRule)]
+        self._matcher = PatternMatcher(p for r in layer_rules for p in r.patterns | r.exclude)
+        self._any = tuple(r for r in layer_rules if r.instructions is None)
+        self._by_instruction = {}
+        for r in layer_rules:
+            for instruction in r.instructions or ():
+                self._by_instruction.setdefault(instruction, []).append(r)
+        self._candidates = {k: tuple(v) + self._any for k, v in self._by_instruction.items()}
+
+    def evaluate(self, image_analysis: dict, runtime_analysis: dict) -> list:
+        hits = {r.id: [] for r in self.rules}
+        finished = set()
+        seen = set()
+
+        for layer in image_analysis.get("layers", []):
+            instruction, args, text = split_instruction(layer)
+            seen.add(instruction)
+            candidates = self._candidates.get(instruction, self._any)
+            if not candidates:
+                continue
+
+            found = None
+            for rule in candidates:
+                if rule.id in finished:
+                    continue
+                if rule.patterns or rule.exclude:
+                    if found is None:
+                        found = self._matcher.find(text)
+                    if rule.patterns and found.isdisjoint(rule.patterns):
+                        continue
+                    if rule.exclude and not found.isdisjoint(rule.exclude):
+                        continue
+
+                issues = _as_list(rule.check(args, found or set()) if rule.check else rule.issue)
+                if issues:
+                    hits[rule.id].extend(issues)
+                    if rule.once:
+                        finished.add(rule.id)
+
+        scan = {"instructions": seen, "hits": hits}
+        for rule in self.rules:
+            if isinstance(rule, ImageRule):
+                hits[rule.id].extend(_as_list(rule.check(image_analysis, runtime_analysis, scan)))
+
+        return [dict(issue) for rule in self.rules for issue in hits[rule.id]]
+
+
+def split_instruction(layer: dict):
+    """
+    (KEYWORD, lowercased args, lowercased full text) for a static layer ("RUN apt-get ...")
+    or an image history entry ("/bin/sh -c #(nop)  EXPOSE 80", "RUN /bin/sh -c ... # buildkit").
+    """
+    cmd = (layer.get("command") or "").strip()
+    text = cmd.lower().replace("#(nop)", "").strip()
+    instruction = layer.get("instruction")
+
+    if instruction is None:
+        if text.endswith(_BUILDKIT_SUFFIX):
+            text = text[:-len(_BUILDKIT_SUFFIX)].rstrip()
+        rest = text
+        if rest.startswith(_SHELL_PREFIX):
+            rest = rest[len(_SHELL_PREFIX):].strip()
+            # Classic builder: metadata instructions are marked #(nop), everything else is a RUN
+            if "#(nop)" not in cmd.lower():
+                return "RUN", rest, text
+        word = rest.split(" ", 1)[0].upper()
+        if word in DOCKERFILE_KEYWORDS:
+            instruction = word
+        else:
+            # "|2 ARG=1 /bin/sh -c ..." and other shell forms recorded without a keyword
+            return "RUN", rest, text
+        text = rest
+
+    instruction = instruction.upper()
+    args = text[len(instruction):].strip() if text[:len(instruction)].upper() == instruction else text
+    return instruction, args, text
+
+
+def _as_list(result):
+    if not result:
+        return []
+    return result if isinstance(result, list) else [result]
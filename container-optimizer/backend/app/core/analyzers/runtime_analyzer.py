@@ -11,9 +11,7 @@ def analyze_runtime(image_ref: str, container_id: str = None):
         # fallback: try without tag
         image = client.images.get(image_ref.split(":")[0])
 
-    cfg = image.attrs.get("Config", {})
-    user = cfg.get("User", "root")
-    runs_as_root = user in ["", "0", "root"]
+    user, runs_as_root = _user_from_config(image.attrs.get("Config", {}))
 
     # 2. Container Instance Analysis (Deep Inspection)
     instance_info = {}
@@ -42,3 +40,18 @@ def analyze_runtime(image_ref: str, container_id: str = None):
         "runs_as_root": runs_as_root,
         "instance": instance_info
     }
+
+
+def analyze_registry_runtime(config: dict):
+    """Runtime analysis from a registry config blob; there is no container instance to inspect."""
+    user, runs_as_root = _user_from_config(config.get("config") or {})
+    return {
+        "user": user,
+        "runs_as_root": runs_as_root,
+        "instance": {}
+    }
+
+
+def _user_from_config(cfg: dict):
+    user = cfg.get("User", "root")
+    return user, user in ["", "0", "root"]
@@ -1,9 +1,9 @@
 from app.core.security_scanner import scan_image, scan_dockerfile
 
 
-def analyze_security(image_name: str):
+def analyze_security(image_name: str, digest: str = None):
     try:
-        scan = scan_image(image_name)
+        scan = scan_image(image_name, digest=digest)
         vulnerabilities = scan.get("vulnerabilities", [])
 
         severity_count = {}
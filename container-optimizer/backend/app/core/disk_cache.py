@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Optional
+
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "container-optimizer", "cache.db"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    tag         TEXT,
+    value       BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at);
+"""
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _connect(path: str):
+    """One shared connection (and lock) per database file."""
+    with _connections_lock:
+        if path not in _connections:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            _connections[path] = (conn, threading.Lock())
+        return _connections[path]
+
+
+class DiskCache:
+    """
+    Persistent key/value cache for JSON-serializable results, stored zlib-compressed in SQLite.
+
+    - ttl:        entries older than this many seconds are treated as missing (None = no expiry)
+    - max_entries / max_bytes: least-recently-used entries are evicted past these limits
+    - tag:        free-form version stamp per entry; `invalidate_tags_except` drops stale ones
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, path: str = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path or CACHE_DB_PATH
+
+    def get(self, key: str, tag: Optional[str] = None):
+        conn, lock = _connect(self.path)
+        now = time.time()
+        with lock:
+            row = conn.execute(
+                "SELECT value, tag, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, entry_tag, created_at = row
+            if (self.ttl is not None and now - created_at > self.ttl) or (tag is not None and entry_tag != tag):
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        return json.loads(zlib.decompress(value))
+
+    def set(self, key: str, value, tag: Optional[str] = None):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 6)
+        conn, lock = _connect(self.path)
+        now = time.time()
+        with lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, tag, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, tag, blob, len(blob), now, now),
+            )
+            self._evict(conn, now)
+
+    def delete(self, key: str):
+        conn, lock = _connect(self.path)
+        with lock:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def invalidate_tags_except(self, tag: str) -> int:
+        """Drops every entry in this namespace not stamped with `tag`. Returns the number removed."""
+        conn, lock = _connect(self.path)
+        with lock:
+            cur = conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND (tag IS NULL OR tag != ?)",
+                (self.namespace, tag),
+            )
+            return cur.rowcount
+
+    def keys(self) -> list:
+        conn, lock = _connect(self.path)
+        with lock:
+            rows = conn.execute("SELECT key FROM cache WHERE namespace = ?", (self.namespace,)).fetchall()
+        return [r[0] for r in rows]
+
+    def clear(self):
+        conn, lock = _connect(self.path)
+        with lock:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self, conn, now: float):
+        ns = self.namespace
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND created_at < ?", (ns, now - self.ttl))
+
+        if self.max_entries is not None:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                "  SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (ns, ns, self.max_entries),
+            )
+
+        if self.max_bytes is not None:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (ns,)).fetchone()[0]
+            if total > self.max_bytes:
+                # Walk from least recently used until we're back under budget
+                victims = []
+                for key, size in conn.execute(
+                    "SELECT key, size FROM cache WHERE namespace = ? ORDER BY accessed_at ASC", (ns,)
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((ns, key))
+                    total -= size
+                conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
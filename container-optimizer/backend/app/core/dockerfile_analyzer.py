@@ -1,57 +1,26 @@
-import re
+from app.core.dockerfile_parser import parse_dockerfile_cached
+
+# Bump whenever the parse output changes shape or semantics
+PARSER_VERSION = "3"
 
 def analyze_dockerfile_content(content: str):
     """
     Statically analyze Dockerfile content with support for line continuations and multi-stage builds.
+    Built on the shared AST from dockerfile_parser (comments, escape directive, heredocs, exec form).
     """
-    raw_lines = content.splitlines()
-    processed_lines = []
-    current_line = ""
-
-    # 1. Handle line continuations (\)
-    for line in raw_lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Remove inline comments but keep space for separator
-        if "#" in line:
-            line = line.split("#")[0].strip()
-            if not line: continue
-
-        if line.endswith("\\"):
-            current_line += line[:-1].strip() + " "
-        else:
-            current_line += line
-            processed_lines.append(current_line.strip())
-            current_line = ""
-
-    instructions = []
-    stages = []
-    
-    for line in processed_lines:
-        match = re.match(r"^([A-Z]+)\s+(.*)$", line, re.IGNORECASE)
-        if match:
-            instr = match.group(1).upper()
-            value = match.group(2)
-            instructions.append({"instruction": instr, "value": value})
-            
-            if instr == "FROM":
-                # Handle 'FROM image AS stage'
-                parts = value.split()
-                base = parts[0]
-                stage_name = None
-                if "as" in [p.lower() for p in parts]:
-                    idx = [p.lower() for p in parts].index("as")
-                    if len(parts) > idx + 1:
-                        stage_name = parts[idx + 1]
-                stages.append({"base": base, "name": stage_name})
+    ast = parse_dockerfile_cached(content)
+    stages = [
+        {"base": stage.base, "name": stage.name, "line": stage.line, "depends_on": stage.depends_on}
+        for stage in ast.stages
+    ]
 
     # Prepare "layers" format for compatibility with misconfig_analyzer
     layers = []
-    for inst in instructions:
+    for inst in ast.instructions:
         layers.append({
-            "command": f"{inst['instruction']} {inst['value']}",
+            "command": inst.command,
+            "instruction": inst.keyword,
+            "line": inst.line,
             "size_mb": 0.0,
             "is_large": False
         })
@@ -62,13 +31,12 @@ def analyze_dockerfile_content(content: str):
     # Detect user (check all stages but prioritize later instructions)
     user = "root"
     runs_as_root = True
-    for inst in reversed(instructions):
-        if inst["instruction"] == "USER":
-            user = inst["value"]
-            runs_as_root = user.lower() in ["root", "0", ""]
-            break
+    users = ast.find("USER")
+    if users:
+        user = users[-1].value
+        runs_as_root = user.lower() in ["root", "0", ""]
 
-    runtime = detect_runtime_from_content(content, instructions)
+    runtime = detect_runtime_from_content(content, ast.instructions)
 
     return {
         "is_static": True,
@@ -84,7 +52,8 @@ def analyze_dockerfile_content(content: str):
     }
 
 def detect_runtime_from_content(content: str, instructions: list):
-    content_lower = content.lower()
+    # Instruction text only (heredoc bodies included); a comment mentioning a language doesn't count
+    content_lower = "\n".join(inst.command for inst in instructions).lower() if instructions else content.lower()
     
     # 1. Python
     if any(x in content_lower for x in ["python", "pip", "requirements.txt", "poetry.lock"]):
@@ -0,0 +1,288 @@
+import re
+import json
+from typing import Optional
+from app.core.memo import LRUCache, content_hash
+
+DEFAULT_ESCAPE = "\\"
+# Instructions whose value may be a JSON array (exec form)
+EXEC_FORM_INSTRUCTIONS = {"RUN", "CMD", "ENTRYPOINT", "SHELL", "HEALTHCHECK", "COPY", "ADD", "VOLUME"}
+HEREDOC_INSTRUCTIONS = {"RUN", "COPY", "ADD"}
+
+_DIRECTIVE = re.compile(r"^#\s*([a-zA-Z][a-zA-Z0-9_-]*)\s*=\s*(.*?)\s*$")
+# Matched only at the start of an unquoted shell word (see _heredoc_markers)
+_HEREDOC = re.compile(r"<<(?!<)(-?)([\"']?)([A-Za-z_][A-Za-z0-9_.-]*)\2(?=[\s;&|>)]|$)")
+_FLAG = re.compile(r"^--([a-zA-Z][a-zA-Z0-9-]*)(?:=(\S*))?$")
+
+_parse_cache = LRUCache(maxsize=256)
+
+
+class Heredoc:
+    __slots__ = ("name", "body", "strip_tabs", "line")
+
+    def __init__(self, name: str, body: str, strip_tabs: bool, line: int):
+        self.name = name
+        self.body = body
+        self.strip_tabs = strip_tabs
+        self.line = line
+
+
+class Instruction:
+    """
+    One Dockerfile instruction.
+    `value` is the text after the keyword with continuations joined; `args` is the parsed
+    JSON array for exec form, else None. `flags` holds leading --name=value options.
+    """
+
+    __slots__ = ("keyword", "value", "line", "end_line", "form", "args", "flags", "heredocs", "stage")
+
+    def __init__(self, keyword: str, value: str, line: int, end_line: int, stage: Optional[int]):
+        self.keyword = keyword
+        self.value = value
+        self.line = line
+        self.end_line = end_line
+        self.stage = stage
+        self.heredocs = []
+        self.flags = {}
+        self.form = None
+        self.args = None
+
+    @property
+    def command(self) -> str:
+        """The instruction as written (keyword + value), followed by any heredoc bodies."""
+        text = f"{self.keyword} {self.value}" if self.value else self.keyword
+        for doc in self.heredocs:
+            text += f"\n{doc.body}\n{doc.name}"
+        return text
+
+    @property
+    def body(self) -> str:
+        """Value without its leading flags."""
+        parts = self.value.split()
+        while parts and _FLAG.match(parts[0]):
+            parts.pop(0)
+        return " ".join(parts)
+
+
+class Stage:
+    __slots__ = ("index", "base", "name", "platform", "line", "parent", "instructions", "copies_from")
+
+    def __init__(self, index: int, base: str, name: Optional[str], platform: Optional[str], line: int):
+        self.index = index
+        self.base = base
+        self.name = name
+        self.platform = platform
+        self.line = line
+        # Index of an earlier stage this one is built FROM, if any
+        self.parent = None
+        self.instructions = []
+        # Indexes of earlier stages referenced by COPY --from
+        self.copies_from = set()
+
+    @property
+    def depends_on(self) -> list:
+        deps = set(self.copies_from)
+        if self.parent is not None:
+            deps.add(self.parent)
+        return sorted(deps)
+
+
+class DockerfileAST:
+    __slots__ = ("directives", "escape", "instructions", "stages", "global_args")
+
+    def __init__(self, directives: dict, escape: str):
+        self.directives = directives
+        self.escape = escape
+        self.instructions = []
+        self.stages = []
+        # ARGs declared before the first FROM
+        self.global_args = []
+
+    @property
+    def final_stage(self) -> Optional[Stage]:
+        return self.stages[-1] if self.stages else None
+
+    def find(self, *keywords) -> list:
+        keywords = {k.upper() for k in keywords}
+        return [i for i in self.instructions if i.keyword in keywords]
+
+    def stage_named(self, ref: str) -> Optional[Stage]:
+        ref = ref.lower()
+        for stage in self.stages:
+            if (stage.name and stage.name.lower() == ref) or str(stage.index) == ref:
+                return stage
+        return None
+
+
+def parse_dockerfile(content: str) -> DockerfileAST:
+    """
+    Single pass over the physical lines: parser directives, comments, line continuations
+    (honouring `# escape=`), heredocs, exec/shell form, flags and the stage graph.
+    """
+    lines = (content or "").splitlines()
+    directives = {}
+    n = len(lines)
+    i = 0
+
+    # 1. Parser directives: only at the very top, before any comment, blank line or instruction
+    while i < n:
+        m = _DIRECTIVE.match(lines[i].strip())
+        if not m or m.group(1).lower() in directives:
+            break
+        directives[m.group(1).lower()] = m.group(2)
+        i += 1
+
+    escape = directives.get("escape", DEFAULT_ESCAPE)
+    if escape not in ("\\", "`"):
+        escape = DEFAULT_ESCAPE
+    ast = DockerfileAST(directives, escape)
+
+    # 2. Instructions
+    while i < n:
+        stripped = lines[i].strip()
+        if not stripped or stripped.startswith("#"):
+            i += 1
+            continue
+
+        start = i
+        parts = []
+        while True:
+            line = lines[i].strip()
+            i += 1
+            # Comment and blank lines inside a continuation are dropped, as Docker does
+            if (not line or line.startswith("#")) and parts:
+                if i >= n:
+                    break
+                continue
+            if line.endswith(escape) and i < n:
+                parts.append(line[:-1].rstrip())
+                continue
+            parts.append(line[:-1].rstrip() if line.endswith(escape) else line)
+            break
+
+        logical = " ".join(p for p in parts if p)
+        keyword, _, value = logical.partition(" ")
+        keyword = keyword.upper()
+        value = value.strip()
+        instruction = Instruction(keyword, value, start + 1, i, ast.stages[-1].index if ast.stages else None)
+
+        if keyword in HEREDOC_INSTRUCTIONS and "<<" in value:
+            i = _read_heredocs(instruction, lines, i, escape)
+            instruction.end_line = i
+
+        _classify(instruction)
+        _attach(ast, instruction)
+
+    return ast
+
+
+def parse_dockerfile_cached(content: str) -> DockerfileAST:
+    """Shared parse for analyzers working on the same content. Treat the result as read-only."""
+    key = content_hash(content)
+    ast = _parse_cache.get(key)
+    if ast is None:
+        ast = parse_dockerfile(content)
+        _parse_cache.set(key, ast)
+    return ast
+
+
+def _read_heredocs(instruction: Instruction, lines: list, i: int, escape: str = DEFAULT_ESCAPE) -> int:
+    for m in _heredoc_markers(instruction.value, escape):
+        strip_tabs, name = m.group(1) == "-", m.group(3)
+        start = i
+        body = []
+        terminated = False
+        while i < len(lines):
+            line = lines[i]
+            i += 1
+            candidate = line.lstrip("\t") if strip_tabs else line
+            if candidate.rstrip() == name:
+                terminated = True
+                break
+            body.append(candidate)
+        if not terminated:
+            # Not a heredoc after all: the following lines are instructions, not a body
+            return start
+        instruction.heredocs.append(Heredoc(name, "\n".join(body), strip_tabs, start + 1))
+    return i
+
+
+def _heredoc_markers(value: str, escape: str = DEFAULT_ESCAPE) -> list:
+    """`<<NAME` / `<<-NAME` / `<<"NAME"` words outside quotes; `echo "<<EOF"` or `a<<b` aren't heredocs."""
+    markers = []
+    quote = None
+    j = 0
+    while j < len(value):
+        c = value[j]
+        if c == escape and quote != "'":
+            j += 2
+            continue
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == "<" and (j == 0 or value[j - 1].isspace()):
+            m = _HEREDOC.match(value, j)
+            if m:
+                markers.append(m)
+                j = m.end()
+                continue
+        j += 1
+    return markers
+
+
+def _classify(instruction: Instruction):
+    value = instruction.value
+    tokens = value.split()
+    for token in tokens:
+        m = _FLAG.match(token)
+        if not m:
+            break
+        instruction.flags[m.group(1).lower()] = m.group(2) if m.group(2) is not None else True
+
+    if instruction.keyword not in EXEC_FORM_INSTRUCTIONS:
+        return
+    body = instruction.body
+    if instruction.keyword == "HEALTHCHECK" and body[:4].upper() == "CMD ":
+        body = body[4:].lstrip()
+    if body.startswith("["):
+        try:
+            args = json.loads(body)
+        except ValueError:
+            args = None
+        if isinstance(args, list) and all(isinstance(a, str) for a in args):
+            instruction.form = "exec"
+            instruction.args = args
+            return
+    instruction.form = "shell"
+
+
+def _attach(ast: DockerfileAST, instruction: Instruction):
+    ast.instructions.append(instruction)
+
+    if instruction.keyword == "FROM":
+        # FROM [--platform=...] image [AS name]
+        parts = instruction.body.split()
+        base = parts[0] if parts else "unknown"
+        name = parts[2] if len(parts) >= 3 and parts[1].lower() == "as" else None
+        stage = Stage(len(ast.stages), base, name, instruction.flags.get("platform"), instruction.line)
+        parent = ast.stage_named(base)
+        if parent is not None:
+            stage.parent = parent.index
+        ast.stages.append(stage)
+        instruction.stage = stage.index
+        stage.instructions.append(instruction)
+        return
+
+    if not ast.stages:
+        if instruction.keyword == "ARG":
+            ast.global_args.append(instruction)
+        return
+
+    stage = ast.stages[-1]
+    stage.instructions.append(instruction)
+    source = instruction.flags.get("from")
+    if instruction.keyword in ("COPY", "ADD") and isinstance(source, str):
+        ref = ast.stage_named(source)
+        if ref is not None and ref.index != stage.index:
+            stage.copies_from.add(ref.index)
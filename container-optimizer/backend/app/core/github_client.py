@@ -0,0 +1,191 @@
+import os
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from typing import Optional
+from app.core.memo import LRUCache
+
+GITHUB_API = "https://api.github.com"
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "16"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "1024"))
+# Cached response bodies per client are kept under this many bytes; larger bodies aren't cached at all
+GITHUB_ETAG_CACHE_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_BYTES", str(32 * 1024 * 1024)))
+GITHUB_ETAG_MAX_BODY = int(os.getenv("GITHUB_ETAG_MAX_BODY", str(1024 * 1024)))
+# Clients (one session + ETag cache each) kept for this many tokens, each for at most GITHUB_CLIENT_TTL seconds
+GITHUB_CLIENT_CACHE_SIZE = int(os.getenv("GITHUB_CLIENT_CACHE_SIZE", "32"))
+GITHUB_CLIENT_TTL = float(os.getenv("GITHUB_CLIENT_TTL", "3600"))
+# Never sleep longer than this waiting for a rate-limit window to reset; fail instead
+GITHUB_MAX_RATE_LIMIT_WAIT = float(os.getenv("GITHUB_MAX_RATE_LIMIT_WAIT", "60"))
+# Below this fraction of the hourly budget, requests are spread out until the reset
+RATE_LIMIT_SLOWDOWN_RATIO = 0.05
+MAX_RETRIES = 3
+
+
+class RateLimitExceeded(RuntimeError):
+    pass
+
+
+class GitHubClient:
+    """
+    GitHub REST/GraphQL client for one token.
+
+    - keep-alive connection pool shared by every call made with this token
+    - conditional GETs: responses are cached with their ETag and revalidated with
+      If-None-Match; a 304 is served from cache and doesn't count against the rate limit
+    - tracks X-RateLimit-* headers, paces requests when the budget runs low and
+      backs off on 403/429 rate-limit responses and transient 5xx errors
+    """
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=GITHUB_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+
+        self._etags = LRUCache(maxsize=GITHUB_ETAG_CACHE_SIZE, max_bytes=GITHUB_ETAG_CACHE_BYTES,
+                               sizeof=lambda cached: len(cached["content"]))
+        self._rate_lock = threading.Lock()
+        self.rate_limit = {"limit": None, "remaining": None, "reset": None}
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, **kwargs)
+
+    def graphql(self, query: str, variables: dict = None) -> dict:
+        resp = self.post("/graphql", json={"query": query, "variables": variables or {}})
+        resp.raise_for_status()
+        return resp.json()
+
+    def request(self, method: str, path: str, headers: dict = None, **kwargs) -> requests.Response:
+        url = path if path.startswith("http") else f"{GITHUB_API}{path}"
+        headers = dict(headers or {})
+        kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+
+        cache_key = None
+        cached = None
+        if method == "GET":
+            cache_key = (url, headers.get("Accept"), repr(sorted((kwargs.get("params") or {}).items())))
+            cached = self._etags.get(cache_key)
+            if cached is not None:
+                headers["If-None-Match"] = cached["etag"]
+
+        for attempt in range(MAX_RETRIES + 1):
+            self._throttle()
+            try:
+                resp = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if method != "GET" or attempt == MAX_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+                continue
+
+            self._record_rate_limit(resp)
+
+            if resp.status_code == 304 and cached is not None:
+                return _from_cache(cached, url)
+
+            wait = self._retry_after(resp)
+            if wait is not None and attempt < MAX_RETRIES:
+                if wait > GITHUB_MAX_RATE_LIMIT_WAIT:
+                    raise RateLimitExceeded(f"GitHub rate limit exhausted, resets in {int(wait)}s")
+                time.sleep(wait)
+                continue
+
+            if resp.status_code >= 500 and method == "GET" and attempt < MAX_RETRIES:
+                time.sleep(2 ** attempt)
+                continue
+            break
+
+        if (cache_key is not None and resp.status_code == 200 and resp.headers.get("ETag")
+                and len(resp.content) <= GITHUB_ETAG_MAX_BODY):
+            self._etags.set(cache_key, {
+                "etag": resp.headers["ETag"],
+                "content": resp.content,
+                "headers": dict(resp.headers),
+            })
+        return resp
+
+    def _record_rate_limit(self, resp):
+        h = resp.headers
+        if "X-RateLimit-Remaining" not in h:
+            return
+        with self._rate_lock:
+            try:
+                self.rate_limit = {
+                    "limit": int(h.get("X-RateLimit-Limit", 0)),
+                    "remaining": int(h["X-RateLimit-Remaining"]),
+                    "reset": int(h.get("X-RateLimit-Reset", 0)),
+                }
+            except ValueError:
+                pass
+
+    def _retry_after(self, resp) -> Optional[float]:
+        """Seconds to wait before retrying a rate-limited response, or None if it isn't one."""
+        if resp.status_code not in (403, 429):
+            return None
+        if "Retry-After" in resp.headers:
+            try:
+                return float(resp.headers["Retry-After"])
+            except ValueError:
+                return 60.0
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            reset = int(resp.headers.get("X-RateLimit-Reset", 0))
+            return max(reset - time.time(), 0) + 1
+        return None
+
+    def _throttle(self):
+        with self._rate_lock:
+            limit, remaining, reset = self.rate_limit["limit"], self.rate_limit["remaining"], self.rate_limit["reset"]
+        if not limit or remaining is None or not reset:
+            return
+        window = reset - time.time()
+        if window <= 0 or remaining > limit * RATE_LIMIT_SLOWDOWN_RATIO:
+            return
+        # Spread the remaining budget across what's left of the window
+        delay = window / max(remaining, 1)
+        if delay > GITHUB_MAX_RATE_LIMIT_WAIT:
+            raise RateLimitExceeded(f"GitHub rate limit nearly exhausted, resets in {int(window)}s")
+        time.sleep(delay)
+
+
+def _from_cache(cached: dict, url: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = cached["content"]
+    resp.headers = CaseInsensitiveDict(cached["headers"])
+    resp.url = url
+    resp.encoding = "utf-8"
+    return resp
+
+
+# Keyed by a hash of the token so evicted or expired tokens aren't kept around as keys
+_clients = LRUCache(maxsize=GITHUB_CLIENT_CACHE_SIZE, ttl=GITHUB_CLIENT_TTL)
+_clients_lock = threading.Lock()
+
+
+def get_github_client(token: Optional[str] = None) -> GitHubClient:
+    """
+    Shared client (and connection pool / ETag cache) per token. None means the env GITHUB_TOKEN.
+    Only the most recently used tokens keep a client, and none past GITHUB_CLIENT_TTL; an evicted
+    client is dropped once its in-flight callers are done with it.
+    """
+    active_token = token or os.getenv("GITHUB_TOKEN")
+    key = hashlib.sha256(active_token.encode()).hexdigest() if active_token else None
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = GitHubClient(active_token)
+            _clients.set(key, client)
+        return client
@@ -1,12 +1,21 @@
-import requests
 import base64
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 from dotenv import load_dotenv
+from app.core.memo import LRUCache
+from app.core.github_client import get_github_client
+from app.core.repo_index import get_repo_index
 
 load_dotenv()
 
+GRAPHQL_BLOB_BATCH = 50
+BLOB_FETCH_CONCURRENCY = 8
+
+# Git blobs are content-addressed: a SHA always maps to the same bytes
+_blob_cache = LRUCache(maxsize=int(os.getenv("GITHUB_BLOB_CACHE_SIZE", "2048")))
+
 def get_token():
     return os.getenv("GITHUB_TOKEN")
 
@@ -29,54 +38,102 @@ def extract_repo_info(url: str) -> Tuple[Optional[str], Optional[str], Optional[
         return owner, repo, branch
     return None, None, None
 
-def get_headers(token: Optional[str] = None):
-    headers = {
-        "Accept": "application/vnd.github.v3+json"
-    }
-    # Priority: passed token > environment token
-    active_token = token or get_token()
-    if active_token:
-        headers["Authorization"] = f"token {active_token}"
-    return headers
-
-def find_all_dockerfiles(owner: str, repo: str, token: Optional[str] = None) -> list[str]:
+def find_all_dockerfiles(owner: str, repo: str, token: Optional[str] = None, ref: Optional[str] = None) -> list[str]:
     """
     Recursively searches for all Dockerfiles in a repository using the Trees API.
     Returns a list of paths.
     """
-    # 1. Get the default branch and its latest commit SHA
-    repo_url = f"https://api.github.com/repos/{owner}/{repo}"
-    repo_resp = requests.get(repo_url, headers=get_headers(token))
-    if repo_resp.status_code != 200:
-        return []
-    
-    default_branch = repo_resp.json().get("default_branch", "main")
-    
-    # 2. Get the recursive tree
-    # We use recursive=1 to get the entire tree in one go (limit 100k entries)
-    tree_url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/{default_branch}?recursive=1"
-    tree_resp = requests.get(tree_url, headers=get_headers(token))
-    
-    if tree_resp.status_code != 200:
-        return []
-
-    dockerfiles = []
-    tree_data = tree_resp.json()
-    for item in tree_data.get("tree", []):
-        if item["type"] == "blob" and item["path"].split("/")[-1].lower() == "dockerfile":
-            dockerfiles.append(item["path"])
-            
-    return sorted(dockerfiles)
+    return [entry["path"] for entry in find_dockerfile_entries(owner, repo, token=token, ref=ref)]
 
-            
+def find_dockerfile_entries(owner: str, repo: str, token: Optional[str] = None, ref: Optional[str] = None) -> list[dict]:
+    """
+    Like find_all_dockerfiles, but keeps the tree's blob metadata.
+    Matches every Dockerfile variant (Dockerfile, Dockerfile.prod, api.Dockerfile, *.dockerfile)
+    at `ref`, or on the default branch when no ref is given.
+    Returns a list of {"path", "sha", "size"} sorted by path.
+    """
+    index = get_repo_index(owner, repo, ref=ref, token=token)
+    return list(index.dockerfiles) if index else []
 
+def get_blobs(owner: str, repo: str, shas: list[str], token: Optional[str] = None) -> dict:
+    """
+    Fetches many text blobs at once. Returns {sha: text} for every blob that could be read.
 
-def get_file_content(owner: str, repo: str, path: str, token: Optional[str] = None) -> Optional[str]:
+    Blobs are immutable, so they're cached by SHA and never downloaded twice. Misses are
+    fetched with batched GraphQL queries when a token is available (GraphQL requires auth),
+    otherwise with parallel /git/blobs calls over the token's pooled client.
+    """
+    found = {}
+    missing = []
+    for sha in dict.fromkeys(shas):
+        text = _blob_cache.get(sha)
+        if text is not None:
+            found[sha] = text
+        else:
+            missing.append(sha)
+
+    if missing and (token or get_token()):
+        try:
+            fetched = _fetch_blobs_graphql(owner, repo, missing, token)
+        except Exception as e:
+            print(f"GraphQL blob fetch failed, falling back to REST: {e}")
+            fetched = {}
+        for sha, text in fetched.items():
+            _blob_cache.set(sha, text)
+            found[sha] = text
+        missing = [sha for sha in missing if sha not in fetched]
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(BLOB_FETCH_CONCURRENCY, len(missing))) as pool:
+            for sha, text in zip(missing, pool.map(lambda sha: _fetch_blob_rest(owner, repo, sha, token), missing)):
+                if text is not None:
+                    _blob_cache.set(sha, text)
+                    found[sha] = text
+
+    return found
+
+def _fetch_blobs_graphql(owner: str, repo: str, shas: list[str], token: Optional[str]) -> dict:
+    fetched = {}
+    for start in range(0, len(shas), GRAPHQL_BLOB_BATCH):
+        batch = shas[start:start + GRAPHQL_BLOB_BATCH]
+        fields = "\n".join(
+            f'b{i}: object(oid: "{sha}") {{ ... on Blob {{ text isBinary isTruncated }} }}'
+            for i, sha in enumerate(batch)
+            if re.fullmatch(r"[0-9a-f]{40}", sha)
+        )
+        if not fields:
+            # Nothing here looks like a blob SHA; an empty selection set isn't a valid query
+            continue
+        query = f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+        data = get_github_client(token).graphql(query, {"owner": owner, "name": repo})
+        repository = (data.get("data") or {}).get("repository") or {}
+        for i, sha in enumerate(batch):
+            obj = repository.get(f"b{i}")
+            # Large blobs come back truncated; leave those to the REST fallback for the full text
+            if obj and not obj.get("isBinary") and not obj.get("isTruncated") and obj.get("text") is not None:
+                fetched[sha] = obj["text"]
+    return fetched
+
+def _fetch_blob_rest(owner: str, repo: str, sha: str, token: Optional[str]) -> Optional[str]:
+    resp = get_github_client(token).get(f"/repos/{owner}/{repo}/git/blobs/{sha}")
+    if resp.status_code != 200:
+        return None
+    data = resp.json()
+    try:
+        if data.get("encoding") == "base64":
+            return base64.b64decode(data["content"]).decode("utf-8")
+        return data.get("content")
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def get_file_content(owner: str, repo: str, path: str, token: Optional[str] = None, ref: Optional[str] = None) -> Optional[str]:
     """
-    Fetches the content of a file from a GitHub repository.
+    Fetches the content of a file from a GitHub repository, at `ref` (branch, tag or
+    commit) or on the default branch when no ref is given.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-    response = requests.get(url, headers=get_headers(token))
+    params = {"ref": ref} if ref else None
+    response = get_github_client(token).get(f"/repos/{owner}/{repo}/contents/{path}", params=params)
     
     if response.status_code == 200:
         data = response.json()
@@ -94,130 +151,23 @@ def create_pull_request(owner: str, repo: str, title: str, body: str, head: str,
     if not active_token:
         raise Exception("GITHUB_TOKEN or user token is required to create a PR")
     
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
     payload = {
         "title": title,
         "body": body,
         "head": head,
         "base": base
     }
-    response = requests.post(url, headers=get_headers(token), json=payload)
+    response = get_github_client(token).post(f"/repos/{owner}/{repo}/pulls", json=payload)
     return response
 
-import time
-
 def get_authenticated_user(token: str) -> str:
     """Gets the login name of the authenticated user."""
-    url = "https://api.github.com/user"
-    resp = requests.get(url, headers=get_headers(token))
+    resp = get_github_client(token).get("/user")
     resp.raise_for_status()
     return resp.json()["login"]
 
 def fork_repo(owner: str, repo: str, token: Optional[str] = None):
     """Forks a repository."""
-    url = f"https://api.github.com/repos/{owner}/{repo}/forks"
-    resp = requests.post(url, headers=get_headers(token))
+    resp = get_github_client(token).post(f"/repos/{owner}/{repo}/forks")
     resp.raise_for_status()
     return resp.json()
-
-def full_bulk_pr_workflow(owner: str, repo: str, updates: list[dict], branch_name: str = "optimize-all-services", base_branch: str = None, pr_title: str = None, commit_message: str = None, token: Optional[str] = None):
-    """
-    Updates multiple files in a single commit and creates one PR.
-    updates: list of {"path": str, "content": str}
-    """
-    active_token = token or get_token()
-    if not active_token:
-        raise Exception("GITHUB_TOKEN or user token is required for this operation")
-
-    headers = get_headers(token)
-    current_user = get_authenticated_user(active_token)
-    
-    # 1. Check permissions & Fork if needed
-    repo_url = f"https://api.github.com/repos/{owner}/{repo}"
-    repo_resp = requests.get(repo_url, headers=headers)
-    repo_resp.raise_for_status()
-    repo_data = repo_resp.json()
-    
-    can_write = repo_data.get("permissions", {}).get("push", False)
-    default_branch = base_branch or repo_data["default_branch"]
-
-    target_owner = owner
-    if not can_write:
-        fork_repo(owner, repo)
-        target_owner = current_user
-        for i in range(5):
-             time.sleep(2)
-             if requests.get(f"https://api.github.com/repos/{target_owner}/{repo}", headers=headers).status_code == 200:
-                 break
-
-    # 2. Get Base Branch SHA
-    ref_url = f"https://api.github.com/repos/{target_owner}/{repo}/git/refs/heads/{default_branch}"
-    ref_resp = requests.get(ref_url, headers=headers)
-    if ref_resp.status_code != 200:
-        ref_resp = requests.get(f"https://api.github.com/repos/{owner}/{repo}/git/refs/heads/{default_branch}", headers=headers)
-    ref_resp.raise_for_status()
-    base_sha = ref_resp.json()["object"]["sha"]
-
-    # 3. Create Blobs & Tree
-    # We create a new tree starting from the base_sha's tree
-    # First, get the tree SHA of the base commit
-    commit_url = f"https://api.github.com/repos/{owner}/{repo}/git/commits/{base_sha}"
-    commit_resp = requests.get(commit_url, headers=headers)
-    commit_resp.raise_for_status()
-    base_tree_sha = commit_resp.json()["tree"]["sha"]
-
-    tree_items = []
-    for update in updates:
-        tree_items.append({
-            "path": update["path"],
-            "mode": "100644",
-            "type": "blob",
-            "content": update["content"]
-        })
-
-    # Create the new tree
-    create_tree_url = f"https://api.github.com/repos/{target_owner}/{repo}/git/trees"
-    tree_payload = {
-        "base_tree": base_tree_sha,
-        "tree": tree_items
-    }
-    tree_resp = requests.post(create_tree_url, headers=headers, json=tree_payload)
-    tree_resp.raise_for_status()
-    new_tree_sha = tree_resp.json()["sha"]
-
-    # 4. Create Commit
-    commit_payload = {
-        "message": commit_message or "Bulk optimization of multiple services",
-        "tree": new_tree_sha,
-        "parents": [base_sha]
-    }
-    commit_resp = requests.post(f"https://api.github.com/repos/{target_owner}/{repo}/git/commits", headers=headers, json=commit_payload)
-    commit_resp.raise_for_status()
-    new_commit_sha = commit_resp.json()["sha"]
-
-    # 5. Update or Create Branch Ref
-    ref_path = f"refs/heads/{branch_name}"
-    ref_url = f"https://api.github.com/repos/{target_owner}/{repo}/git/{ref_path}"
-    ref_check = requests.get(ref_url, headers=headers)
-    
-    if ref_check.status_code == 200:
-        # Update existing
-        requests.patch(ref_url, headers=headers, json={"sha": new_commit_sha, "force": True}).raise_for_status()
-    else:
-        # Create new
-        requests.post(f"https://api.github.com/repos/{target_owner}/{repo}/git/refs", headers=headers, json={"ref": ref_path, "sha": new_commit_sha}).raise_for_status()
-
-    # 6. Create PR
-    head_param = f"{target_owner}:{branch_name}" if target_owner != owner else branch_name
-    pr_resp = create_pull_request(
-        owner, repo,
-        title=pr_title or "✨ Bulk Service Optimization",
-        body="This Pull Request introduces security and performance optimizations across multiple services (frontend/backend) in the repository.",
-        head=head_param,
-        base=default_branch
-    )
-    
-    if pr_resp.status_code == 201:
-        return pr_resp.json()["html_url"]
-    else:
-        return pr_resp.json().get("errors", [{}])[0].get("message", "PR creation failed")
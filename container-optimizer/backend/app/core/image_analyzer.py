@@ -1,8 +1,6 @@
-import subprocess
 import docker
 from app.docker.client import get_docker_client
-
-LARGE_LAYER_THRESHOLD_MB = 50
+from app.core.layer_analyzer import analyze_layers, LARGE_LAYER_THRESHOLD_MB
 
 
 def analyze_image(image_ref: str):
@@ -15,37 +13,9 @@ def analyze_image(image_ref: str):
     image = resolve_image(client, image_ref)
 
     image_size_mb = round(image.attrs["Size"] / (1024 * 1024), 2)
-    image_id = image.id  # always safe
-
-    result = subprocess.run(
-        [
-            "docker",
-            "history",
-            image_id,
-            "--no-trunc",
-            "--format",
-            "{{.Size}}|{{.CreatedBy}}",
-        ],
-        capture_output=True,
-        text=True,
-        check=True,
-    )
-
-    layers = []
-    for line in result.stdout.strip().split("\n"):
-        if not line:
-            continue
-
-        size_str, command = line.split("|", 1)
-        size_mb = parse_size(size_str)
 
-        layers.append(
-            {
-                "command": command.strip(),
-                "size_mb": size_mb,
-                "is_large": size_mb >= LARGE_LAYER_THRESHOLD_MB,
-            }
-        )
+    # Exact sizes and layer digests straight from the Engine API (no `docker history` fork)
+    layers = analyze_layers(client, image)
 
     base_image = extract_base_image(layers)
     
@@ -54,7 +24,9 @@ def analyze_image(image_ref: str):
 
     return {
         "image": image_ref,
+        "image_id": image.id,
         "total_size_mb": image_size_mb,
+        "total_size_bytes": image.attrs["Size"],
         "layer_count": len(layers),
         "base_image": base_image,
         "layers": layers,
@@ -62,6 +34,49 @@ def analyze_image(image_ref: str):
     }
 
 
+def analyze_registry_image(metadata: dict):
+    """
+    Same shape as analyze_image, built from a registry manifest and config blob
+    (see registry_client.fetch_image_metadata) without pulling the image.
+    Sizes are the compressed layer sizes the registry stores.
+    """
+    config = metadata["config"]
+    blobs = metadata["layers"]
+    diff_ids = (config.get("rootfs") or {}).get("diff_ids") or []
+    # The config's history marks metadata-only entries explicitly, so no inference is needed
+    history = config.get("history") or [{} for _ in blobs]
+
+    layers = []
+    it = iter(zip(blobs, diff_ids))
+    for entry in history:
+        blob, diff_id = (None, None) if entry.get("empty_layer") else next(it, (None, None))
+        size_bytes = int(blob.get("size") or 0) if blob else 0
+        size_mb = round(size_bytes / (1024 * 1024), 2)
+        layers.append({
+            "command": (entry.get("created_by") or "").strip(),
+            "size_bytes": size_bytes,
+            "size_mb": size_mb,
+            "digest": diff_id,
+            "empty": blob is None,
+            "created": entry.get("created"),
+            "is_large": size_mb >= LARGE_LAYER_THRESHOLD_MB,
+        })
+    layers.reverse()
+
+    total_bytes = sum(int(b.get("size") or 0) for b in blobs)
+    return {
+        "image": metadata["reference"],
+        "image_id": metadata["image_id"],
+        "total_size_mb": round(total_bytes / (1024 * 1024), 2),
+        "total_size_bytes": total_bytes,
+        "size_is_compressed": True,
+        "layer_count": len(layers),
+        "base_image": extract_base_image(layers),
+        "layers": layers,
+        "runtime": detect_runtime_from_config(config.get("config") or {}, layers),
+    }
+
+
 def resolve_image(client: docker.DockerClient, image_ref: str):
     """
     Resolve image strictly from local Docker daemon.
@@ -75,21 +90,6 @@ def resolve_image(client: docker.DockerClient, image_ref: str):
         )
 
 
-def parse_size(size_str: str) -> float:
-    size_str = size_str.strip()
-
-    if size_str == "0B":
-        return 0.0
-    if "kB" in size_str:
-        return round(float(size_str.replace("kB", "")) / 1024, 2)
-    if "MB" in size_str:
-        return float(size_str.replace("MB", ""))
-    if "GB" in size_str:
-        return float(size_str.replace("GB", "")) * 1024
-
-    return 0.0
-
-
 def extract_base_image(layers):
     for layer in reversed(layers):
         cmd = layer["command"]
@@ -115,8 +115,11 @@ def detect_runtime(image, layers):
     2. Commands in layers
     3. File system hits (if we were to explore, but here we stick to metadata)
     """
-    config = image.attrs.get("Config", {})
-    env = config.get("Env", [])
+    return detect_runtime_from_config(image.attrs.get("Config", {}), layers)
+
+
+def detect_runtime_from_config(config: dict, layers):
+    env = config.get("Env") or []
     env_str = " ".join(env).lower()
     
     all_cmds = " ".join([l["command"] for l in layers]).lower()
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import hmac
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "32"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "900"))
+# Payload fields holding credentials: part of the dedupe key (a private repo's result must not be
+# shared across tokens), but only as a keyed hash so the key never carries or reveals the secret
+SECRET_FIELDS = ("token",)
+_SECRET_KEY = os.urandom(32)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def dedupe_key(kind: str, payload: dict) -> str:
+    payload = {
+        k: hmac.new(_SECRET_KEY, v.encode(), hashlib.sha256).hexdigest() if k in SECRET_FIELDS and isinstance(v, str) else v
+        for k, v in payload.items()
+    }
+    return kind + ":" + hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Job:
+    """A unit of long-running work (report, registry scan, ...) with a progress event log."""
+
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = Future()
+        self._events = []
+        self._lock = threading.Lock()
+
+    def emit(self, event_type: str, data: dict = None):
+        with self._lock:
+            self._events.append({"seq": len(self._events), "type": event_type, "time": time.time(), **(data or {})})
+
+    def set_status(self, status: str, **data):
+        # Status and its event change together so a streaming reader never sees one without the other
+        with self._lock:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in ("done", "error"):
+                self.finished_at = time.time()
+            self._events.append({"seq": len(self._events), "type": "status", "time": time.time(), "status": status, **data})
+
+    def stage_event(self, stage: str, status: str, info: dict):
+        """Adapter for the report pipeline's on_event hook."""
+        self.emit("stage", {"stage": stage, "status": status, **info})
+
+    def events_since(self, cursor: int):
+        with self._lock:
+            return self._events[cursor:], self.finished
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    def to_dict(self, include_result: bool = True):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result and self.status == "done":
+            data["result"] = self.result
+        if self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs jobs on a dedicated, bounded worker pool so slow scans never occupy the
+    request threadpool. Identical in-flight jobs (same kind + payload) are deduplicated.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, payload: dict, fn) -> Job:
+        """
+        Queue fn(job) for execution, or return the identical job already in flight.
+        Raises QueueFullError when more than workers + queue_limit jobs are pending.
+        """
+        key = dedupe_key(kind, payload)
+
+        with self._lock:
+            self._collect_expired()
+
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                return existing
+
+            if len(self._in_flight) >= self.workers + self.queue_limit:
+                raise QueueFullError("Too many scans in progress, please retry shortly")
+
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+
+        job.set_status("queued")
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn):
+        job.set_status("running")
+        try:
+            result = fn(job)
+        except Exception as e:
+            job.error = {
+                "status_code": getattr(e, "status_code", 500),
+                "detail": getattr(e, "detail", None) or str(e),
+            }
+            job.set_status("error", error=job.error)
+            job.future.set_exception(e)
+        else:
+            job.result = result
+            job.set_status("done")
+            job.future.set_result(result)
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _collect_expired(self):
+        cutoff = time.time() - JOB_RESULT_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
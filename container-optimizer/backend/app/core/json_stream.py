@@ -0,0 +1,195 @@
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = " \t\r\n"
+
+
+class JSONObjectStream:
+    """
+    Incremental parser for a single top-level JSON object arriving in arbitrary chunks.
+
+    feed() returns the events completed by that chunk:
+      {"type": "delta", "field": k, "text": s}          more of a top-level string value
+      {"type": "item",  "field": k, "index": i, "value": v}   one finished element of a top-level array
+      {"type": "field", "field": k, "value": v}          a top-level value is complete
+    Nested objects and scalars are buffered and decoded with json.loads once complete.
+    Anything before the opening brace (e.g. stray prose or a code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.result = {}
+        self.done = False
+        self._state = "start"
+        self._key = None
+        # string decoding (keys and top-level string values)
+        self._chars = []
+        self._value = []
+        self._escape = False
+        self._hex = None
+        self._high_surrogate = None
+        # raw value buffering (arrays, nested objects, numbers, literals)
+        self._raw = []
+        self._depth = 0
+        self._raw_in_string = False
+        self._raw_escape = False
+        self._items = []
+
+    def feed(self, chunk: str) -> list:
+        events = []
+        for ch in chunk:
+            if self.done:
+                break
+            self._step(ch, events)
+        # Surface the decoded part of a string value once per chunk rather than per character
+        if self._state == "string_value" and self._chars:
+            events.append({"type": "delta", "field": self._key, "text": "".join(self._chars)})
+            self._chars = []
+        return events
+
+    def _step(self, ch, events):
+        state = self._state
+
+        if state == "start":
+            if ch == "{":
+                self._state = "key_or_end"
+
+        elif state in ("key_or_end", "key"):
+            if ch == '"':
+                self._state = "key_string"
+                self._chars = []
+            elif ch == "}" and state == "key_or_end":
+                self.done = True
+            elif ch not in _WHITESPACE:
+                raise ValueError(f"Expected object key, got {ch!r}")
+
+        elif state == "key_string":
+            if self._read_string_char(ch):
+                self._key = "".join(self._chars)
+                self._chars = []
+                self._state = "colon"
+
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+            elif ch not in _WHITESPACE:
+                raise ValueError(f"Expected ':', got {ch!r}")
+
+        elif state == "value":
+            if ch in _WHITESPACE:
+                return
+            if ch == '"':
+                self._state = "string_value"
+                self._chars = []
+                self._value = []
+            elif ch == "[":
+                self._state = "array"
+                self._depth = 1
+                self._raw = []
+                self._items = []
+            else:
+                self._state = "raw_value"
+                self._raw = [ch]
+                self._depth = 1 if ch in "{[" else 0
+                self._raw_in_string = False
+
+        elif state == "string_value":
+            before = len(self._chars)
+            finished = self._read_string_char(ch)
+            self._value.extend(self._chars[before:])
+            if finished:
+                if self._chars:
+                    events.append({"type": "delta", "field": self._key, "text": "".join(self._chars)})
+                    self._chars = []
+                self._finish_field("".join(self._value), events)
+
+        elif state == "array":
+            self._read_array_char(ch, events)
+
+        elif state == "raw_value":
+            if self._depth == 0 and not self._raw_in_string and ch in ",}" + _WHITESPACE:
+                self._finish_field(json.loads("".join(self._raw)), events)
+                self._after_value(ch)
+                return
+            self._track_raw(ch)
+            self._raw.append(ch)
+
+        elif state == "after_value":
+            self._after_value(ch)
+
+    def _after_value(self, ch):
+        if ch == ",":
+            self._state = "key"
+        elif ch == "}":
+            self.done = True
+        elif ch in _WHITESPACE:
+            self._state = "after_value"
+        else:
+            raise ValueError(f"Expected ',' or '}}', got {ch!r}")
+
+    def _finish_field(self, value, events):
+        self.result[self._key] = value
+        events.append({"type": "field", "field": self._key, "value": value})
+        self._state = "after_value"
+
+    def _read_array_char(self, ch, events):
+        at_top = self._depth == 1 and not self._raw_in_string
+        if at_top and ch in ",]":
+            text = "".join(self._raw).strip()
+            if text:
+                value = json.loads(text)
+                events.append({"type": "item", "field": self._key, "index": len(self._items), "value": value})
+                self._items.append(value)
+            self._raw = []
+            if ch == "]":
+                self._finish_field(self._items, events)
+            return
+        self._track_raw(ch)
+        self._raw.append(ch)
+
+    def _track_raw(self, ch):
+        """Depth/string bookkeeping so delimiters inside nested values and strings are ignored."""
+        if self._raw_in_string:
+            if self._raw_escape:
+                self._raw_escape = False
+            elif ch == "\\":
+                self._raw_escape = True
+            elif ch == '"':
+                self._raw_in_string = False
+        elif ch == '"':
+            self._raw_in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+
+    def _read_string_char(self, ch) -> bool:
+        """Decodes one character of a JSON string into self._chars. Returns True at the closing quote."""
+        if self._hex is not None:
+            self._hex += ch
+            if len(self._hex) == 4:
+                code = int(self._hex, 16)
+                self._hex = None
+                if 0xD800 <= code < 0xDC00:
+                    self._high_surrogate = code
+                elif 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                    self._chars.append(chr(0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)))
+                    self._high_surrogate = None
+                else:
+                    self._chars.append(chr(code))
+            return False
+
+        if self._escape:
+            self._escape = False
+            if ch == "u":
+                self._hex = ""
+            else:
+                self._chars.append(_ESCAPES.get(ch, ch))
+            return False
+
+        if ch == "\\":
+            self._escape = True
+            return False
+        if ch == '"':
+            return True
+        self._chars.append(ch)
+        return False
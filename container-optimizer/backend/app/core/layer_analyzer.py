@@ -0,0 +1,71 @@
+LARGE_LAYER_THRESHOLD_MB = 50
+
+# Instructions that only touch image config and never produce a filesystem layer
+_METADATA_INSTRUCTIONS = {
+    "ARG", "CMD", "ENTRYPOINT", "ENV", "EXPOSE", "HEALTHCHECK", "LABEL",
+    "MAINTAINER", "ONBUILD", "SHELL", "STOPSIGNAL", "USER", "VOLUME",
+}
+
+
+def analyze_layers(client, image):
+    """
+    Builds the layer list for a local image from the Engine API alone:
+    /images/{id}/history for commands and exact byte sizes, and the inspect
+    RootFS.Layers diff IDs for layer digests.
+
+    Returns layers newest-first (the same order as `docker history`).
+    Metadata-only history entries get digest None and empty=True.
+    """
+    history = client.api.history(image.id)  # newest first
+    diff_ids = (image.attrs.get("RootFS") or {}).get("Layers") or []  # oldest first
+
+    oldest_first = list(reversed(history))
+    digests = _map_diff_ids(oldest_first, diff_ids)
+
+    layers = []
+    for entry, digest in zip(oldest_first, digests):
+        size_bytes = int(entry.get("Size") or 0)
+        size_mb = round(size_bytes / (1024 * 1024), 2)
+        layers.append({
+            "command": (entry.get("CreatedBy") or "").strip(),
+            "size_bytes": size_bytes,
+            "size_mb": size_mb,
+            "digest": digest,
+            "empty": digest is None and size_bytes == 0,
+            "created": entry.get("Created"),
+            "is_large": size_mb >= LARGE_LAYER_THRESHOLD_MB,
+        })
+    layers.reverse()
+    return layers
+
+
+def _creates_layer(entry) -> bool:
+    if int(entry.get("Size") or 0) > 0:
+        return True
+
+    cmd = (entry.get("CreatedBy") or "").strip()
+    if "#(nop)" in cmd:
+        # Classic builder: metadata instructions are recorded as "/bin/sh -c #(nop) ENV ..."
+        words = cmd.split("#(nop)", 1)[1].split()
+        return bool(words) and words[0].upper() in ("ADD", "COPY")
+
+    words = cmd.split()
+    if not words:
+        return False
+    # BuildKit records the instruction keyword itself ("ENV ...", "RUN /bin/sh -c ...")
+    return words[0].upper() not in _METADATA_INSTRUCTIONS
+
+
+def _map_diff_ids(oldest_first: list, diff_ids: list) -> list:
+    """
+    Pairs history entries with RootFS diff IDs. The Engine API doesn't expose the
+    config's empty_layer flags, so layer-producing entries are inferred; if that
+    inference doesn't line up with the real layer count, entries with a non-zero
+    size are used instead, and if neither fits no digests are attached.
+    """
+    for predicate in (_creates_layer, lambda e: int(e.get("Size") or 0) > 0):
+        flags = [predicate(e) for e in oldest_first]
+        if sum(flags) == len(diff_ids):
+            it = iter(diff_ids)
+            return [next(it) if f else None for f in flags]
+    return [None] * len(oldest_first)
@@ -0,0 +1,284 @@
+import io
+import os
+import json
+import hashlib
+import posixpath
+import tarfile
+from typing import Optional
+
+# Per-file entries kept across all layers; past this only per-layer totals are collected
+LAYER_CONTENT_MAX_FILES = int(os.getenv("LAYER_CONTENT_MAX_FILES", "300000"))
+# Only files at least this big are content-hashed for duplicate detection
+DUPLICATE_MIN_BYTES = int(os.getenv("DUPLICATE_MIN_BYTES", str(256 * 1024)))
+MAX_FINDINGS = 50
+READ_CHUNK = 1024 * 1024
+WHITEOUT_PREFIX = ".wh."
+OPAQUE_WHITEOUT = ".wh..wh..opq"
+
+# Path prefixes (relative to /) that only hold package-manager or build caches
+CACHE_LOCATIONS = [
+    ("var/lib/apt/lists/", "apt_lists"),
+    ("var/cache/apt/", "apt_cache"),
+    ("var/cache/apk/", "apk_cache"),
+    ("var/cache/yum/", "yum_cache"),
+    ("var/cache/dnf/", "dnf_cache"),
+    ("root/.cache/pip/", "pip_cache"),
+    ("root/.npm/", "npm_cache"),
+    ("usr/local/share/.cache/yarn/", "yarn_cache"),
+    ("root/.cache/yarn/", "yarn_cache"),
+    ("root/.cache/go-build/", "go_build_cache"),
+    ("tmp/", "tmp"),
+    ("var/tmp/", "tmp"),
+]
+# Anywhere in the tree: caches under any home directory, VCS metadata, dependency trees
+CACHE_SEGMENTS = [
+    ("/.cache/pip/", "pip_cache"),
+    ("/.npm/_cacache/", "npm_cache"),
+    ("/.git/", "vcs_metadata"),
+]
+NOTABLE_SEGMENTS = [("/node_modules/", "node_modules")]
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (e.g. the Engine API response)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+
+class LayerIndex:
+    """Compact file index of one layer: path -> size for files, plus whiteouts and totals."""
+
+    __slots__ = ("archive_path", "files", "whiteouts", "opaque_dirs", "size_bytes", "file_count",
+                 "categories", "truncated")
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        self.files = {}
+        self.whiteouts = []
+        self.opaque_dirs = []
+        self.size_bytes = 0
+        self.file_count = 0
+        self.categories = {}
+        self.truncated = False
+
+
+def analyze_layer_contents(client, image_ref: str, on_progress=None) -> dict:
+    """
+    Streams `docker save` output for one image from /images/{name}/get through a
+    streaming tar reader (nothing is written to disk, the archive is never held in memory)
+    and reports where layer bytes are wasted:
+
+    - cache:     package-manager / build caches and temp files left in a layer
+    - deleted:   files removed by a later layer's whiteout (still shipped in the lower layer)
+    - shadowed:  files overwritten by the same path in a later layer
+    - duplicate: identical large files visible more than once in the final filesystem
+    """
+    image = client.images.get(image_ref)
+    stream = _ChunkStream(client.api.get_image(image.id))
+
+    layers = {}
+    manifest = None
+    budget = {"files": LAYER_CONTENT_MAX_FILES}
+    hashes = {}
+
+    with tarfile.open(fileobj=stream, mode="r|") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            f = archive.extractfile(member)
+            if member.name.endswith(".json") or f.peek(1)[:1] in (b"{", b"["):
+                if member.name == "manifest.json":
+                    manifest = json.load(f)
+                continue
+
+            layer = LayerIndex(member.name)
+            try:
+                _index_layer(f, layer, budget, hashes)
+            except tarfile.TarError:
+                # Not a layer after all (foreign blob); skip it
+                continue
+            layers[member.name] = layer
+            if on_progress:
+                on_progress({"layer": member.name, "files": layer.file_count, "size_bytes": layer.size_bytes,
+                             "bytes_streamed": stream.bytes_read})
+
+    ordered = _order_layers(layers, manifest)
+    return _report(image_ref, image.id, ordered, hashes, stream.bytes_read)
+
+
+def _index_layer(f, layer: LayerIndex, budget: dict, hashes: dict):
+    with tarfile.open(fileobj=f, mode="r|*") as tar:
+        for entry in tar:
+            path = entry.name[2:] if entry.name.startswith("./") else entry.name
+            path = path.strip("/")
+            if not path:
+                continue
+            name = posixpath.basename(path)
+            directory = posixpath.dirname(path)
+
+            if name == OPAQUE_WHITEOUT:
+                layer.opaque_dirs.append(directory)
+                continue
+            if name.startswith(WHITEOUT_PREFIX):
+                layer.whiteouts.append(posixpath.join(directory, name[len(WHITEOUT_PREFIX):]))
+                continue
+            if not entry.isfile():
+                continue
+
+            size = entry.size
+            layer.file_count += 1
+            layer.size_bytes += size
+            category = classify_path(path)
+            if category:
+                totals = layer.categories.setdefault(category, [0, 0])
+                totals[0] += size
+                totals[1] += 1
+
+            if budget["files"] > 0:
+                layer.files[path] = size
+                budget["files"] -= 1
+            else:
+                layer.truncated = True
+
+            if size >= DUPLICATE_MIN_BYTES:
+                hashes.setdefault(_hash_member(tar, entry), []).append((layer.archive_path, path, size))
+
+
+def _hash_member(tar, entry) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    f = tar.extractfile(entry)
+    while True:
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            break
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def classify_path(path: str) -> Optional[str]:
+    for prefix, category in CACHE_LOCATIONS:
+        if path.startswith(prefix):
+            return category
+    padded = "/" + path
+    for segment, category in CACHE_SEGMENTS + NOTABLE_SEGMENTS:
+        if segment in padded:
+            return category
+    return None
+
+
+def _order_layers(layers: dict, manifest) -> list:
+    """Oldest-first layer list using the archive manifest; falls back to archive order."""
+    if manifest:
+        names = manifest[0].get("Layers") or []
+        if all(name in layers for name in names):
+            return [layers[name] for name in names]
+    return list(layers.values())
+
+
+def _report(image_ref: str, image_id: str, layers: list, hashes: dict, bytes_streamed: int) -> dict:
+    live = {}  # path -> (layer position, size)
+    removed = {}  # (kind, removed-from layer, removed-by layer, top dir) -> [bytes, files]
+
+    def drop(path, position, kind):
+        lower, size = live.pop(path)
+        key = (kind, lower, position, _top_dir(path))
+        totals = removed.setdefault(key, [0, 0])
+        totals[0] += size
+        totals[1] += 1
+
+    for position, layer in enumerate(layers):
+        # Whiteouts and opaque dirs hide lower-layer content before this layer's own files land
+        targets = set(layer.whiteouts)
+        opaque = set(layer.opaque_dirs)
+        if targets or opaque:
+            for path in list(live):
+                if _under_any(path, targets) or _under_any(posixpath.dirname(path), opaque):
+                    drop(path, position, "deleted")
+        for path, size in layer.files.items():
+            if path in live:
+                drop(path, position, "shadowed")
+            live[path] = (position, size)
+
+    findings = []
+    wasted = {"cache": 0, "deleted": 0, "shadowed": 0, "duplicate": 0}
+    for position, layer in enumerate(layers):
+        for category, (size, count) in layer.categories.items():
+            if category == "node_modules":
+                continue
+            wasted["cache"] += size
+            findings.append({"type": "cache", "category": category, "layer": position,
+                             "size_bytes": size, "files": count})
+    for (kind, lower, upper, top), (size, count) in removed.items():
+        wasted[kind] += size
+        findings.append({"type": kind, "layer": lower, "by_layer": upper, "path": top,
+                         "size_bytes": size, "files": count})
+
+    # Layers arrive in archive order, so pick the oldest copy as the original only now.
+    # Only copies still visible in the final image count: deleted or shadowed ones are already
+    # counted above, and a moved file (COPY /a, then RUN mv /a /b) is one extra copy, not two.
+    positions = {layer.archive_path: i for i, layer in enumerate(layers)}
+    for copies in hashes.values():
+        copies = sorted((positions.get(archive, -1), path, size) for archive, path, size in copies
+                        if live.get(path, (None,))[0] == positions.get(archive))
+        if len(copies) < 2:
+            continue
+        first_layer, first_path, _ = copies[0]
+        for position, path, size in copies[1:]:
+            wasted["duplicate"] += size
+            findings.append({"type": "duplicate", "layer": position, "path": "/" + path, "size_bytes": size,
+                             "same_as": {"layer": first_layer, "path": "/" + first_path}})
+
+    findings.sort(key=lambda f: f["size_bytes"], reverse=True)
+    total = sum(layer.size_bytes for layer in layers)
+
+    return {
+        "image": image_ref,
+        "image_id": image_id,
+        "bytes_streamed": bytes_streamed,
+        "total_file_bytes": total,
+        "wasted_bytes": sum(wasted.values()),
+        "wasted_by_type": wasted,
+        "findings": findings[:MAX_FINDINGS],
+        "truncated": any(layer.truncated for layer in layers),
+        # Oldest first, like RootFS.Layers
+        "layers": [{
+            "index": i,
+            "archive_path": layer.archive_path,
+            "files": layer.file_count,
+            "size_bytes": layer.size_bytes,
+            "whiteouts": len(layer.whiteouts) + len(layer.opaque_dirs),
+            "categories": {c: {"size_bytes": s, "files": n} for c, (s, n) in layer.categories.items()},
+        } for i, layer in enumerate(layers)],
+    }
+
+
+def _under_any(path: str, targets: set) -> bool:
+    """True if `path` is one of `targets` or inside one of them."""
+    while path:
+        if path in targets:
+            return True
+        path = posixpath.dirname(path)
+    return False
+
+
+def _top_dir(path: str, depth: int = 3) -> str:
+    parts = path.split("/")
+    return "/" + "/".join(parts[:depth]) if len(parts) > depth else "/" + path
@@ -0,0 +1,398 @@
+import os
+import json
+import time
+import random
+import itertools
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Primary backend (Groq) and an optional second OpenAI-compatible backend used for failover/hedging.
+# LLM_PROVIDER=stub swaps both for a canned local answer (tests, offline demos).
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_URL = os.getenv("GROQ_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
+LLM_FALLBACK_URL = os.getenv("LLM_FALLBACK_URL")
+LLM_FALLBACK_API_KEY = os.getenv("LLM_FALLBACK_API_KEY")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL")
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 4.0
+# Start a duplicate request on the fallback provider if the primary hasn't answered by then (0 = off)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "60"))
+
+
+class ProviderError(Exception):
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderError):
+    pass
+
+
+class DeadlineExceeded(ProviderError):
+    """The caller's time budget ran out; says nothing about the provider's health."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; while open every call is
+    refused immediately. After `reset_timeout` one trial call is let through (half-open):
+    success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: a single trial at a time (a trial that never reported back is retried)
+            if self._trial_started_at is not None and now - self._trial_started_at < self.reset_timeout:
+                return False
+            self._trial_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_started_at = None
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class OpenAICompatibleProvider:
+    """Chat-completions backend speaking the OpenAI wire format over a pooled keep-alive session."""
+
+    def __init__(self, name: str, url: str, api_key: Optional[str], model: str, timeout: float = LLM_TIMEOUT):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE))
+        self.session.headers.update({"Content-Type": "application/json"})
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def complete(self, messages: list, timeout: float = None, **options) -> str:
+        response = self._post({"model": self.model, "messages": messages, **options}, timeout=timeout)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise ProviderError(f"{self.name}: malformed completion response ({e})")
+
+    def open_stream(self, messages: list, timeout: float = None, **options) -> Iterator[str]:
+        """Sends the request now (so connection/HTTP errors surface here) and returns an iterator of content deltas."""
+        response = self._post({"model": self.model, "messages": messages, "stream": True, **options},
+                              stream=True, timeout=timeout)
+        return self._iter_stream(response)
+
+    def _iter_stream(self, response) -> Iterator[str]:
+        with response:
+            response.encoding = "utf-8"
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    choices = json.loads(data).get("choices") or [{}]
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+            except ValueError as e:
+                raise ProviderError(f"{self.name}: malformed stream event ({e})", retryable=True)
+            except requests.RequestException as e:
+                raise ProviderError(f"{self.name}: {e}", retryable=True)
+
+    def _post(self, payload: dict, stream: bool = False, timeout: float = None):
+        try:
+            response = self.session.post(self.url, json=payload, stream=stream,
+                                         timeout=self.timeout if timeout is None else min(self.timeout, timeout))
+        except requests.RequestException as e:
+            # Connection resets, timeouts, broken chunked encoding, bad URLs: all count against the provider
+            raise ProviderError(f"{self.name}: {e}", retryable=True)
+
+        if response.status_code != 200:
+            print(f"{self.name} API Error Status: {response.status_code}")
+            print(f"{self.name} API Error Response: {response.text}")
+            retry_after = None
+            try:
+                retry_after = float(response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                pass
+            raise ProviderError(
+                f"{self.name} returned HTTP {response.status_code}",
+                retryable=response.status_code == 429 or response.status_code >= 500,
+                retry_after=retry_after,
+            )
+        return response
+
+
+class StubProvider:
+    """
+    Local provider returning a fixed, valid answer. No network; useful for tests and offline runs.
+    `failures` makes the first that many calls fail like a 503, to exercise retries and breakers.
+    """
+
+    DEFAULT_ANSWER = {
+        "optimized_dockerfile": "",
+        "dockerignore": ".git/\nvenv/\nnode_modules/\n__pycache__/\n.env\n",
+        "explanation": ["Stub LLM provider: no AI analysis was performed."],
+        "security_warnings": [],
+    }
+
+    def __init__(self, name: str = "stub", answer: dict = None, delay: float = 0.0, chunk_size: int = 16,
+                 model: str = "stub", failures: int = 0):
+        self.name = name
+        self.model = model
+        self.answer = answer or self.DEFAULT_ANSWER
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages: list, timeout: float = None, **options) -> str:
+        with self._lock:
+            self.calls += 1
+            failing = self.calls <= self.failures
+        if timeout is not None and self.delay > timeout:
+            time.sleep(timeout)
+            raise ProviderError(f"{self.name}: read timed out", retryable=True)
+        time.sleep(self.delay)
+        if failing:
+            raise ProviderError(f"{self.name} returned HTTP 503", retryable=True)
+        return json.dumps(self.answer)
+
+    def open_stream(self, messages: list, timeout: float = None, **options) -> Iterator[str]:
+        text = self.complete(messages, timeout=timeout, **options)
+        return iter([text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)])
+
+
+class LLMRouter:
+    """
+    Sends a chat completion to the first healthy provider.
+
+    - transient failures (network, 429, 5xx) are retried with full-jitter backoff
+    - each provider has a circuit breaker; open circuits are skipped without a request,
+      and when every circuit is open CircuitOpenError is raised immediately
+    - with hedge_after set, a duplicate request goes to the next provider once the first
+      has been pending that long, and whichever succeeds first wins
+    - `deadline` (time.monotonic() value) bounds the whole call: per-attempt timeouts shrink
+      to fit it, and no retry, backoff or failover starts once it has passed
+    """
+
+    def __init__(self, providers: list, hedge_after: float = LLM_HEDGE_AFTER, max_retries: int = LLM_MAX_RETRIES):
+        self.providers = providers
+        self.hedge_after = hedge_after
+        self.max_retries = max_retries
+        self.breakers = {p.name: CircuitBreaker() for p in providers}
+        self._pool = ThreadPoolExecutor(max_workers=max(2, 2 * len(providers)), thread_name_prefix="llm-hedge")
+
+    def complete(self, messages: list, deadline: float = None, **options) -> str:
+        return self.complete_with_provider(messages, deadline=deadline, **options)[1]
+
+    def complete_with_provider(self, messages: list, deadline: float = None, **options):
+        """Like complete, but returns (provider that answered, text)."""
+        call = lambda provider, timeout: (provider, provider.complete(messages, timeout=timeout, **options))
+        candidates = self._candidates()
+
+        if self.hedge_after > 0:
+            primary = next(candidates, None)
+            if primary is None:
+                raise self._all_open()
+            return self._hedged(primary, candidates, call, deadline)
+
+        return self._failover(candidates, call, deadline)
+
+    def stream(self, messages: list, deadline: float = None, **options) -> Iterator[str]:
+        """
+        Streams from the first provider that accepts the request. Failover and retries happen
+        only before the first token; a stream that breaks midway is an error for the caller.
+        """
+        yield from self.open_stream(messages, deadline=deadline, **options)[1]
+
+    def open_stream(self, messages: list, deadline: float = None, **options):
+        """Like stream, but picks the provider right away and returns (provider, iterator of deltas)."""
+        def call(provider, timeout):
+            chunks = provider.open_stream(messages, timeout=timeout, **options)
+            # Pull the first delta here, so a stream that fails before any output still fails over
+            try:
+                first = next(chunks, None)
+            except ProviderError:
+                raise
+            except Exception as e:
+                raise ProviderError(f"{provider.name}: stream failed ({e})", retryable=True)
+            return provider, (chunks, first)
+
+        provider, (chunks, first) = self._failover(self._candidates(), call, deadline)
+        return provider, self._guard_stream(provider, chunks, first, deadline)
+
+    def _guard_stream(self, provider, chunks, first: str = None, deadline: float = None) -> Iterator[str]:
+        breaker = self.breakers[provider.name]
+        try:
+            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                yield chunk
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded(f"{provider.name}: deadline passed mid-stream")
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            raise ProviderError(f"{provider.name}: stream interrupted ({e})")
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def status(self) -> list:
+        return [{"name": p.name, "model": p.model, "circuit": self.breakers[p.name].state} for p in self.providers]
+
+    def _candidates(self):
+        # Lazily, so a half-open breaker only spends its trial on a provider we actually call
+        return (p for p in self.providers if self.breakers[p.name].allow())
+
+    def _all_open(self):
+        return CircuitOpenError("All LLM providers are unavailable (circuit open)")
+
+    def _failover(self, candidates, call, deadline: float = None):
+        last_error = None
+        for provider in candidates:
+            if _remaining(deadline) == 0:
+                raise last_error or DeadlineExceeded("LLM deadline passed before any provider answered")
+            try:
+                return self._call_with_retries(provider, call, deadline)
+            except DeadlineExceeded:
+                raise
+            except ProviderError as e:
+                print(f"LLM provider {provider.name} failed: {e}")
+                last_error = e
+        raise last_error or self._all_open()
+
+    def _hedged(self, primary, candidates, call, deadline: float = None):
+        first = self._pool.submit(self._call_with_retries, primary, call, deadline)
+        done, _ = wait([first], timeout=_min_timeout(self.hedge_after, _remaining(deadline)))
+        if first in done and first.exception() is None:
+            return first.result()
+
+        secondary = next(candidates, None) if _remaining(deadline) != 0 else None
+        if secondary is None:
+            try:
+                return first.result(timeout=_remaining(deadline))
+            except FutureTimeoutError:
+                raise DeadlineExceeded(f"{primary.name}: deadline passed")
+
+        # The slower request is left to finish in the background; its result is discarded
+        pending = {first, self._pool.submit(self._call_with_retries, secondary, call, deadline)}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("LLM deadline passed while waiting for hedged requests")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def _call_with_retries(self, provider, call, deadline: float = None):
+        breaker = self.breakers[provider.name]
+        for attempt in range(self.max_retries + 1):
+            if _remaining(deadline) == 0:
+                raise DeadlineExceeded(f"{provider.name}: deadline passed before attempt {attempt + 1}")
+            try:
+                result = call(provider, _remaining(deadline))
+                breaker.record_success()
+                return result
+            except ProviderError as e:
+                # Client errors (bad request, auth) say nothing about the provider's health
+                if not e.retryable:
+                    raise
+                # Cut short by our own deadline, not necessarily the provider's fault
+                if _remaining(deadline) == 0:
+                    raise DeadlineExceeded(f"{provider.name}: deadline passed ({e})")
+                if attempt == self.max_retries:
+                    breaker.record_failure()
+                    raise
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                delay = max(delay, min(e.retry_after or 0, RETRY_MAX_DELAY))
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+
+
+def _remaining(deadline: float = None):
+    """Seconds left until `deadline` (0 once passed), or None without one."""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def _min_timeout(a, b):
+    return a if b is None else min(a, b)
+
+
+def build_providers() -> list:
+    if LLM_PROVIDER == "stub":
+        return [StubProvider()]
+
+    providers = []
+    if GROQ_API_KEY:
+        providers.append(OpenAICompatibleProvider("groq", GROQ_URL, GROQ_API_KEY, GROQ_MODEL))
+    if LLM_FALLBACK_URL:
+        providers.append(OpenAICompatibleProvider(
+            "fallback", LLM_FALLBACK_URL, LLM_FALLBACK_API_KEY, LLM_FALLBACK_MODEL or GROQ_MODEL
+        ))
+    return providers
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter(build_providers())
+        return _router
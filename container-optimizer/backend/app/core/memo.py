@@ -0,0 +1,100 @@
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(*parts) -> str:
+    """Stable SHA-256 over JSON-serializable parts (dict key order doesn't matter)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded in-memory LRU with optional per-entry TTL.
+
+    With max_bytes, `sizeof(value)` is also kept under that total: least-recently-used
+    entries are evicted past it, and a value larger than the whole budget isn't stored.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = None, max_bytes: int = None, sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, stored_at, size = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+_MISSING = object()
+
+
+class StageMemo:
+    """
+    Memoizes one pipeline stage by content hash. `version` is part of every key, so
+    bumping it (e.g. a ruleset change) invalidates only this stage's entries.
+    Results are deep-copied in and out so callers can't mutate cached values.
+    """
+
+    def __init__(self, name: str, version: str = "1", maxsize: int = 256, ttl: float = None):
+        self.name = name
+        self.version = version
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get_or_compute(self, key_parts, fn, should_cache=None):
+        key = content_hash(self.name, self.version, key_parts)
+        cached = self._cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return copy.deepcopy(cached)
+
+        result = fn()
+        if should_cache is None or should_cache(result):
+            self._cache.set(key, copy.deepcopy(result))
+        return result
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from collections import deque
+from app.docker.client import get_docker_client
+
+METRICS_HISTORY_SAMPLES = int(os.getenv("METRICS_HISTORY_SAMPLES", "120"))
+METRICS_DISCOVERY_INTERVAL = float(os.getenv("METRICS_DISCOVERY_INTERVAL", "10"))
+METRICS_CGROUP_INTERVAL = float(os.getenv("METRICS_CGROUP_INTERVAL", "2"))
+# auto: read cgroup v2 files when running on the Docker host, else stream from the Engine API
+METRICS_SOURCE = os.getenv("METRICS_SOURCE", "auto").lower()
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+
+
+class ContainerSeries:
+    """Fixed-size ring buffer of (timestamp, cpu_percent, mem_bytes, mem_limit) samples for one container."""
+
+    __slots__ = ("id", "name", "samples")
+
+    def __init__(self, container_id: str, name: str, maxlen: int = METRICS_HISTORY_SAMPLES):
+        self.id = container_id
+        self.name = name
+        self.samples = deque(maxlen=maxlen)
+
+    def add(self, cpu_percent: float, mem_bytes: int, mem_limit: int):
+        self.samples.append((time.time(), round(cpu_percent, 2), mem_bytes, mem_limit))
+
+    def to_dict(self, history: bool = False):
+        data = {"id": self.id, "name": self.name, "latest": None}
+        if self.samples:
+            data["latest"] = _sample_dict(self.samples[-1])
+        if history:
+            data["series"] = [_sample_dict(s) for s in self.samples]
+        return data
+
+
+def _sample_dict(sample):
+    t, cpu, mem, limit = sample
+    return {
+        "time": t,
+        "cpu_percent": cpu,
+        "memory_mb": round(mem / (1024 * 1024), 2),
+        "memory_limit_mb": round(limit / (1024 * 1024), 2) if limit else None,
+        "memory_percent": round(mem / limit * 100, 2) if limit else None,
+    }
+
+
+def _cpu_percent_from_stats(stats: dict) -> float:
+    cpu = stats.get("cpu_stats") or {}
+    pre = stats.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage") or {}).get("total_usage", 0) - (pre.get("cpu_usage") or {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - pre.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len((cpu.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100.0
+
+
+def _memory_from_stats(stats: dict):
+    mem = stats.get("memory_stats") or {}
+    usage = mem.get("usage", 0)
+    detail = mem.get("stats") or {}
+    # Match `docker stats`: page cache isn't counted as used memory
+    usage -= detail.get("inactive_file", detail.get("total_inactive_file", detail.get("cache", 0)))
+    return max(usage, 0), mem.get("limit", 0)
+
+
+class MetricsCollector:
+    """
+    Background sampler keeping live CPU/memory series for every running container.
+
+    In "api" mode each running container gets one streaming /containers/{id}/stats
+    connection; in "cgroup" mode a single thread reads cgroup v2 accounting files.
+    A discovery loop adds and drops containers as they start and stop.
+    """
+
+    def __init__(self, source: str = METRICS_SOURCE):
+        self.source = _resolve_source(source)
+        self._series = {}
+        self._streams = {}
+        self._cgroup_prev = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._discovery_loop, name="metrics-discovery", daemon=True).start()
+        if self.source == "cgroup":
+            threading.Thread(target=self._cgroup_loop, name="metrics-cgroup", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def snapshot(self, history: bool = False) -> list:
+        with self._lock:
+            series = list(self._series.values())
+        return [s.to_dict(history=history) for s in series]
+
+    def _discovery_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self._discover()
+            except Exception as e:
+                print(f"Metrics discovery failed: {e}")
+            self._stopped.wait(METRICS_DISCOVERY_INTERVAL)
+
+    def _discover(self):
+        running = {
+            c["Id"]: (c.get("Names") or ["/" + c["Id"][:12]])[0].lstrip("/")
+            for c in get_docker_client().api.containers()
+        }
+        with self._lock:
+            for cid in list(self._series):
+                if cid not in running:
+                    del self._series[cid]
+                    self._cgroup_prev.pop(cid, None)
+                    stop = self._streams.pop(cid, None)
+                    if stop:
+                        stop.set()
+            new_ids = [cid for cid in running if cid not in self._series]
+            for cid in new_ids:
+                self._series[cid] = ContainerSeries(cid, running[cid])
+
+        for cid in new_ids:
+            if self.source == "api" or not _has_cgroup(cid):
+                stop = threading.Event()
+                with self._lock:
+                    self._streams[cid] = stop
+                threading.Thread(target=self._stream_stats, args=(cid, stop), name=f"stats-{cid[:12]}", daemon=True).start()
+
+    def _stream_stats(self, cid: str, stop: threading.Event):
+        try:
+            # The daemon pushes one sample per second on a single long-lived connection
+            for stats in get_docker_client().api.stats(cid, stream=True, decode=True):
+                if stop.is_set() or self._stopped.is_set():
+                    break
+                series = self._series.get(cid)
+                if series is None:
+                    break
+                mem, limit = _memory_from_stats(stats)
+                series.add(_cpu_percent_from_stats(stats), mem, limit)
+        except Exception as e:
+            print(f"Stats stream for {cid[:12]} ended: {e}")
+        finally:
+            with self._lock:
+                # Let discovery restart the stream if the container is still running
+                if self._streams.get(cid) is stop:
+                    del self._streams[cid]
+                    self._series.pop(cid, None)
+
+    def _cgroup_loop(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                series = [s for cid, s in self._series.items() if cid not in self._streams]
+            for s in series:
+                try:
+                    self._sample_cgroup(s)
+                except OSError:
+                    continue
+            self._stopped.wait(METRICS_CGROUP_INTERVAL)
+
+    def _sample_cgroup(self, series: ContainerSeries):
+        path = _cgroup_path(series.id)
+        now = time.monotonic()
+        with open(os.path.join(path, "cpu.stat")) as f:
+            usage_usec = next(int(line.split()[1]) for line in f if line.startswith("usage_usec"))
+        with open(os.path.join(path, "memory.current")) as f:
+            mem = int(f.read())
+        with open(os.path.join(path, "memory.max")) as f:
+            raw_limit = f.read().strip()
+        limit = 0 if raw_limit == "max" else int(raw_limit)
+
+        prev = self._cgroup_prev.get(series.id)
+        self._cgroup_prev[series.id] = (now, usage_usec)
+        if prev is None:
+            return
+        elapsed_usec = (now - prev[0]) * 1_000_000
+        cpu_percent = (usage_usec - prev[1]) / elapsed_usec * 100.0 if elapsed_usec > 0 else 0.0
+        series.add(cpu_percent, mem, limit)
+
+
+def _cgroup_path(container_id: str) -> str:
+    # systemd cgroup driver first, then the cgroupfs driver layout
+    for candidate in (f"system.slice/docker-{container_id}.scope", f"docker/{container_id}"):
+        path = os.path.join(CGROUP_ROOT, candidate)
+        if os.path.isdir(path):
+            return path
+    raise FileNotFoundError(container_id)
+
+
+def _has_cgroup(container_id: str) -> bool:
+    try:
+        _cgroup_path(container_id)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _resolve_source(source: str) -> str:
+    if source in ("api", "cgroup"):
+        return source
+    # cgroup v2 exposes cgroup.controllers at its root; only useful if container cgroups are visible too
+    on_host = os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")) and (
+        os.path.isdir(os.path.join(CGROUP_ROOT, "system.slice")) or os.path.isdir(os.path.join(CGROUP_ROOT, "docker"))
+    )
+    return "cgroup" if on_host else "api"
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_metrics_collector() -> MetricsCollector:
+    """Process-wide collector, started on first use."""
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = MetricsCollector()
+        _collector.start()
+        return _collector
@@ -0,0 +1,214 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.core.github_client import get_github_client
+from app.core.github_service import get_token, get_authenticated_user, fork_repo, create_pull_request
+from app.core.memo import LRUCache, content_hash
+
+FORK_READY_TIMEOUT = float(os.getenv("FORK_READY_TIMEOUT", "60"))
+FORK_PROBE_INITIAL_DELAY = 0.5
+FORK_PROBE_MAX_DELAY = 8.0
+# Partially completed workflows are kept this long so an identical retry resumes
+WORKFLOW_STATE_TTL = 3600
+
+_states = LRUCache(maxsize=256, ttl=WORKFLOW_STATE_TTL)
+_lookup_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pr-lookup")
+
+
+class WorkflowStepError(RuntimeError):
+    def __init__(self, step: str, error: Exception):
+        super().__init__(f"PR workflow failed at '{step}': {error}")
+        self.step = step
+        self.error = error
+
+
+class BulkPRWorkflow:
+    """
+    Multi-file commit + PR creation as an ordered list of resumable steps.
+
+    Each step stores its outputs in `state`; a failed run keeps that state (keyed by
+    the request contents), so retrying the same request continues from the failed
+    step instead of re-forking and re-creating trees. Independent lookups run in parallel.
+    """
+
+    STEPS = ("lookup", "fork", "base", "tree", "commit", "ref", "pr")
+
+    def __init__(self, owner: str, repo: str, updates: list[dict], branch_name: str, base_branch: Optional[str],
+                 pr_title: Optional[str], commit_message: Optional[str], token: Optional[str], on_event=None):
+        self.owner = owner
+        self.repo = repo
+        self.updates = updates
+        self.branch_name = branch_name
+        self.base_branch = base_branch
+        self.pr_title = pr_title
+        self.commit_message = commit_message
+        self.token = token
+        self.on_event = on_event
+        self.gh = get_github_client(token)
+
+        self.key = content_hash(owner, repo, updates, branch_name, base_branch, pr_title, commit_message,
+                                content_hash(token or get_token()))
+        self.state = _states.get(self.key) or {"completed": []}
+
+    def run(self) -> str:
+        for step in self.STEPS:
+            if step in self.state["completed"]:
+                self._emit(step, "skipped")
+                continue
+            self._emit(step, "started")
+            try:
+                getattr(self, f"_step_{step}")()
+            except Exception as e:
+                _states.set(self.key, self.state)
+                self._emit(step, "error", {"error": str(e)})
+                raise WorkflowStepError(step, e)
+            self.state["completed"].append(step)
+            self._emit(step, "ok")
+
+        _states.set(self.key, None)
+        return self.state["result"]
+
+    def _emit(self, step, status, info=None):
+        if self.on_event:
+            self.on_event(step, status, info or {})
+
+    def _step_lookup(self):
+        # Who we are, what we may do, and (when the base branch is known up front) its head, all at once
+        user_f = _lookup_pool.submit(get_authenticated_user, self.token)
+        repo_f = _lookup_pool.submit(self.gh.get, f"/repos/{self.owner}/{self.repo}")
+        ref_f = _lookup_pool.submit(self._get_base_ref, self.base_branch) if self.base_branch else None
+
+        repo_resp = repo_f.result()
+        repo_resp.raise_for_status()
+        repo_data = repo_resp.json()
+
+        self.state["user"] = user_f.result()
+        self.state["can_write"] = repo_data.get("permissions", {}).get("push", False)
+        self.state["default_branch"] = self.base_branch or repo_data["default_branch"]
+        if ref_f is not None:
+            self.state["base_sha"] = ref_f.result()
+
+    def _step_fork(self):
+        if self.state["can_write"]:
+            self.state["target_owner"] = self.owner
+            return
+
+        fork_repo(self.owner, self.repo, token=self.token)
+        target_owner = self.state["user"]
+        self._wait_for_fork(target_owner)
+        self.state["target_owner"] = target_owner
+
+    def _wait_for_fork(self, target_owner: str):
+        """Forks are created asynchronously; probe with exponential backoff until the fork answers."""
+        delay = FORK_PROBE_INITIAL_DELAY
+        deadline = time.monotonic() + FORK_READY_TIMEOUT
+        while True:
+            resp = self.gh.get(f"/repos/{target_owner}/{self.repo}")
+            if resp.status_code == 200:
+                return
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Fork {target_owner}/{self.repo} not ready after {FORK_READY_TIMEOUT:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, FORK_PROBE_MAX_DELAY)
+
+    def _step_base(self):
+        target_owner = self.state["target_owner"]
+        if "base_sha" not in self.state:
+            self.state["base_sha"] = self._get_base_ref(self.state["default_branch"])
+        base_sha = self.state["base_sha"]
+
+        # The base tree and the existing head branch are independent lookups
+        commit_f = _lookup_pool.submit(self.gh.get, f"/repos/{self.owner}/{self.repo}/git/commits/{base_sha}")
+        ref_f = _lookup_pool.submit(self.gh.get, f"/repos/{target_owner}/{self.repo}/git/refs/heads/{self.branch_name}")
+
+        commit_resp = commit_f.result()
+        commit_resp.raise_for_status()
+        self.state["base_tree_sha"] = commit_resp.json()["tree"]["sha"]
+        self.state["branch_exists"] = ref_f.result().status_code == 200
+
+    def _get_base_ref(self, branch: str) -> str:
+        # Forks share the upstream object store, so the upstream head is a valid parent in both cases
+        resp = self.gh.get(f"/repos/{self.owner}/{self.repo}/git/refs/heads/{branch}")
+        resp.raise_for_status()
+        return resp.json()["object"]["sha"]
+
+    def _step_tree(self):
+        tree_items = []
+        for update in self.updates:
+            tree_items.append({
+                "path": update["path"],
+                "mode": "100644",
+                "type": "blob",
+                "content": update["content"]
+            })
+
+        tree_resp = self.gh.post(
+            f"/repos/{self.state['target_owner']}/{self.repo}/git/trees",
+            json={"base_tree": self.state["base_tree_sha"], "tree": tree_items},
+        )
+        tree_resp.raise_for_status()
+        self.state["tree_sha"] = tree_resp.json()["sha"]
+
+    def _step_commit(self):
+        commit_payload = {
+            "message": self.commit_message or "Bulk optimization of multiple services",
+            "tree": self.state["tree_sha"],
+            "parents": [self.state["base_sha"]]
+        }
+        commit_resp = self.gh.post(f"/repos/{self.state['target_owner']}/{self.repo}/git/commits", json=commit_payload)
+        commit_resp.raise_for_status()
+        self.state["commit_sha"] = commit_resp.json()["sha"]
+
+    def _step_ref(self):
+        target_owner = self.state["target_owner"]
+        ref_path = f"refs/heads/{self.branch_name}"
+        if self.state["branch_exists"]:
+            # Update existing
+            self.gh.patch(
+                f"/repos/{target_owner}/{self.repo}/git/{ref_path}",
+                json={"sha": self.state["commit_sha"], "force": True},
+            ).raise_for_status()
+        else:
+            # Create new
+            self.gh.post(
+                f"/repos/{target_owner}/{self.repo}/git/refs",
+                json={"ref": ref_path, "sha": self.state["commit_sha"]},
+            ).raise_for_status()
+
+    def _step_pr(self):
+        target_owner = self.state["target_owner"]
+        head_param = f"{target_owner}:{self.branch_name}" if target_owner != self.owner else self.branch_name
+        pr_resp = create_pull_request(
+            self.owner, self.repo,
+            title=self.pr_title or "✨ Bulk Service Optimization",
+            body="This Pull Request introduces security and performance optimizations across multiple services (frontend/backend) in the repository.",
+            head=head_param,
+            base=self.state["default_branch"],
+            token=self.token,
+        )
+
+        if pr_resp.status_code == 201:
+            self.state["result"] = pr_resp.json()["html_url"]
+        else:
+            self.state["result"] = pr_resp.json().get("errors", [{}])[0].get("message", "PR creation failed")
+
+
+def full_bulk_pr_workflow(owner: str, repo: str, updates: list[dict], branch_name: str = "optimize-all-services", base_branch: str = None, pr_title: str = None, commit_message: str = None, token: Optional[str] = None, on_event=None):
+    """
+    Updates multiple files in a single commit and creates one PR.
+    updates: list of {"path": str, "content": str}
+    """
+    active_token = token or get_token()
+    if not active_token:
+        raise Exception("GITHUB_TOKEN or user token is required for this operation")
+
+    return BulkPRWorkflow(
+        owner, repo, updates,
+        branch_name=branch_name,
+        base_branch=base_branch,
+        pr_title=pr_title,
+        commit_message=commit_message,
+        token=token,
+        on_event=on_event,
+    ).run()
@@ -0,0 +1,263 @@
+import os
+import re
+import json
+import threading
+from app.core.dockerfile_parser import parse_dockerfile_cached
+
+# Budget for the user prompt (context + findings + Dockerfile); the system message is fixed on top of it
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Rough average for English text and shell code; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+# Findings may take at most this share of the budget before lower-severity ones are summarized
+FINDINGS_BUDGET_SHARE = 0.3
+# Long `&&` chains in a RUN keep this many commands at each end when collapsed
+RUN_CHAIN_KEEP = 4
+
+_SEVERITY_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+_DIRECTIVE = re.compile(r"^#\s*(syntax|escape|check)\s*=", re.IGNORECASE)
+
+_stats = {"prompts": 0, "original_tokens": 0, "prompt_tokens": 0, "compacted": 0, "trimmed": 0}
+_stats_lock = threading.Lock()
+
+PROMPT_TEMPLATE = """
+You are an expert Docker and DevSecOps engineer. Your task is to analyze a Docker image/Dockerfile and provide an industry-ready, SECURE, and OPTIMIZED replacement.
+
+### CONTEXT:
+Image: {image}
+Detected Runtime: {runtime}
+Misconfigurations Found (ID [SEVERITY] TAG: issue -> fix):
+{findings}
+
+### ORIGINAL DOCKERFILE CONTENT (If provided):
+{dockerfile}
+
+### OUTPUT FORMAT:
+Your response must be a VALID JSON object with the following keys:
+- "optimized_dockerfile": The complete string of the new Dockerfile.
+- "dockerignore": Recommended .dockerignore content.
+- "explanation": An array of strings explaining the key changes.
+- "security_warnings": An array of specific security alerts discovered.
+
+DO NOT include any conversation or markdown outside the JSON object.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def build_prompt(image_context: dict, dockerfile_content: str = None, budget: int = None):
+    """
+    Builds the optimization prompt within a token budget.
+    Returns (prompt, metrics). Compaction escalates only as far as needed:
+    dedupe findings -> drop comments/blank lines -> collapse long RUN chains -> trim the Dockerfile middle.
+    """
+    budget = budget or PROMPT_TOKEN_BUDGET
+    misconfigs = image_context.get("misconfigurations", [])
+    metrics = {"budget": budget, "findings_in": len(misconfigs), "run_chains_collapsed": 0, "lines_trimmed": 0}
+
+    # What the prompt used to cost: every finding as indented JSON plus the raw Dockerfile
+    metrics["original_tokens"] = estimate_tokens(PROMPT_TEMPLATE) + estimate_tokens(
+        json.dumps(misconfigs, indent=2)) + estimate_tokens(dockerfile_content)
+
+    findings = compact_findings(misconfigs)
+    findings = _fit_findings(findings, int(budget * FINDINGS_BUDGET_SHARE))
+    metrics["findings_out"] = len(findings)
+    findings_text = "\n".join(findings) or "None"
+
+    def render(dockerfile_text):
+        return PROMPT_TEMPLATE.format(
+            image=image_context.get("image", "unknown"),
+            runtime=image_context.get("runtime", "unknown"),
+            findings=findings_text,
+            dockerfile=dockerfile_text or "Not provided. Use image metadata and misconfigurations above.",
+        )
+
+    if dockerfile_content:
+        lines = _tidy(dockerfile_content.splitlines())
+        fixed_tokens = estimate_tokens(render(" "))
+        dockerfile_budget = max(budget - fixed_tokens, 0)
+
+        if _tokens(lines) > dockerfile_budget:
+            heredoc = _heredoc_lines(lines)
+            lines = [l for n, l in enumerate(lines)
+                     if n in heredoc or not l.lstrip().startswith("#") or _DIRECTIVE.match(l)]
+        if _tokens(lines) > dockerfile_budget:
+            lines, metrics["run_chains_collapsed"] = collapse_run_chains(lines)
+        if _tokens(lines) > dockerfile_budget:
+            lines, metrics["lines_trimmed"] = _trim_middle(lines, dockerfile_budget)
+        dockerfile_content = "\n".join(lines)
+
+    prompt = render(dockerfile_content)
+    metrics["prompt_tokens"] = estimate_tokens(prompt)
+    metrics["saved_tokens"] = max(metrics["original_tokens"] - metrics["prompt_tokens"], 0)
+    metrics["within_budget"] = metrics["prompt_tokens"] <= budget
+    _record(metrics)
+    return prompt, metrics
+
+
+def compact_findings(misconfigs: list) -> list:
+    """
+    One line per distinct finding with a compact ID (F1, F2, ...), most severe first.
+    Repeats of the same finding are counted instead of listed again.
+    """
+    groups = {}
+    for m in misconfigs:
+        key = (m.get("id"), m.get("message"))
+        if key in groups:
+            groups[key][1] += 1
+        else:
+            groups[key] = [m, 1]
+
+    ordered = sorted(groups.values(), key=lambda g: _SEVERITY_ORDER.get(str(g[0].get("severity", "")).upper(), 4))
+    lines = []
+    for i, (m, count) in enumerate(ordered, 1):
+        line = f"F{i} [{m.get('severity', 'UNKNOWN')}] {m.get('id', 'UNKNOWN')}: {m.get('message', '')}"
+        if m.get("recommendation"):
+            line += f" -> {m['recommendation']}"
+        if count > 1:
+            line += f" (x{count})"
+        lines.append(line)
+    return lines
+
+
+def collapse_run_chains(lines: list, keep: int = RUN_CHAIN_KEEP):
+    """
+    Joins continued shell-form RUN instructions and shortens `&&` chains longer than 2*keep+1
+    commands to their first and last `keep` commands. RUNs with heredocs are left as written.
+    Returns (lines, chains_collapsed).
+    """
+    ast = parse_dockerfile_cached("\n".join(lines))
+    out = []
+    collapsed = 0
+    done = 0  # lines[:done] already copied to out
+    for instruction in ast.find("RUN"):
+        if instruction.form != "shell" or instruction.heredocs:
+            continue
+        shortened = _collapse_run(instruction.value, keep, ast.escape)
+        if shortened is None:
+            continue
+        first = lines[instruction.line - 1]
+        out.extend(lines[done:instruction.line - 1])
+        out.append(first[:len(first) - len(first.lstrip())] + shortened)
+        done = instruction.end_line
+        collapsed += 1
+    out.extend(lines[done:])
+    return out, collapsed
+
+
+def _collapse_run(value: str, keep: int, escape: str = "\\"):
+    commands = [c.strip() for c in _split_unquoted(value, "&&", escape)]
+    if len(commands) <= 2 * keep + 1:
+        return None
+
+    omitted = len(commands) - 2 * keep
+    kept = commands[:keep] + [f"... {omitted} commands omitted ..."] + commands[-keep:]
+    return "RUN " + " && ".join(kept)
+
+
+def _split_unquoted(text: str, separator: str, escape: str = "\\") -> list:
+    """Splits on `separator` outside single/double quotes (`echo "a && b"` stays one command)."""
+    parts = []
+    quote = None
+    start = j = 0
+    while j < len(text):
+        c = text[j]
+        if c == escape and quote != "'":
+            j += 2
+            continue
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif text.startswith(separator, j):
+            parts.append(text[start:j])
+            j += len(separator)
+            start = j
+            continue
+        j += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _heredoc_lines(lines: list) -> set:
+    """Indexes of heredoc body and terminator lines, which are file content rather than Dockerfile syntax."""
+    protected = set()
+    for instruction in parse_dockerfile_cached("\n".join(lines)).instructions:
+        if instruction.heredocs:
+            protected.update(range(instruction.heredocs[0].line - 1, instruction.end_line))
+    return protected
+
+
+def _tidy(lines: list) -> list:
+    """Trailing whitespace off, runs of blank lines squeezed to one; heredoc bodies kept verbatim."""
+    heredoc = _heredoc_lines(lines)
+    out = []
+    for n, line in enumerate(lines):
+        if n in heredoc:
+            out.append(line)
+            continue
+        line = line.rstrip()
+        if line or (out and out[-1]):
+            out.append(line)
+    return out
+
+
+def _trim_middle(lines: list, token_budget: int):
+    """Keeps the head (base image, deps) and tail (entrypoint, user) of the Dockerfile within budget."""
+    marker = "# [... {} lines omitted to fit the prompt budget ...]"
+    char_budget = token_budget * CHARS_PER_TOKEN - len(marker) - 8
+    head, tail = [], []
+    used = 0
+    i, j = 0, len(lines) - 1
+    # Alternate 3 head lines to 2 tail lines: the head carries FROM / dependency setup
+    turn = 0
+    while i <= j:
+        take_head = turn % 5 < 3
+        line = lines[i] if take_head else lines[j]
+        if used + len(line) + 1 > char_budget:
+            break
+        used += len(line) + 1
+        if take_head:
+            head.append(line)
+            i += 1
+        else:
+            tail.append(line)
+            j -= 1
+        turn += 1
+
+    trimmed = j - i + 1
+    if trimmed <= 0:
+        return lines, 0
+    return head + [marker.format(trimmed)] + tail[::-1], trimmed
+
+
+def _fit_findings(findings: list, token_budget: int) -> list:
+    used = 0
+    for i, line in enumerate(findings):
+        used += estimate_tokens(line) + 1
+        if used > token_budget and i > 0:
+            return findings[:i] + [f"... and {len(findings) - i} more lower-severity findings"]
+    return findings
+
+
+def _tokens(lines: list) -> int:
+    return estimate_tokens("\n".join(lines))
+
+
+def _record(metrics: dict):
+    with _stats_lock:
+        _stats["prompts"] += 1
+        _stats["original_tokens"] += metrics["original_tokens"]
+        _stats["prompt_tokens"] += metrics["prompt_tokens"]
+        _stats["compacted"] += bool(metrics["run_chains_collapsed"] or metrics["lines_trimmed"])
+        _stats["trimmed"] += bool(metrics["lines_trimmed"])
+
+
+def get_prompt_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["saved_tokens"] = max(stats["original_tokens"] - stats["prompt_tokens"], 0)
+    stats["saved_pct"] = round(100 * stats["saved_tokens"] / stats["original_tokens"], 1) if stats["original_tokens"] else 0.0
+    return stats
@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from app.core.disk_cache import DiskCache
+
+REGISTRY_TIMEOUT = float(os.getenv("REGISTRY_TIMEOUT", "15"))
+# Platform picked from multi-arch manifest lists
+REGISTRY_PLATFORM = os.getenv("REGISTRY_PLATFORM", "linux/amd64")
+# Registries spoken to over plain HTTP besides localhost (comma-separated host[:port])
+REGISTRY_INSECURE = {h.strip() for h in os.getenv("REGISTRY_INSECURE", "").split(",") if h.strip()}
+# Per-registry credentials as JSON: {"ghcr.io": "user:token", "registry.example.com": {"username": ..., "password": ...}}.
+# Registries not listed fall back to the daemon's config.json "auths"; anything else is pulled anonymously.
+REGISTRY_AUTH = os.getenv("REGISTRY_AUTH")
+DOCKER_CONFIG = os.getenv("DOCKER_CONFIG", os.path.expanduser("~/.docker"))
+REGISTRY_POOL_SIZE = 8
+# Manifests (by digest) and config blobs are content-addressed, so cached entries never go stale
+BLOB_CACHE_MAX_ENTRIES = int(os.getenv("REGISTRY_BLOB_CACHE_MAX_ENTRIES", "5000"))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("REGISTRY_BLOB_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+DOCKER_HUB = "docker.io"
+DOCKER_HUB_API = "registry-1.docker.io"
+
+MANIFEST_V2 = "application/vnd.docker.distribution.manifest.v2+json"
+MANIFEST_LIST = "application/vnd.docker.distribution.manifest.list.v2+json"
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+OCI_INDEX = "application/vnd.oci.image.index.v1+json"
+_INDEX_TYPES = {MANIFEST_LIST, OCI_INDEX}
+_ACCEPT = ", ".join([MANIFEST_V2, MANIFEST_LIST, OCI_MANIFEST, OCI_INDEX])
+
+_AUTH_PARAM = re.compile(r'(\w+)="([^"]*)"')
+
+_blob_cache = DiskCache("registry_blob", max_entries=BLOB_CACHE_MAX_ENTRIES, max_bytes=BLOB_CACHE_MAX_BYTES)
+
+
+class RegistryError(RuntimeError):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_reference(image_ref: str):
+    """
+    (registry, repository, tag or digest) with Docker's defaults:
+    "nginx" -> ("docker.io", "library/nginx", "latest"), "localhost:5000/app@sha256:..." -> digest.
+    """
+    name, reference = image_ref, None
+    if "@" in name:
+        name, reference = name.split("@", 1)
+    else:
+        slash = name.rfind("/")
+        colon = name.rfind(":")
+        if colon > slash:
+            name, reference = name[:colon], name[colon + 1:]
+
+    parts = name.split("/", 1)
+    if len(parts) == 2 and ("." in parts[0] or ":" in parts[0] or parts[0] == "localhost"):
+        registry, repository = parts
+    else:
+        registry, repository = DOCKER_HUB, name
+    if registry in ("index.docker.io", DOCKER_HUB_API):
+        registry = DOCKER_HUB
+    if registry == DOCKER_HUB and "/" not in repository:
+        repository = f"library/{repository}"
+    return registry, repository, reference or "latest"
+
+
+class RegistryClient:
+    """
+    Minimal Registry HTTP API v2 client: manifests, manifest lists / OCI indexes and JSON blobs.
+    Handles the bearer-token challenge (tokens are reused until they expire) and falls back to
+    basic auth for registries that ask for it. Layer blobs are never downloaded.
+    """
+
+    def __init__(self, registry: str, username: str = None, password: str = None, timeout: float = REGISTRY_TIMEOUT):
+        self.registry = registry
+        host = DOCKER_HUB_API if registry == DOCKER_HUB else registry
+        scheme = "http" if _is_insecure(host) else "https"
+        self.base_url = f"{scheme}://{host}/v2"
+        self.timeout = timeout
+        self.host = host
+        self.scheme = scheme
+        self.credentials = (username, password) if username and password else None
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=REGISTRY_POOL_SIZE))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=REGISTRY_POOL_SIZE))
+        self._tokens = {}  # scope -> (token, expires_at)
+        self._lock = threading.Lock()
+
+    def get_manifest(self, repository: str, reference: str, platform: str = REGISTRY_PLATFORM):
+        """
+        Image manifest for `reference`, resolving a manifest list to the entry for `platform`.
+        Returns (manifest, manifest_digest, index_digest or None).
+        """
+        manifest, digest = self._fetch_manifest(repository, reference)
+        index_digest = None
+        if manifest.get("mediaType") in _INDEX_TYPES or "manifests" in manifest:
+            index_digest = digest
+            entry = _select_platform(manifest.get("manifests") or [], platform)
+            if entry is None:
+                raise RegistryError(f"No {platform} image in {repository}:{reference}", status=404)
+            manifest, digest = self._fetch_manifest(repository, entry["digest"])
+
+        if manifest.get("schemaVersion") != 2 or "config" not in manifest:
+            raise RegistryError(f"Unsupported manifest format for {repository}:{reference}")
+        return manifest, digest, index_digest
+
+    def get_json_blob(self, repository: str, digest: str) -> dict:
+        """A small JSON blob (image config) by digest, verified and cached."""
+        cached = _cache_get(digest)
+        if cached is not None:
+            return cached
+        response = self._get(repository, f"blobs/{digest}")
+        _verify(digest, response.content)
+        value = response.json()
+        _cache_set(digest, value)
+        return value
+
+    def _fetch_manifest(self, repository: str, reference: str):
+        if reference.startswith("sha256:"):
+            cached = _cache_get(reference)
+            if cached is not None:
+                return cached, reference
+
+        response = self._get(repository, f"manifests/{reference}", accept=_ACCEPT)
+        body = response.content
+        digest = response.headers.get("Docker-Content-Digest") or "sha256:" + hashlib.sha256(body).hexdigest()
+        if reference.startswith("sha256:"):
+            _verify(reference, body)
+        manifest = json.loads(body)
+        _cache_set(digest, manifest)
+        return manifest, digest
+
+    def _get(self, repository: str, path: str, accept: str = None):
+        scope = f"repository:{repository}:pull"
+        url = f"{self.base_url}/{repository}/{path}"
+        headers = {"Accept": accept} if accept else {}
+
+        for attempt in range(2):
+            auth_headers = dict(headers)
+            token = self._cached_token(scope)
+            if token:
+                auth_headers["Authorization"] = f"Bearer {token}"
+            try:
+                response = self.session.get(url, headers=auth_headers, timeout=self.timeout,
+                                            auth=self.credentials if not token else None)
+            except requests.RequestException as e:
+                raise RegistryError(f"{self.registry} unreachable: {e}")
+
+            if response.status_code == 401 and attempt == 0 and self._authenticate(response, scope):
+                continue
+            if response.status_code == 404:
+                raise RegistryError(f"{repository}: {path.split('/')[-1]} not found in {self.registry}", status=404)
+            if response.status_code >= 400:
+                raise RegistryError(f"{self.registry} returned HTTP {response.status_code} for {repository}/{path}",
+                                    status=response.status_code)
+            return response
+        raise RegistryError(f"Not authorized to pull {repository} from {self.registry}", status=401)
+
+    def _authenticate(self, response, scope: str) -> bool:
+        """Answers a 401 challenge. Returns True if the request is worth retrying."""
+        challenge = response.headers.get("WWW-Authenticate", "")
+        scheme = challenge.split(" ", 1)[0].lower()
+        if scheme == "basic":
+            return self.credentials is not None and response.request.headers.get("Authorization") is None
+        if scheme != "bearer":
+            return False
+
+        params = dict(_AUTH_PARAM.findall(challenge))
+        if not params.get("realm"):
+            return False
+        query = {"service": params.get("service"), "scope": params.get("scope") or scope}
+        # The realm comes from the registry's response; credentials only go to a token server it owns
+        auth = self.credentials if self._trusts_realm(params["realm"]) else None
+        try:
+            token_response = self.session.get(params["realm"], params={k: v for k, v in query.items() if v},
+                                              auth=auth, timeout=self.timeout)
+            token_response.raise_for_status()
+            data = token_response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise RegistryError(f"Token request to {params['realm']} failed: {e}", status=401)
+
+        token = data.get("token") or data.get("access_token")
+        if not token:
+            return False
+        # Renew a little early so a token never expires mid-request
+        expires_in = max(int(data.get("expires_in") or 60) - 10, 1)
+        with self._lock:
+            self._tokens[scope] = (token, time.monotonic() + expires_in)
+        return True
+
+    def _trusts_realm(self, realm: str) -> bool:
+        """Same host as the registry, or a host on the same domain (registry-1.docker.io -> auth.docker.io)."""
+        parts = urlsplit(realm)
+        if parts.scheme not in ("https", self.scheme) or not parts.hostname:
+            return False
+        registry_host = urlsplit(f"{self.scheme}://{self.host}").hostname
+        if parts.hostname == registry_host:
+            return True
+        if _is_ip(registry_host) or "." not in registry_host:
+            return False
+        return _base_domain(parts.hostname) == _base_domain(registry_host)
+
+    def _cached_token(self, scope: str) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(scope)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+
+def fetch_image_metadata(image_ref: str) -> dict:
+    """Manifest and config of a remote image, without downloading any layer."""
+    registry, repository, reference = parse_reference(image_ref)
+    client = get_registry_client(registry)
+    manifest, digest, index_digest = client.get_manifest(repository, reference)
+    config_digest = manifest["config"]["digest"]
+    return {
+        "reference": image_ref,
+        "registry": registry,
+        "repository": repository,
+        "manifest_digest": digest,
+        "index_digest": index_digest,
+        # The config digest is what the engine reports as the image ID once pulled
+        "image_id": config_digest,
+        "config": client.get_json_blob(repository, config_digest),
+        "layers": manifest.get("layers") or [],
+    }
+
+
+def _select_platform(manifests: list, platform: str) -> Optional[dict]:
+    os_name, _, arch = platform.partition("/")
+    arch, _, variant = arch.partition("/")
+    candidates = [m for m in manifests if (m.get("platform") or {}).get("os") not in (None, "unknown")]
+    for m in candidates:
+        p = m["platform"]
+        if p.get("os") == os_name and p.get("architecture") == arch and (not variant or p.get("variant") == variant):
+            return m
+    return candidates[0] if candidates else None
+
+
+def _is_insecure(host: str) -> bool:
+    hostname = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+    return host in REGISTRY_INSECURE or hostname in ("localhost", "127.0.0.1", "[::1]")
+
+
+def _is_ip(hostname: str) -> bool:
+    return ":" in hostname or hostname.replace(".", "").isdigit()
+
+
+def _base_domain(hostname: str) -> str:
+    return ".".join(hostname.lower().split(".")[-2:])
+
+
+def _normalize_registry(server: str) -> str:
+    """config.json keys come as "https://index.docker.io/v1/", "ghcr.io", "http://host:5000"..."""
+    host = server.split("://", 1)[-1].split("/", 1)[0].lower()
+    return DOCKER_HUB if host in ("index.docker.io", DOCKER_HUB_API) else host
+
+
+def _load_credentials() -> dict:
+    """registry -> (username, password), from REGISTRY_AUTH then the daemon's config.json."""
+    credentials = {}
+    try:
+        with open(os.path.join(DOCKER_CONFIG, "config.json")) as f:
+            auths = json.load(f).get("auths") or {}
+        for server, entry in auths.items():
+            username, password = entry.get("username"), entry.get("password")
+            if entry.get("auth"):
+                username, _, password = base64.b64decode(entry["auth"]).decode().partition(":")
+            if username and password:
+                credentials[_normalize_registry(server)] = (username, password)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Could not read {DOCKER_CONFIG}/config.json: {e}")
+
+    try:
+        for server, entry in json.loads(REGISTRY_AUTH or "{}").items():
+            if isinstance(entry, str):
+                username, _, password = entry.partition(":")
+            else:
+                username, password = entry.get("username"), entry.get("password")
+            credentials[_normalize_registry(server)] = (username, password)
+    except (ValueError, AttributeError) as e:
+        print(f"Ignoring malformed REGISTRY_AUTH: {e}")
+    return credentials
+
+
+def _verify(digest: str, body: bytes):
+    algorithm, _, expected = digest.partition(":")
+    if algorithm == "sha256" and hashlib.sha256(body).hexdigest() != expected:
+        raise RegistryError(f"Digest mismatch for {digest}")
+
+
+def _cache_get(digest: str):
+    try:
+        return _blob_cache.get(digest)
+    except Exception as e:
+        print(f"Registry blob cache read failed: {e}")
+        return None
+
+
+def _cache_set(digest: str, value):
+    try:
+        _blob_cache.set(digest, value)
+    except Exception as e:
+        print(f"Registry blob cache write failed: {e}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_credentials = None
+
+
+def get_registry_client(registry: str) -> RegistryClient:
+    """One client per registry, holding only the credentials configured for that registry."""
+    global _credentials
+    with _clients_lock:
+        if registry not in _clients:
+            if _credentials is None:
+                _credentials = _load_credentials()
+            _clients[registry] = RegistryClient(registry, *_credentials.get(registry, (None, None)))
+        return _clients[registry]
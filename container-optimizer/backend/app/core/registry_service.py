@@ -1,33 +1,110 @@
-import docker
+import os
 from app.docker.client import get_docker_client
+from app.docker.pull_manager import get_pull_manager
 from app.core.report.report_builder import build_report
+from app.core.registry_client import fetch_image_metadata, RegistryError, REGISTRY_PLATFORM
+from app.core.image_analyzer import analyze_registry_image
+from app.core.analyzers.runtime_analyzer import analyze_registry_runtime
+from app.core.analyzers.security_analyzer import analyze_security
+from app.core.security_scanner import get_cached_scan
 from fastapi import HTTPException
 
-def scan_registry_image(image_ref: str):
-    client = get_docker_client()
-    
+# The security stage may have to pull the image first, so it gets more time than a local scan
+REGISTRY_SECURITY_STAGE_TIMEOUT = float(os.getenv("REGISTRY_SECURITY_STAGE_TIMEOUT", "300"))
+
+
+def scan_registry_image(image_ref: str, on_event=None):
+    """
+    Reports on a registry image from its manifest and config alone (Registry v2 API).
+    Layers are pulled only when the vulnerability scan isn't already cached for the image.
+    Falls back to pulling first if the registry API can't be used (e.g. private registry
+    credentials only the Docker daemon has). A reference pulled recently whose image is
+    still local is analyzed locally without asking the registry at all.
+    """
     try:
-        # 1. Pull the image from registry
-        # This will follow normal Docker Hub / Registry logic
-        print(f"Pulling image: {image_ref}...")
+        recent = get_pull_manager().recent(image_ref)
+        if recent is not None:
+            report = build_report(image_ref, on_event=on_event)
+            report["is_registry"] = True
+            report["registry"] = {"source": "recent_pull", "image_id": recent["image_id"],
+                                  "manifest_digest": recent["digest"], "pulled": False}
+            return report
+
         try:
-            client.images.pull(image_ref)
-        except docker.errors.APIError as e:
-            if "not found" in str(e).lower():
-                raise HTTPException(status_code=404, detail=f"Image {image_ref} not found on Docker Hub")
-            raise HTTPException(status_code=500, detail=f"Failed to pull image: {str(e)}")
-        
-        # 2. Run the unified report builder
-        # Since the image is now local, build_report will work perfectly
-        report = build_report(image_ref)
-        
+            metadata = fetch_image_metadata(image_ref)
+        except RegistryError as e:
+            if e.status == 404:
+                raise HTTPException(status_code=404, detail=f"Image {image_ref} not found in registry")
+            print(f"Registry API unavailable for {image_ref} ({e}), pulling instead")
+            return _scan_after_pull(image_ref, on_event)
+
+        pulled = {"value": False}
+
+        def security():
+            # Everything below goes by digest: the tag may have moved since the manifest was read,
+            # and the local tag may still point at an older image or another platform's
+            image_id = metadata["image_id"]
+            if get_cached_scan(image_id) is None and not _is_local(image_id):
+                pinned = f"{metadata['registry']}/{metadata['repository']}@{metadata['manifest_digest']}"
+                _pull(pinned, on_event, platform=REGISTRY_PLATFORM)
+                pulled["value"] = True
+            return analyze_security(image_id, digest=image_id)
+
+        report = build_report(
+            image_ref,
+            on_event=on_event,
+            sources={
+                "image": lambda: analyze_registry_image(metadata),
+                "runtime": lambda: analyze_registry_runtime(metadata["config"]),
+                "security": security,
+            },
+            security_timeout=REGISTRY_SECURITY_STAGE_TIMEOUT,
+        )
+
         # Mark it as a registry scan for frontend differentiation
         report["is_registry"] = True
-        
+        report["registry"] = {
+            "source": "registry_api",
+            "registry": metadata["registry"],
+            "repository": metadata["repository"],
+            "manifest_digest": metadata["manifest_digest"],
+            "index_digest": metadata["index_digest"],
+            "image_id": metadata["image_id"],
+            "pulled": pulled["value"],
+        }
         return report
-        
+
     except HTTPException:
         raise
     except Exception as e:
         print(f"Registry scan failed: {e}")
         raise HTTPException(status_code=500, detail=f"Registry scan analysis failed: {str(e)}")
+
+
+def _scan_after_pull(image_ref: str, on_event=None):
+    try:
+        _pull(image_ref, on_event)
+    except RuntimeError as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=404, detail=f"Image {image_ref} not found on Docker Hub")
+        raise HTTPException(status_code=500, detail=f"Failed to pull image: {str(e)}")
+
+    # Since the image is now local, build_report will work perfectly
+    report = build_report(image_ref, on_event=on_event)
+    report["is_registry"] = True
+    report["registry"] = {"source": "pull", "pulled": True}
+    return report
+
+
+def _pull(image_ref: str, on_event=None, platform: str = None):
+    """Pulls through the shared pull manager; progress surfaces as "pull" / "progress" events."""
+    on_progress = (lambda snapshot: on_event("pull", "progress", {"pull": snapshot})) if on_event else None
+    return get_pull_manager().pull(image_ref, on_progress=on_progress, platform=platform)
+
+
+def _is_local(image_id: str) -> bool:
+    try:
+        get_docker_client().images.get(image_id)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,127 @@
+import os
+import posixpath
+from typing import Optional
+from app.core.github_client import get_github_client
+from app.core.memo import LRUCache
+
+REPO_INDEX_CACHE_SIZE = int(os.getenv("REPO_INDEX_CACHE_SIZE", "128"))
+
+COMPOSE_NAMES = {"docker-compose.yml", "docker-compose.yaml", "compose.yml", "compose.yaml"}
+LOCKFILE_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "npm-shrinkwrap.json",
+    "poetry.lock", "pipfile.lock", "uv.lock", "requirements.txt",
+    "go.sum", "cargo.lock", "gemfile.lock", "composer.lock",
+}
+# Dockerfile.md / dockerfile.txt style names are documentation, not build files
+_DOC_SUFFIXES = (".md", ".txt", ".rst", ".adoc")
+
+
+def is_dockerfile(name: str) -> bool:
+    """Dockerfile, Dockerfile.prod, api.Dockerfile, build.dockerfile, ..."""
+    n = name.lower()
+    if is_dockerignore(n) or n.endswith(_DOC_SUFFIXES):
+        return False
+    return n == "dockerfile" or n.startswith("dockerfile.") or n.endswith(".dockerfile")
+
+
+def is_compose_file(name: str) -> bool:
+    n = name.lower()
+    return n in COMPOSE_NAMES or (n.startswith(("docker-compose.", "compose.")) and n.endswith((".yml", ".yaml")))
+
+
+def is_dockerignore(name: str) -> bool:
+    # Also matches per-Dockerfile ignore files such as Dockerfile.prod.dockerignore
+    n = name.lower()
+    return n == ".dockerignore" or n.endswith(".dockerignore")
+
+
+class RepoIndex:
+    """
+    In-memory index over one recursive Git tree: every blob by path and by basename,
+    plus the categories discovery cares about (Dockerfiles, compose files,
+    .dockerignore files, dependency lockfiles), each computed in the same single pass.
+    """
+
+    __slots__ = ("tree_sha", "truncated", "by_path", "by_name", "dockerfiles", "compose_files", "dockerignores", "lockfiles")
+
+    def __init__(self, tree_sha: str, tree: list, truncated: bool = False):
+        self.tree_sha = tree_sha
+        self.truncated = truncated
+        self.by_path = {}
+        self.by_name = {}
+        self.dockerfiles = []
+        self.compose_files = []
+        self.dockerignores = []
+        self.lockfiles = []
+
+        for item in tree:
+            if item.get("type") != "blob":
+                continue
+            entry = {"path": item["path"], "sha": item["sha"], "size": item.get("size")}
+            name = posixpath.basename(item["path"])
+            self.by_path[entry["path"]] = entry
+            self.by_name.setdefault(name.lower(), []).append(entry)
+
+            if is_dockerfile(name):
+                self.dockerfiles.append(entry)
+            elif is_compose_file(name):
+                self.compose_files.append(entry)
+            elif is_dockerignore(name):
+                self.dockerignores.append(entry)
+            elif name.lower() in LOCKFILE_NAMES:
+                self.lockfiles.append(entry)
+
+        for group in (self.dockerfiles, self.compose_files, self.dockerignores, self.lockfiles):
+            group.sort(key=lambda e: e["path"])
+
+    def get(self, path: str) -> Optional[dict]:
+        return self.by_path.get(path)
+
+    def named(self, name: str) -> list:
+        return self.by_name.get(name.lower(), [])
+
+    def in_directory(self, directory: str, entries: list) -> list:
+        """Entries of `entries` that live directly in `directory` ("" for the repo root)."""
+        directory = directory.strip("/")
+        return [e for e in entries if posixpath.dirname(e["path"]) == directory]
+
+
+# (owner, repo, tree_sha) -> RepoIndex; a tree SHA pins the exact content
+_indexes = LRUCache(maxsize=REPO_INDEX_CACHE_SIZE)
+# (owner, repo, tree response ETag) -> tree_sha, so a 304 never needs the tree body re-parsed
+_etag_to_tree = LRUCache(maxsize=REPO_INDEX_CACHE_SIZE * 4)
+
+
+def get_repo_index(owner: str, repo: str, ref: Optional[str] = None, token: Optional[str] = None) -> Optional[RepoIndex]:
+    """
+    Index of the repository tree at `ref` (default branch when None), or None if it can't be read.
+    The recursive tree is revalidated by ETag, so an unchanged tree costs a 304 and a cache lookup.
+    """
+    gh = get_github_client(token)
+
+    if not ref:
+        repo_resp = gh.get(f"/repos/{owner}/{repo}")
+        if repo_resp.status_code != 200:
+            return None
+        ref = repo_resp.json().get("default_branch", "main")
+
+    # We use recursive=1 to get the entire tree in one go (limit 100k entries)
+    tree_resp = gh.get(f"/repos/{owner}/{repo}/git/trees/{ref}", params={"recursive": "1"})
+    if tree_resp.status_code != 200:
+        return None
+
+    etag = tree_resp.headers.get("ETag")
+    tree_sha = _etag_to_tree.get((owner, repo, etag)) if etag else None
+    index = _indexes.get((owner, repo, tree_sha)) if tree_sha else None
+    if index is not None:
+        return index
+
+    data = tree_resp.json()
+    tree_sha = data.get("sha")
+    index = _indexes.get((owner, repo, tree_sha))
+    if index is None:
+        index = RepoIndex(tree_sha, data.get("tree", []), truncated=data.get("truncated", False))
+        _indexes.set((owner, repo, tree_sha), index)
+    if etag:
+        _etag_to_tree.set((owner, repo, etag), tree_sha)
+    return index
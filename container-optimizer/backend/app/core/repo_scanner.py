@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+from app.core.github_service import find_dockerfile_entries, get_blobs, get_file_content
+from app.core.report.report_builder import build_static_report
+
+GITHUB_SCAN_CONCURRENCY = int(os.getenv("GITHUB_SCAN_CONCURRENCY", "4"))
+GITHUB_SCAN_MAX_CONCURRENCY = int(os.getenv("GITHUB_SCAN_MAX_CONCURRENCY", "16"))
+
+
+def annotate_github_report(report: dict, owner: str, repo: str, branch: Optional[str], path: str, content: str, url: str):
+    """Adds the GitHub metadata the ResultViewer / PR flow expects to a static report."""
+    report.update({
+        "owner": owner,
+        "repo": repo,
+        "branch": branch,
+        "path": path,
+        "original_content": content,
+        "url": url,
+        "multi_service": False
+    })
+
+    # Ensure ResultViewer can find the AI result
+    if "recommendation" in report:
+        rec = report["recommendation"]
+        report["optimization"] = rec.get("optimized_dockerfile") or rec.get("dockerfile")
+    return report
+
+
+def scan_repository(owner: str, repo: str, branch: Optional[str], url: str, paths: list = None,
+                    token: Optional[str] = None, concurrency: int = None, on_result=None):
+    """
+    Fetches and analyzes every Dockerfile of a repository with at most `concurrency`
+    files in flight. on_result(result) is called as each file completes, in completion order.
+    """
+    concurrency = max(1, min(concurrency or GITHUB_SCAN_CONCURRENCY, GITHUB_SCAN_MAX_CONCURRENCY))
+
+    # Discovery keeps the tree's blob SHAs so all contents come down in one bulk fetch
+    entries = {e["path"]: e["sha"] for e in find_dockerfile_entries(owner, repo, token=token, ref=branch)}
+    paths = paths or list(entries)
+    contents = get_blobs(owner, repo, [entries[p] for p in paths if p in entries], token=token)
+
+    def scan_one(path):
+        content = contents.get(entries.get(path))
+        if content is None:
+            # Not in the discovered tree (explicit path) or not fetchable as a blob
+            content = get_file_content(owner, repo, path, token=token, ref=branch)
+        if not content:
+            raise RuntimeError(f"Failed to fetch Dockerfile at {path}")
+        report = build_static_report(content)
+        return annotate_github_report(report, owner, repo, branch, path, content, url)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="repo-scan") as pool:
+        futures = {pool.submit(scan_one, p): p for p in paths}
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                result = {"path": path, "status": "ok", "report": fut.result()}
+            except Exception as e:
+                result = {"path": path, "status": "error", "error": str(e)}
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return {
+        "owner": owner,
+        "repo": repo,
+        "branch": branch,
+        "url": url,
+        "multi_service": True,
+        "paths": paths,
+        "results": sorted(results, key=lambda r: r["path"]),
+    }
@@ -0,0 +1,128 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "16"))
+
+# Shared across requests so a report doesn't spin up (and tear down) its own threads
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="report-stage")
+
+_REQUIRED = object()
+
+
+class Stage:
+    """
+    A single unit of work in a report pipeline.
+
+    fn receives the results of its dependencies as keyword arguments.
+    If the stage fails or times out, `fallback` is used instead: either a value
+    or a callable taking (error, **dependency_results). Stages without a
+    fallback are required and abort the pipeline on failure.
+    """
+
+    def __init__(self, name: str, fn, deps=(), timeout: float = None, fallback=_REQUIRED):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+    @property
+    def required(self):
+        return self.fallback is _REQUIRED
+
+
+class StageError(RuntimeError):
+    """Raised when a required stage fails. Carries the partial results collected so far."""
+
+    def __init__(self, stage: str, error: Exception, results: dict, timings: dict):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.results = results
+        self.timings = timings
+
+
+def run_pipeline(stages: list, on_event=None):
+    """
+    Runs stages as soon as their dependencies are satisfied, independent stages in parallel.
+    Returns (results, timings) where timings maps stage name -> {"status", "duration_ms"[, "error"]}.
+
+    on_event, if given, is called with (stage_name, status, info) whenever a stage starts or finishes.
+    """
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"Stage '{s.name}' depends on unknown stage '{d}'")
+
+    results = {}
+    timings = {}
+    pending = dict(by_name)
+    running = {}  # future -> (stage, started_at, deadline)
+
+    def _emit(name, status, info=None):
+        if on_event:
+            try:
+                on_event(name, status, info or {})
+            except Exception as e:
+                print(f"Pipeline event handler error: {e}")
+
+    def _finish(stage, started, status, value=None, error=None):
+        entry = {"status": status, "duration_ms": round((time.monotonic() - started) * 1000, 1)}
+        if error is not None:
+            entry["error"] = str(error) or error.__class__.__name__
+        timings[stage.name] = entry
+
+        if status == "ok":
+            results[stage.name] = value
+        elif stage.required:
+            raise StageError(stage.name, error, results, timings)
+        else:
+            kwargs = {d: results[d] for d in stage.deps}
+            fb = stage.fallback
+            results[stage.name] = fb(error, **kwargs) if callable(fb) else fb
+        _emit(stage.name, status, entry)
+
+    def _launch_ready():
+        for name, stage in list(pending.items()):
+            if all(d in results for d in stage.deps):
+                del pending[name]
+                kwargs = {d: results[d] for d in stage.deps}
+                started = time.monotonic()
+                deadline = started + stage.timeout if stage.timeout else None
+                running[_executor.submit(stage.fn, **kwargs)] = (stage, started, deadline)
+                _emit(name, "started")
+
+    _launch_ready()
+    while running:
+        deadlines = [d for (_, _, d) in running.values() if d is not None]
+        wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+        done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            stage, started, _ = running.pop(fut)
+            try:
+                _finish(stage, started, "ok", value=fut.result())
+            except StageError:
+                raise
+            except Exception as e:
+                _finish(stage, started, "error", error=e)
+
+        # Expire stages that ran past their timeout. The worker thread is left to finish
+        # on its own; its result is simply ignored.
+        now = time.monotonic()
+        for fut, (stage, started, deadline) in list(running.items()):
+            if deadline is not None and now >= deadline and not fut.done():
+                running.pop(fut)
+                fut.cancel()
+                _finish(stage, started, "timeout", error=FutureTimeoutError(f"timed out after {stage.timeout}s"))
+
+        _launch_ready()
+
+    if pending:
+        # Only reachable with a dependency cycle
+        raise ValueError(f"Unresolvable stage dependencies: {sorted(pending)}")
+
+    return results, timings
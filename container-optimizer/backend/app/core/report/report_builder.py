@@ -1,11 +1,31 @@
 import re
+import time
 from app.core.image_analyzer import analyze_image
 from app.core.analyzers.runtime_analyzer import analyze_runtime
 from app.core.analyzers.security_analyzer import analyze_security, analyze_dockerfile_security
-from app.core.analyzers.misconfig_analyzer import analyze_misconfig
+from app.core.analyzers.misconfig_analyzer import analyze_misconfig, RULESET_VERSION
 from app.core.suggestors.dockerfile_suggestor import suggest_dockerfile
-from app.core.dockerfile_analyzer import analyze_dockerfile_content
-from app.core.ai_service import optimize_with_ai
+from app.core.dockerfile_analyzer import analyze_dockerfile_content, PARSER_VERSION
+from app.core.dockerfile_parser import parse_dockerfile_cached
+from app.core.ai_service import optimize_with_ai, optimize_with_ai_stream
+from app.core.memo import StageMemo, content_hash
+from app.core.report.pipeline import Stage, StageError, run_pipeline
+
+# Per-stage budgets (seconds). Trivy has its own 60s subprocess timeout; the LLM router gets the
+# AI budget as its deadline, so it stops retrying and failing over when the stage gives up.
+SECURITY_STAGE_TIMEOUT = 75
+AI_STAGE_TIMEOUT = 40
+
+# The deterministic static stages are memoized independently by Dockerfile content hash, so
+# e.g. a ruleset change re-runs the rules but keeps Trivy results. AI answers are cached by
+# ai_service, under the model that actually answered.
+STATIC_MEMO_SIZE = 256
+_static_memo = {
+    "parse": StageMemo("parse", version=PARSER_VERSION, maxsize=STATIC_MEMO_SIZE),
+    # Trivy's check bundle updates independently of our code, so config scan results expire
+    "security": StageMemo("security", maxsize=STATIC_MEMO_SIZE, ttl=6 * 3600),
+    "misconfig": StageMemo("misconfig", version=f"{PARSER_VERSION}.{RULESET_VERSION}", maxsize=STATIC_MEMO_SIZE),
+}
 
 
 def _extract_tag(message: str):
@@ -18,35 +38,92 @@ def _normalize(text: str):
     return re.sub(r'[^a-z0-9]', '', text.lower())
 
 
-def build_report(image_name: str, dockerfile_content: str = None, container_id: str = None):
-    image = analyze_image(image_name)
-    runtime = analyze_runtime(image_name, container_id=container_id)
-    security = analyze_security(image_name)
-    misconfigs = analyze_misconfig(image, runtime)
+def _security_fallback(error):
+    return {
+        "status": "error",
+        "error": str(error),
+        "total_vulnerabilities": 0,
+        "by_severity": {},
+        "vulnerabilities": [],
+    }
 
-    # Prepare context for AI
-    image_context = {
-        "image": image_name,
-        "runtime": runtime.get("runtime", "unknown"),
-        "misconfigurations": misconfigs,
-        "summary": {
-            "image_size_mb": image["total_size_mb"],
-            "layer_count": image["layer_count"],
-            "runs_as_root": runtime["runs_as_root"],
-        }
+
+def _rule_based_recommendation(image, runtime, misconfigs):
+    # Fallback to rule-based if AI fails
+    dockerfile_suggestion = suggest_dockerfile(image, runtime, misconfigs)
+    return {
+        "optimized_dockerfile": dockerfile_suggestion,
+        "explanation": ["AI Optimization was unavailable, showing rule-based suggestions."],
+        "security_warnings": []
     }
-    
-    # Use AI for optimization and reasoning
+
+
+def _run_stages(stages, on_event=None):
+    """Runs the report stages, surfacing a required stage's original error to the caller."""
     try:
-        recommendation = optimize_with_ai(image_context, dockerfile_content)
-    except Exception:
-        # Fallback to rule-based if AI fails
-        dockerfile_suggestion = suggest_dockerfile(image, runtime, misconfigs)
-        recommendation = {
-            "optimized_dockerfile": dockerfile_suggestion,
-            "explanation": ["AI Optimization was unavailable, showing rule-based suggestions."],
-            "security_warnings": []
+        return run_pipeline(stages, on_event=on_event)
+    except StageError as e:
+        raise e.error
+
+
+def _ai_call(on_event=None, stream_ai: bool = False):
+    """The AI optimizer to use; in streaming mode partial answers surface as "ai" stage events."""
+    def optimize(image_context, dockerfile_content):
+        deadline = time.monotonic() + AI_STAGE_TIMEOUT
+        if stream_ai and on_event:
+            return optimize_with_ai_stream(
+                image_context, dockerfile_content, deadline=deadline,
+                on_partial=lambda event: on_event("ai", "partial", {"partial": event}),
+            )
+        return optimize_with_ai(image_context, dockerfile_content, deadline=deadline)
+    return optimize
+
+
+def build_report(image_name: str, dockerfile_content: str = None, container_id: str = None, on_event=None,
+                 stream_ai: bool = False, sources: dict = None, security_timeout: float = SECURITY_STAGE_TIMEOUT):
+    """
+    `sources` may replace the local-engine "image", "runtime" and "security" stage functions
+    (zero-argument callables), e.g. with registry-backed ones.
+    """
+    sources = {
+        "image": lambda: analyze_image(image_name),
+        "runtime": lambda: analyze_runtime(image_name, container_id=container_id),
+        "security": lambda: analyze_security(image_name),
+        **(sources or {}),
+    }
+
+    # Image/runtime inspection and the Trivy scan are independent, so they run side by side.
+    # The AI call only waits for the misconfig rules it is prompted with, not for Trivy.
+    def ai_stage(image, runtime, misconfig):
+        # Prepare context for AI
+        image_context = {
+            "image": image_name,
+            "runtime": runtime.get("runtime", "unknown"),
+            "misconfigurations": misconfig,
+            "summary": {
+                "image_size_mb": image["total_size_mb"],
+                "layer_count": image["layer_count"],
+                "runs_as_root": runtime["runs_as_root"],
+            }
         }
+        return optimize(image_context, dockerfile_content)
+
+    optimize = _ai_call(on_event, stream_ai)
+    results, timings = _run_stages([
+        Stage("image", sources["image"]),
+        Stage("runtime", sources["runtime"]),
+        Stage("security", sources["security"], timeout=security_timeout, fallback=_security_fallback),
+        Stage("misconfig", lambda image, runtime: analyze_misconfig(image, runtime), deps=("image", "runtime")),
+        Stage("ai", ai_stage, deps=("image", "runtime", "misconfig"),
+              timeout=AI_STAGE_TIMEOUT,
+              fallback=lambda error, image, runtime, misconfig: _rule_based_recommendation(image, runtime, misconfig)),
+    ], on_event=on_event)
+
+    image = results["image"]
+    runtime = results["runtime"]
+    security = results["security"]
+    misconfigs = results["misconfig"]
+    recommendation = results["ai"]
 
     raw_findings = []
     # 1. Runtime Insights (Rule Engine)
@@ -147,46 +224,67 @@ def build_report(image_name: str, dockerfile_content: str = None, container_id:
         "misconfigurations": misconfigs,
         "recommendation": recommendation,
         "findings": unique_findings,
+        "pipeline": timings,
     }
 
-def build_static_report(dockerfile_content: str):
-    image_analysis = analyze_dockerfile_content(dockerfile_content)
-    runtime = image_analysis["runtime_analysis"]
-    
-    # Run static security scan (Trivy config scan)
-    security = analyze_dockerfile_security(dockerfile_content)
-    
-    misconfigs = analyze_misconfig(image_analysis, runtime)
-    
-    # Check for secrets in ENV/ARG statically (simple regex fallback)
-    secrets = _detect_static_secrets(dockerfile_content)
-    # Filter out duplicates if Trivy already caught them
-    existing_messages = [m["message"] for m in misconfigs]
-    for s in secrets:
-        if s["message"] not in existing_messages:
-            misconfigs.append(s)
-
-    # Prepare context for AI
-    image_context = {
-        "image": "uploaded_dockerfile",
-        "runtime": image_analysis.get("runtime", "unknown"),
-        "misconfigurations": misconfigs,
-        "summary": {
-            "layer_count": len(image_analysis["layers"]),
-            "runs_as_root": runtime["runs_as_root"],
-        }
-    }
+def build_static_report(dockerfile_content: str, on_event=None, stream_ai: bool = False):
+    digest = content_hash(dockerfile_content)
 
-    # Use AI for optimization and reasoning
-    try:
-        recommendation = optimize_with_ai(image_context, dockerfile_content)
-    except Exception:
-        dockerfile_suggestion = suggest_dockerfile(image_analysis, runtime, misconfigs)
-        recommendation = {
-            "optimized_dockerfile": dockerfile_suggestion,
-            "explanation": ["AI Optimization was unavailable, showing rule-based suggestions."],
-            "security_warnings": []
+    def parse_stage():
+        return _static_memo["parse"].get_or_compute(digest, lambda: analyze_dockerfile_content(dockerfile_content))
+
+    def security_stage():
+        return _static_memo["security"].get_or_compute(
+            digest,
+            lambda: analyze_dockerfile_security(dockerfile_content),
+            should_cache=lambda r: r.get("status") == "ok",
+        )
+
+    def misconfig_stage(parse):
+        def compute():
+            misconfigs = analyze_misconfig(parse, parse["runtime_analysis"])
+
+            # Check for secrets in ENV/ARG statically (simple regex fallback)
+            secrets = _detect_static_secrets(dockerfile_content)
+            # Filter out duplicates if Trivy already caught them
+            existing_messages = [m["message"] for m in misconfigs]
+            for s in secrets:
+                if s["message"] not in existing_messages:
+                    misconfigs.append(s)
+            return misconfigs
+
+        return _static_memo["misconfig"].get_or_compute(digest, compute)
+
+    def ai_stage(parse, misconfig):
+        # Prepare context for AI
+        image_context = {
+            "image": "uploaded_dockerfile",
+            "runtime": parse.get("runtime", "unknown"),
+            "misconfigurations": misconfig,
+            "summary": {
+                "layer_count": len(parse["layers"]),
+                "runs_as_root": parse["runtime_analysis"]["runs_as_root"],
+            }
         }
+        return optimize(image_context, dockerfile_content)
+
+    optimize = _ai_call(on_event, stream_ai)
+
+    # The Trivy config scan runs alongside parsing, rules and the AI call
+    results, timings = _run_stages([
+        Stage("parse", parse_stage),
+        Stage("security", security_stage, timeout=SECURITY_STAGE_TIMEOUT, fallback=_security_fallback),
+        Stage("misconfig", misconfig_stage, deps=("parse",)),
+        Stage("ai", ai_stage, deps=("parse", "misconfig"),
+              timeout=AI_STAGE_TIMEOUT,
+              fallback=lambda error, parse, misconfig: _rule_based_recommendation(parse, parse["runtime_analysis"], misconfig)),
+    ], on_event=on_event)
+
+    image_analysis = results["parse"]
+    runtime = image_analysis["runtime_analysis"]
+    security = results["security"]
+    misconfigs = results["misconfig"]
+    recommendation = results["ai"]
 
     raw_findings = []
     
@@ -283,26 +381,26 @@ def build_static_report(dockerfile_content: str):
         "misconfigurations": misconfigs,
         "recommendation": recommendation,
         "findings": unique_findings,
+        "pipeline": timings,
     }
 
+# Simplified patterns to reduce false positives
+_SECRET_PATTERNS = [
+    (re.compile(r"(?i)(aws_access_key_id|aws_secret_access_key|npm_token|github_token|secret_key|api_key|access_token|db_password)\s*[= ]\s*['\"]?\w{4,}"), "Exposed Secret/Token"),
+]
+
+
 def _detect_static_secrets(content: str):
     issues = []
-    # Simplified patterns to reduce false positives
-    secret_patterns = [
-        (r"(?i)(aws_access_key_id|aws_secret_access_key|npm_token|github_token|secret_key|api_key|access_token|db_password)\s*[= ]\s*['\"]?\w{4,}", "Exposed Secret/Token"),
-    ]
-    
-    lines = content.splitlines()
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if re.search(r"^\s*(ENV|ARG)\s+", line_strip, re.IGNORECASE):
-            for pattern, label in secret_patterns:
-                if re.search(pattern, line_strip):
-                    issues.append({
-                        "id": "EXPOSED_SECRET",
-                        "severity": "HIGH",
-                        "message": f"Potential exposed secret ({label}) on line {i+1}",
-                        "recommendation": "Use Docker Secrets or environment variables at runtime."
-                    })
-                    break
+    # ENV/ARG instructions from the shared parse, so continued lines are checked as one
+    for inst in parse_dockerfile_cached(content).find("ENV", "ARG"):
+        for pattern, label in _SECRET_PATTERNS:
+            if pattern.search(inst.value):
+                issues.append({
+                    "id": "EXPOSED_SECRET",
+                    "severity": "HIGH",
+                    "message": f"Potential exposed secret ({label}) on line {inst.line}",
+                    "recommendation": "Use Docker Secrets or environment variables at runtime."
+                })
+                break
     return issues
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import tempfile
+import subprocess
+from app.core.disk_cache import DiskCache
+from app.core.trivy_server import TrivyTimeoutError
+
+SBOM_ENABLED = os.getenv("SBOM_ENABLED", "true").lower() != "false"
+SBOM_FORMAT = os.getenv("SBOM_FORMAT", "cyclonedx")  # cyclonedx | spdx-json
+SBOM_MAX_ENTRIES = int(os.getenv("SBOM_MAX_ENTRIES", "2000"))
+SBOM_MAX_BYTES = int(os.getenv("SBOM_MAX_BYTES", str(256 * 1024 * 1024)))
+SBOM_GENERATE_TIMEOUT = 120
+SBOM_SCAN_TIMEOUT = 60
+
+# One record per image digest, kept until evicted: an image's packages never change, only the
+# vulnerability DB does. Stored zlib-compressed by the disk cache (SBOMs compress ~10x).
+_store = DiskCache("sbom", max_entries=SBOM_MAX_ENTRIES, max_bytes=SBOM_MAX_BYTES)
+# Latest vulnerability set per digest, kept apart so re-evaluations don't rewrite the SBOM
+_evaluations = DiskCache("sbom_evaluation", max_entries=SBOM_MAX_ENTRIES)
+
+
+def get_record(digest: str):
+    """
+    {"image", "digest", "format", "sbom", "static_results", "created_at"} or None.
+    `static_results` are the image's secret/misconfig findings, which don't depend on the vulnerability DB.
+    """
+    try:
+        return _store.get(digest)
+    except Exception as e:
+        print(f"SBOM store read failed: {e}")
+        return None
+
+
+def save_record(record: dict):
+    try:
+        _store.set(record["digest"], record)
+    except Exception as e:
+        print(f"SBOM store write failed: {e}")
+
+
+def known_digests() -> list:
+    try:
+        return _store.keys()
+    except Exception as e:
+        print(f"SBOM store listing failed: {e}")
+        return []
+
+
+def get_evaluation(digest: str):
+    """{"db_version", "evaluated_at", "vulnerabilities": {key: summary}, "new": [...], "previous_db_version"} or None."""
+    try:
+        return _evaluations.get(digest)
+    except Exception as e:
+        print(f"SBOM evaluation read failed: {e}")
+        return None
+
+
+def save_evaluation(digest: str, evaluation: dict):
+    try:
+        _evaluations.set(digest, evaluation)
+    except Exception as e:
+        print(f"SBOM evaluation write failed: {e}")
+
+
+def create_record(image_name: str, digest: str, full_scan: dict):
+    """Generates and stores the SBOM of a local image after its first full scan. Returns the record or None."""
+    try:
+        sbom = generate_sbom(image_name)
+    except RuntimeError as e:
+        print(f"SBOM generation failed for {image_name}: {e}")
+        return None
+
+    record = {
+        "image": image_name,
+        "digest": digest,
+        "format": SBOM_FORMAT,
+        "sbom": sbom,
+        "static_results": static_results(full_scan),
+        "created_at": time.time(),
+    }
+    save_record(record)
+    return record
+
+
+def generate_sbom(image_name: str) -> dict:
+    """Package inventory of a local image (`trivy image --format cyclonedx`); no vulnerability matching."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = f"{tmp}/sbom.json"
+        _run_trivy(["trivy", "image", "--format", SBOM_FORMAT, "--output", output_file, image_name],
+                   SBOM_GENERATE_TIMEOUT)
+        with open(output_file) as f:
+            return json.load(f)
+
+
+def scan_sbom(record: dict, server_url: str = None) -> dict:
+    """
+    Vulnerability scan of a stored SBOM (`trivy sbom`), merged with the record's static findings
+    so the result has the same shape as a full `trivy image` scan. No image layers are read.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        sbom_file = f"{tmp}/sbom.json"
+        output_file = f"{tmp}/result.json"
+        with open(sbom_file, "w") as f:
+            json.dump(record["sbom"], f, separators=(",", ":"))
+
+        cmd = ["trivy", "sbom", "--scanners", "vuln", "--format", "json", "--output", output_file]
+        if server_url:
+            cmd += ["--server", server_url]
+        cmd.append(sbom_file)
+        _run_trivy(cmd, SBOM_SCAN_TIMEOUT)
+
+        with open(output_file) as f:
+            result = json.load(f)
+
+    result["ArtifactName"] = record["image"]
+    result["Results"] = (result.get("Results") or []) + record.get("static_results", [])
+    return result
+
+
+def static_results(scan: dict) -> list:
+    """The secret/misconfig part of a full scan's Results (vulnerabilities stripped)."""
+    kept = []
+    for result in scan.get("Results") or []:
+        findings = {key: result[key] for key in ("Secrets", "Misconfigurations") if result.get(key)}
+        if findings:
+            kept.append({**{k: result[k] for k in ("Target", "Class", "Type") if k in result}, **findings})
+    return kept
+
+
+def vulnerability_keys(scan: dict) -> dict:
+    """{"CVE|package|installed version": summary} for every vulnerability in a Trivy result."""
+    keys = {}
+    for result in scan.get("Results") or []:
+        for v in result.get("Vulnerabilities") or []:
+            key = f"{v.get('VulnerabilityID')}|{v.get('PkgName')}|{v.get('InstalledVersion')}"
+            keys[key] = {
+                "id": v.get("VulnerabilityID"),
+                "package": v.get("PkgName"),
+                "installed_version": v.get("InstalledVersion"),
+                "fixed_version": v.get("FixedVersion"),
+                "severity": v.get("Severity", "UNKNOWN"),
+                "title": v.get("Title") or v.get("VulnerabilityID"),
+            }
+    return keys
+
+
+def _run_trivy(cmd: list, timeout: float):
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        raise TrivyTimeoutError(f"{' '.join(cmd[:2])} timed out: {e}")
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        raise RuntimeError(f"{' '.join(cmd[:2])} failed: {e}")
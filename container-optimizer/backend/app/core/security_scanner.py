@@ -1,13 +1,321 @@
+import os
 import subprocess
 import tempfile
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.disk_cache import DiskCache
+from app.core.trivy_server import get_trivy_server, TrivyTimeoutError
+from app.core import sbom_store
+from app.docker.client import get_docker_client
 
+# Image scans are cached by image digest and invalidated whenever Trivy's vulnerability DB changes
+SCAN_CACHE_ENABLED = os.getenv("SCAN_CACHE_ENABLED", "true").lower() != "false"
+SCAN_CACHE_TTL = float(os.getenv("SCAN_CACHE_TTL", str(24 * 3600)))
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "500"))
+SCAN_CACHE_MAX_BYTES = int(os.getenv("SCAN_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+DB_VERSION_CHECK_INTERVAL = 300
+# Re-scan every stored SBOM in the background as soon as a new vulnerability DB is detected
+SBOM_REEVALUATE_ON_DB_UPDATE = os.getenv("SBOM_REEVALUATE_ON_DB_UPDATE", "true").lower() != "false"
+# SBOMs are generated off the request path, a couple at a time
+SBOM_GENERATE_WORKERS = int(os.getenv("SBOM_GENERATE_WORKERS", "2"))
 
-def scan_image(image_name: str):
+_scan_cache = DiskCache(
+    "trivy_image_scan",
+    ttl=SCAN_CACHE_TTL,
+    max_entries=SCAN_CACHE_MAX_ENTRIES,
+    max_bytes=SCAN_CACHE_MAX_BYTES,
+)
+
+_db_version = {"value": None, "checked_at": 0.0}
+_db_version_lock = threading.Lock()
+_reevaluation_lock = threading.Lock()
+_sbom_pool = ThreadPoolExecutor(max_workers=SBOM_GENERATE_WORKERS, thread_name_prefix="sbom")
+_sbom_pending = {}  # digest -> Future of the SBOM being generated
+_sbom_pending_lock = threading.Lock()
+
+_SEVERITY_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+
+
+def get_trivy_db_version(refresh: bool = False):
+    """
+    Returns a stamp identifying the local Trivy vulnerability DB (its UpdatedAt time),
+    or None if Trivy is unavailable. Looked up at most every few minutes.
+    """
+    with _db_version_lock:
+        now = time.monotonic()
+        if not refresh and _db_version["checked_at"] and now - _db_version["checked_at"] < DB_VERSION_CHECK_INTERVAL:
+            return _db_version["value"]
+
+        version = None
+        try:
+            out = subprocess.run(
+                ["trivy", "version", "--format", "json"],
+                capture_output=True,
+                text=True,
+                check=True,
+                timeout=10,
+            ).stdout
+            db = json.loads(out).get("VulnerabilityDB") or {}
+            version = db.get("UpdatedAt") or db.get("Version")
+            version = str(version) if version else None
+        except Exception:
+            version = None
+
+        previous = _db_version["value"]
+        _db_version.update(value=version, checked_at=now)
+
+    if version and version != previous:
+        # A DB update makes every cached result stale
+        try:
+            removed = _scan_cache.invalidate_tags_except(version)
+            if removed:
+                print(f"Trivy DB updated to {version}, dropped {removed} cached scans")
+        except Exception as e:
+            print(f"Scan cache invalidation failed: {e}")
+        if sbom_store.SBOM_ENABLED and SBOM_REEVALUATE_ON_DB_UPDATE:
+            threading.Thread(target=_reevaluate_in_background, name="sbom-reevaluate", daemon=True).start()
+    return version
+
+
+def _resolve_image_digest(image_name: str):
+    """Content-addressed ID of a local image, or None if it can't be resolved."""
+    try:
+        return get_docker_client().images.get(image_name).id
+    except Exception:
+        return None
+
+
+def get_cached_scan(digest: str):
+    """Cached scan of an image digest against the current vulnerability DB, or None."""
+    db_version = get_trivy_db_version() if SCAN_CACHE_ENABLED and digest else None
+    if not db_version:
+        return None
+    try:
+        return _scan_cache.get(digest, tag=db_version)
+    except Exception as e:
+        print(f"Scan cache read failed: {e}")
+        return None
+
+
+def scan_image(image_name: str, digest: str = None):
     """
     Run Trivy image scan safely.
     Returns parsed JSON or raises a controlled error.
+    Results are served from the scan cache when the same image digest was already
+    scanned against the current vulnerability DB. Otherwise an image with a stored SBOM
+    is re-scanned from the SBOM alone; the first full scan of a digest queues its SBOM
+    generation in the background, so the result is returned without waiting for it.
+    """
+    if not SCAN_CACHE_ENABLED:
+        return _run_image_scan(image_name)
+
+    digest = digest or _resolve_image_digest(image_name)
+    cached = get_cached_scan(digest)
+    if cached is not None:
+        return cached
+
+    record = sbom_store.get_record(digest) if digest and sbom_store.SBOM_ENABLED else None
+    result = None
+    if record is not None:
+        try:
+            result = _run_sbom_scan(record)
+        except TrivyTimeoutError:
+            # The time budget is spent; a full image scan on top would only run past it
+            raise
+        except RuntimeError as e:
+            print(f"SBOM scan failed for {image_name}, scanning the image instead: {e}")
+    full_scan = result is None
+    if full_scan:
+        result = _run_image_scan(image_name)
+
+    if digest:
+        # The scan itself may have refreshed the DB, so stamp with the version it actually used
+        db_version = get_trivy_db_version(refresh=True)
+        if db_version:
+            _cache_scan(digest, result, db_version)
+            if record is not None:
+                _record_evaluation(digest, result, db_version)
+        if full_scan and record is None and sbom_store.SBOM_ENABLED:
+            generate_sbom_later(image_name, digest, result, db_version)
+    return result
+
+
+def generate_sbom_later(image_name: str, digest: str, full_scan: dict, db_version: str = None):
+    """
+    Queues SBOM generation for an image just scanned in full (at most once per digest at a time)
+    and records the scan as its first evaluation once stored. Returns the Future.
+    """
+    with _sbom_pending_lock:
+        future = _sbom_pending.get(digest)
+        if future is not None:
+            return future
+        future = _sbom_pool.submit(_store_sbom, image_name, digest, full_scan, db_version)
+        _sbom_pending[digest] = future
+    # Outside the lock: runs right away in this thread if the job has already finished
+    future.add_done_callback(lambda done: _forget_pending_sbom(digest, done))
+    return future
+
+
+def _store_sbom(image_name: str, digest: str, full_scan: dict, db_version: str = None):
+    try:
+        if sbom_store.get_record(digest) is not None:
+            return None
+        record = sbom_store.create_record(image_name, digest, full_scan)
+        if record is not None and db_version:
+            _record_evaluation(digest, full_scan, db_version)
+        return record
+    except Exception as e:
+        print(f"Background SBOM generation failed for {image_name}: {e}")
+        return None
+
+
+def _forget_pending_sbom(digest: str, future):
+    with _sbom_pending_lock:
+        if _sbom_pending.get(digest) is future:
+            del _sbom_pending[digest]
+
+
+def reevaluate_known_images(force: bool = False, on_progress=None) -> dict:
+    """
+    Re-scans every stored SBOM against the current vulnerability DB without touching image
+    layers, refreshing the scan cache on the way. Images already evaluated against this DB
+    are skipped unless `force`. Returns the run summary plus what became newly vulnerable.
+    """
+    with _reevaluation_lock:
+        started = time.monotonic()
+        db_version = get_trivy_db_version(refresh=True)
+        if not db_version:
+            raise RuntimeError("Trivy vulnerability DB unavailable")
+
+        digests = sbom_store.known_digests()
+        counts = {"evaluated": 0, "skipped": 0, "failed": 0}
+        for i, digest in enumerate(digests):
+            previous = sbom_store.get_evaluation(digest)
+            record = None
+            if force or not previous or previous.get("db_version") != db_version:
+                record = sbom_store.get_record(digest)
+
+            if record is None:
+                counts["skipped"] += 1
+            else:
+                try:
+                    result = _run_sbom_scan(record)
+                    _cache_scan(digest, result, db_version)
+                    _record_evaluation(digest, result, db_version)
+                    counts["evaluated"] += 1
+                except RuntimeError as e:
+                    print(f"SBOM re-evaluation failed for {record['image']}: {e}")
+                    counts["failed"] += 1
+
+            if on_progress:
+                on_progress({"done": i + 1, "total": len(digests), **counts})
+
+        return {
+            "db_version": db_version,
+            "images": len(digests),
+            **counts,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "newly_vulnerable": newly_vulnerable(db_version),
+        }
+
+
+def newly_vulnerable(db_version: str = None) -> list:
     """
+    Images whose latest evaluation (against `db_version`, default the current DB) found
+    vulnerabilities the previous DB didn't report, most severe first.
+    """
+    db_version = db_version or get_trivy_db_version()
+    images = []
+    for digest in sbom_store.known_digests():
+        evaluation = sbom_store.get_evaluation(digest)
+        if not evaluation or evaluation.get("db_version") != db_version or not evaluation.get("new"):
+            continue
+        images.append({
+            "image": evaluation.get("image"),
+            "digest": digest,
+            "previous_db_version": evaluation.get("previous_db_version"),
+            "new": evaluation["new"],
+            "no_longer_reported": evaluation.get("no_longer_reported", 0),
+        })
+    images.sort(key=lambda i: (_SEVERITY_ORDER.get(i["new"][0]["severity"], 4), -len(i["new"])))
+    return images
+
+
+def _record_evaluation(digest: str, result: dict, db_version: str):
+    """Stores this evaluation's vulnerability set, diffed against the one from the previous DB."""
+    previous = sbom_store.get_evaluation(digest)
+    if previous and previous.get("db_version") == db_version:
+        # Same DB: keep the diff against the DB before it
+        base = previous.get("previous_vulnerabilities")
+        previous_db_version = previous.get("previous_db_version")
+    else:
+        base = sorted(previous.get("vulnerabilities") or {}) if previous else None
+        previous_db_version = previous.get("db_version") if previous else None
+    base = set(base) if base is not None else None
+
+    current = sbom_store.vulnerability_keys(result)
+    new = [] if base is None else [v for k, v in current.items() if k not in base]
+    new.sort(key=lambda v: _SEVERITY_ORDER.get(v["severity"], 4))
+    sbom_store.save_evaluation(digest, {
+        "image": result.get("ArtifactName"),
+        "db_version": db_version,
+        "evaluated_at": time.time(),
+        "vulnerabilities": current,
+        "previous_db_version": previous_db_version,
+        "previous_vulnerabilities": sorted(base) if base is not None else None,
+        "new": new,
+        "no_longer_reported": 0 if base is None else sum(1 for k in base if k not in current),
+    })
+
+
+def _reevaluate_in_background():
+    try:
+        summary = reevaluate_known_images()
+        print(f"SBOM re-evaluation against DB {summary['db_version']}: {summary['evaluated']} images, "
+              f"{len(summary['newly_vulnerable'])} newly vulnerable")
+    except Exception as e:
+        print(f"SBOM re-evaluation failed: {e}")
+
+
+def _cache_scan(digest: str, result: dict, db_version: str):
+    try:
+        _scan_cache.set(digest, result, tag=db_version)
+    except Exception as e:
+        print(f"Scan cache write failed: {e}")
+
+
+def _run_sbom_scan(record: dict):
+    return _prefer_server(lambda server_url: sbom_store.scan_sbom(record, server_url=server_url), "SBOM scan")
+
+
+def _run_image_scan(image_name: str):
+    return _prefer_server(lambda server_url: _run_trivy_image(image_name, server_url=server_url), "scan")
+
+
+def _prefer_server(scan, what: str):
+    """
+    Runs scan(server_url) against the long-lived server (DB already loaded) when it is up.
+    Only an unreachable server triggers a standalone re-run: a bad image fails the same way
+    either way, and a timed-out scan has already used the caller's time budget.
+    """
+    server = get_trivy_server()
+    server_url = server.client_url() if server else None
+    if server_url:
+        try:
+            return scan(server_url)
+        except TrivyTimeoutError:
+            raise
+        except RuntimeError as e:
+            if server.is_healthy():
+                raise
+            print(f"Trivy server unreachable during {what}, falling back to standalone: {e}")
+            server.mark_unhealthy()
+    return scan(None)
+
+
+def _run_trivy_image(image_name: str, server_url: str = None):
     with tempfile.TemporaryDirectory() as tmp:
         output_file = f"{tmp}/result.json"
 
@@ -20,8 +328,11 @@ def scan_image(image_name: str):
             "json",
             "--output",
             output_file,
-            image_name,
         ]
+        if server_url:
+            # Client mode: vulnerability matching happens in the server, which keeps the DB in memory
+            cmd += ["--server", server_url]
+        cmd.append(image_name)
 
         try:
             subprocess.run(
@@ -31,9 +342,11 @@ def scan_image(image_name: str):
                 stderr=subprocess.DEVNULL,
                 timeout=60 # Prevent hangs
             )
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        except subprocess.TimeoutExpired:
+            raise TrivyTimeoutError("Trivy scan timed out.")
+        except (subprocess.CalledProcessError, FileNotFoundError):
             raise RuntimeError(
-                "Trivy scan failed or timed out. Ensure Trivy is installed and working."
+                "Trivy scan failed. Ensure Trivy is installed and working."
             )
 
         with open(output_file) as f:
@@ -42,7 +355,9 @@ def scan_image(image_name: str):
 def scan_dockerfile(content: str):
     """
     Run Trivy config scan on Dockerfile content.
-    Returns parsed JSON findings.
+    Returns parsed JSON findings or raises a controlled error.
+    Config scans only evaluate the bundled misconfiguration checks and never load the
+    vulnerability DB, so they stay standalone rather than going through the Trivy server.
     """
     with tempfile.TemporaryDirectory() as tmp:
         df_path = f"{tmp}/Dockerfile"
@@ -71,9 +386,11 @@ def scan_dockerfile(content: str):
                 stderr=subprocess.DEVNULL,
                 timeout=30 # Faster for config scan
             )
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
-            # If scan fails, return empty findings
-            return {"Results": []}
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+            # Raised rather than reported as "no findings", so a failed scan is never cached as clean
+            raise RuntimeError(
+                "Trivy config scan failed or timed out. Ensure Trivy is installed and working."
+            )
 
         with open(output_file) as f:
             return json.load(f)
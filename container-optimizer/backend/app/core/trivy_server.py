@@ -0,0 +1,147 @@
+import os
+import atexit
+import shutil
+import subprocess
+import threading
+import time
+import requests
+
+# auto:     start and supervise a local `trivy server`, fall back to plain subprocess scans until it's up
+# external: use an already running server at TRIVY_SERVER_URL
+# off:      always run standalone `trivy image` processes
+TRIVY_SERVER_MODE = os.getenv("TRIVY_SERVER_MODE", "auto").lower()
+TRIVY_SERVER_LISTEN = os.getenv("TRIVY_SERVER_LISTEN", "127.0.0.1:4954")
+TRIVY_SERVER_URL = os.getenv("TRIVY_SERVER_URL")
+TRIVY_SERVER_STARTUP_TIMEOUT = float(os.getenv("TRIVY_SERVER_STARTUP_TIMEOUT", "180"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("TRIVY_SERVER_HEALTH_INTERVAL", "15"))
+STARTUP_PROBE_INTERVAL = 1.0
+MAX_RESTART_BACKOFF = 300
+
+
+class TrivyTimeoutError(RuntimeError):
+    """A trivy run used up its time budget; running it again elsewhere would only double the wait."""
+
+
+class TrivyServer:
+    """
+    Owns one long-lived `trivy server` process so the vulnerability DB is loaded once
+    per backend lifetime. A supervisor thread health-checks it and restarts it
+    (with backoff) if it exits or stops answering.
+    """
+
+    def __init__(self, listen: str = TRIVY_SERVER_LISTEN, url: str = None):
+        self.listen = listen
+        self.url = url or f"http://{listen}"
+        self.managed = url is None
+        self._proc = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._supervisor = None
+        self._stopped = threading.Event()
+        self._restart_backoff = 5.0
+
+    def client_url(self):
+        """URL to pass to `trivy --server`, or None while the server isn't usable."""
+        self._ensure_supervisor()
+        return self.url if self._ready else None
+
+    def mark_unhealthy(self):
+        """Called by scanners when the server stopped answering; the supervisor will re-check."""
+        self._ready = False
+
+    def is_healthy(self) -> bool:
+        try:
+            resp = requests.get(f"{self.url}/healthz", timeout=2)
+            return resp.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            self._ready = False
+            if self._proc and self._proc.poll() is None:
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+            self._proc = None
+
+    def _ensure_supervisor(self):
+        if self._supervisor is not None:
+            return
+        with self._lock:
+            if self._supervisor is None and not self._stopped.is_set():
+                self._supervisor = threading.Thread(target=self._supervise, name="trivy-server", daemon=True)
+                self._supervisor.start()
+
+    def _start_process(self):
+        print(f"Starting trivy server on {self.listen}...")
+        self._proc = subprocess.Popen(
+            ["trivy", "server", "--listen", self.listen],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _wait_until_healthy(self) -> bool:
+        # First start may need to download the DB, hence the generous timeout
+        deadline = time.monotonic() + TRIVY_SERVER_STARTUP_TIMEOUT
+        while time.monotonic() < deadline and not self._stopped.is_set():
+            if self.managed and self._proc.poll() is not None:
+                return False
+            if self.is_healthy():
+                return True
+            time.sleep(STARTUP_PROBE_INTERVAL)
+        return False
+
+    def _supervise(self):
+        while not self._stopped.is_set():
+            if not self.managed:
+                self._ready = self.is_healthy()
+            elif self._proc is not None and self._proc.poll() is None and self.is_healthy():
+                self._ready = True
+                self._restart_backoff = 5.0
+            else:
+                self._ready = False
+                with self._lock:
+                    if self._proc is not None and self._proc.poll() is None:
+                        self._proc.kill()
+                    try:
+                        self._start_process()
+                    except OSError as e:
+                        print(f"Could not start trivy server: {e}")
+                        self._proc = None
+
+                if self._proc is not None and self._wait_until_healthy():
+                    print("Trivy server is ready")
+                    self._ready = True
+                    self._restart_backoff = 5.0
+                else:
+                    print(f"Trivy server not healthy, retrying in {self._restart_backoff:.0f}s")
+                    self._stopped.wait(self._restart_backoff)
+                    self._restart_backoff = min(self._restart_backoff * 2, MAX_RESTART_BACKOFF)
+                    continue
+
+            self._stopped.wait(HEALTH_CHECK_INTERVAL)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_trivy_server():
+    """Process-wide Trivy server handle, or None when server mode is disabled or unavailable."""
+    global _server
+    if TRIVY_SERVER_MODE == "off":
+        return None
+    if TRIVY_SERVER_MODE == "external" and not TRIVY_SERVER_URL:
+        return None
+    if TRIVY_SERVER_MODE == "auto" and shutil.which("trivy") is None:
+        return None
+
+    with _server_lock:
+        if _server is None:
+            _server = TrivyServer(url=TRIVY_SERVER_URL if TRIVY_SERVER_MODE == "external" else None)
+            atexit.register(_server.stop)
+        return _server
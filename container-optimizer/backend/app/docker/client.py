@@ -1,21 +1,73 @@
 import docker
 import os
+import threading
+import time
 
-def get_docker_client():
-    try:
+# Connections kept alive to the daemon socket, shared by all request/job threads
+DOCKER_POOL_SIZE = int(os.getenv("DOCKER_POOL_SIZE", "16"))
+DOCKER_TIMEOUT = int(os.getenv("DOCKER_TIMEOUT", "60"))
+# How long a successful ping is trusted before the next call re-checks the daemon
+DOCKER_HEALTH_INTERVAL = float(os.getenv("DOCKER_HEALTH_INTERVAL", "30"))
+
+
+class DockerClientManager:
+    """
+    Process-wide, thread-safe holder of a single pooled DockerClient.
+    The daemon is pinged lazily (at most once per health interval) and the client is
+    rebuilt if that check fails. A replaced client is never closed here: other threads
+    may still be mid-call or streaming on it, so its connections are released when the
+    last of them drops its reference.
+    """
+
+    def __init__(self, pool_size: int = DOCKER_POOL_SIZE, timeout: int = DOCKER_TIMEOUT,
+                 health_interval: float = DOCKER_HEALTH_INTERVAL):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._client = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> docker.DockerClient:
+        with self._lock:
+            if self._client is not None and time.monotonic() - self._checked_at < self.health_interval:
+                return self._client
+
+            if self._client is not None:
+                try:
+                    self._client.ping()
+                    self._checked_at = time.monotonic()
+                    return self._client
+                except Exception as e:
+                    print(f"Docker connection unhealthy, reconnecting: {e}")
+
+            try:
+                client = self._connect()
+                client.ping()
+            except Exception as e:
+                raise RuntimeError(f"Docker not accessible: {e}")
+
+            # Swapped only once the new client answers; until then callers keep the old one
+            self._client = client
+            self._checked_at = time.monotonic()
+            return client
+
+    def _connect(self) -> docker.DockerClient:
         # If Docker Desktop is used, force correct socket
-        # Try standard environment variable first
-        socket_path = os.getenv("DOCKER_HOST", "unix:///var/run/docker.sock")
-        
         # Fallback to local user desktop socket if it exists (generalized)
         user_socket = os.path.expanduser("~/.docker/desktop/docker.sock")
         if os.path.exists(user_socket):
-            client = docker.DockerClient(base_url=f"unix://{user_socket}")
-        else:
-            client = docker.from_env()
+            return docker.DockerClient(
+                base_url=f"unix://{user_socket}",
+                timeout=self.timeout,
+                max_pool_size=self.pool_size,
+            )
+        # Otherwise honour DOCKER_HOST / standard environment
+        return docker.from_env(timeout=self.timeout, max_pool_size=self.pool_size)
 
-        client.ping()
-        return client
 
-    except Exception as e:
-        raise RuntimeError(f"Docker not accessible: {e}")
+_manager = DockerClientManager()
+
+
+def get_docker_client():
+    return _manager.get()
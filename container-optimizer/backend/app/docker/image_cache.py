@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+
+IMAGE_METADATA_TTL = float(os.getenv("IMAGE_METADATA_TTL", "10"))
+
+
+class ImageMetadataCache:
+    """
+    Short-lived index of all local images ({image_id: {"tags", "size"}}) built from a
+    single /images/json call, so listings can join image data in memory.
+    """
+
+    def __init__(self, ttl: float = IMAGE_METADATA_TTL):
+        self.ttl = ttl
+        self._index = {}
+        self._loaded_at = 0.0
+        # IDs a fresh load didn't list (removed images, missing ImageIDs); not refreshed for again until the next load
+        self._misses = set()
+        self._lock = threading.Lock()
+
+    def get_index(self, client, force: bool = False) -> dict:
+        with self._lock:
+            if force or time.monotonic() - self._loaded_at >= self.ttl:
+                self._load(client)
+            return self._index
+
+    def lookup(self, client, image_ids) -> dict:
+        """
+        Index covering image_ids, refreshed once if any of them is unknown (e.g. a just-pulled image).
+        IDs still missing after that refresh are left out until the index expires anyway.
+        """
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at >= self.ttl
+            if expired or any(i not in self._index and i not in self._misses for i in image_ids):
+                self._load(client)
+                self._misses = {i for i in image_ids if i not in self._index}
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _load(self, client):
+        self._index = {
+            img["Id"]: {
+                "tags": [t for t in (img.get("RepoTags") or []) if t != "<none>:<none>"],
+                "size": img.get("Size") or 0,
+            }
+            for img in client.api.images(all=False)
+        }
+        self._loaded_at = time.monotonic()
+        self._misses = set()
+
+
+_cache = ImageMetadataCache()
+
+
+def get_image_metadata_cache() -> ImageMetadataCache:
+    return _cache
@@ -0,0 +1,196 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.docker.image_cache import get_image_metadata_cache
+from app.core.layer_analyzer import _map_diff_ids
+
+INSPECT_WORKERS = 8
+TOP_SHARED_LAYERS = 20
+
+_inspect_pool = ThreadPoolExecutor(max_workers=INSPECT_WORKERS, thread_name_prefix="layer-index")
+
+
+def chain_ids(diff_ids: list) -> list:
+    """
+    Chain IDs for a RootFS diff ID list (OCI image spec). The engine stores layers by chain ID,
+    so two images share storage for a layer only if the layer and everything below it match.
+    """
+    chain = []
+    for diff_id in diff_ids:
+        if not chain:
+            chain.append(diff_id)
+        else:
+            chain.append("sha256:" + hashlib.sha256(f"{chain[-1]} {diff_id}".encode()).hexdigest())
+    return chain
+
+
+class HostLayerIndex:
+    """
+    Layer index over every local image: {image_id: [(chain_id, diff_id), ...]} plus the byte size
+    of each layer, kept up to date incrementally. A refresh lists images through the shared
+    /images/json cache and inspects only images it hasn't seen; removed images are dropped.
+    Aggregates are recomputed only when the image set changes.
+    """
+
+    def __init__(self):
+        self._images = {}  # image_id -> {"tags", "size", "layers": [chain_id, ...]}
+        self._layers = {}  # chain_id -> {"diff_id", "size"}
+        self._summary = None
+        self._lock = threading.Lock()
+
+    def refresh(self, client) -> bool:
+        """Syncs with the engine; returns True if the image set changed."""
+        listing = get_image_metadata_cache().get_index(client)
+        with self._lock:
+            added = [i for i in listing if i not in self._images]
+            removed = [i for i in self._images if i not in listing]
+            # Tags move between images without changing IDs (re-tag, pull of a newer tag)
+            retagged = False
+            for image_id, meta in listing.items():
+                img = self._images.get(image_id)
+                if img is not None and img["tags"] != meta["tags"]:
+                    img["tags"] = meta["tags"]
+                    retagged = True
+
+            for image_id in removed:
+                del self._images[image_id]
+            for image_id, layers in zip(added, _inspect_pool.map(lambda i: _read_layers(client, i), added)):
+                if layers is None:
+                    # Removed between the listing and the inspect
+                    continue
+                for chain_id, diff_id, size in layers:
+                    entry = self._layers.setdefault(chain_id, {"diff_id": diff_id, "size": None})
+                    if size is not None and entry["size"] is None:
+                        entry["size"] = size
+                self._images[image_id] = {
+                    "tags": listing[image_id]["tags"],
+                    "size": listing[image_id]["size"],
+                    "layers": [chain_id for chain_id, _, _ in layers],
+                }
+
+            changed = bool(added or removed)
+            if removed:
+                referenced = {c for img in self._images.values() for c in img["layers"]}
+                self._layers = {c: l for c, l in self._layers.items() if c in referenced}
+            if changed or retagged or self._summary is None:
+                self._summary = self._summarize()
+            return changed
+
+    def summary(self, client) -> dict:
+        self.refresh(client)
+        with self._lock:
+            return self._summary
+
+    def reclaimable(self, client, refs: list) -> dict:
+        """Bytes freed by removing all of `refs` (image IDs, short IDs or tags) together."""
+        self.refresh(client)
+        with self._lock:
+            ids, unknown = self._resolve(refs)
+            selected = set(ids)
+            freed = set()
+            for image_id in ids:
+                freed.update(self._images[image_id]["layers"])
+            for image_id, img in self._images.items():
+                if image_id not in selected:
+                    freed.difference_update(img["layers"])
+            return {
+                "images": ids,
+                "unknown": unknown,
+                "layers": len(freed),
+                "reclaimable_bytes": sum(self._size(c) for c in freed),
+            }
+
+    def _summarize(self) -> dict:
+        refcount = {}
+        for img in self._images.values():
+            for chain_id in set(img["layers"]):
+                refcount[chain_id] = refcount.get(chain_id, 0) + 1
+
+        images = []
+        for image_id, img in self._images.items():
+            layers = set(img["layers"])
+            unique = sum(self._size(c) for c in layers if refcount[c] == 1)
+            total = sum(self._size(c) for c in layers)
+            images.append({
+                "id": image_id,
+                "tags": img["tags"],
+                "size_bytes": img["size"],
+                "layers": len(img["layers"]),
+                "unique_bytes": unique,
+                "shared_bytes": total - unique,
+                # Nothing else references its unique layers, so removing the image frees exactly these
+                "reclaimable_bytes": unique,
+                "sizes_complete": all(self._layers[c]["size"] is not None for c in layers),
+            })
+        images.sort(key=lambda i: i["reclaimable_bytes"], reverse=True)
+
+        shared = [
+            {"chain_id": c, "diff_id": self._layers[c]["diff_id"], "size_bytes": self._size(c), "images": n}
+            for c, n in refcount.items() if n > 1
+        ]
+        shared.sort(key=lambda l: l["size_bytes"] * (l["images"] - 1), reverse=True)
+
+        disk = sum(self._size(c) for c in self._layers)
+        virtual = sum(i["size_bytes"] for i in images)
+        return {
+            "totals": {
+                "images": len(images),
+                "layers": len(self._layers),
+                "shared_layers": len(shared),
+                # What `docker images` adds up to vs what the layers actually take once each
+                "virtual_bytes": virtual,
+                "disk_bytes": disk,
+                "saved_by_sharing_bytes": max(virtual - disk, 0),
+            },
+            "images": images,
+            "shared_layers": shared[:TOP_SHARED_LAYERS],
+        }
+
+    def _size(self, chain_id: str) -> int:
+        return self._layers[chain_id]["size"] or 0
+
+    def _resolve(self, refs: list):
+        ids, unknown = [], []
+        for ref in refs:
+            match = next((i for i, img in self._images.items() if _matches(ref, i, img["tags"])), None)
+            if match is None:
+                unknown.append(ref)
+            elif match not in ids:
+                ids.append(match)
+        return ids, unknown
+
+
+def _matches(ref: str, image_id: str, tags: list) -> bool:
+    if ref in tags or f"{ref}:latest" in tags:
+        return True
+    short = ref.split(":", 1)[-1]
+    return len(short) >= 12 and image_id.split(":", 1)[-1].startswith(short)
+
+
+def _read_layers(client, image_id: str):
+    """[(chain_id, diff_id, size or None), ...] oldest first, from inspect RootFS.Layers and history sizes."""
+    try:
+        attrs = client.api.inspect_image(image_id)
+        history = client.api.history(image_id)
+    except Exception as e:
+        print(f"Layer index: skipping {image_id[:19]}: {e}")
+        return None
+
+    diff_ids = (attrs.get("RootFS") or {}).get("Layers") or []
+    oldest_first = list(reversed(history))
+    sizes = [None] * len(diff_ids)
+    digests = _map_diff_ids(oldest_first, diff_ids)
+    if any(digests):
+        it = iter(range(len(diff_ids)))
+        for entry, digest in zip(oldest_first, digests):
+            if digest is not None:
+                sizes[next(it)] = int(entry.get("Size") or 0)
+
+    return list(zip(chain_ids(diff_ids), diff_ids, sizes))
+
+
+_index = HostLayerIndex()
+
+
+def get_host_layer_index() -> HostLayerIndex:
+    return _index
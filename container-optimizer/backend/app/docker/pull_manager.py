@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+from app.core.memo import LRUCache
+from app.core.singleflight import SingleFlight
+from app.core.registry_client import parse_reference
+from app.docker.client import get_docker_client
+from app.docker.image_cache import get_image_metadata_cache
+
+# Progress callbacks fire at most this often (plus once per finished layer and at the end)
+PULL_PROGRESS_INTERVAL = float(os.getenv("PULL_PROGRESS_INTERVAL", "0.5"))
+# A reference pulled this recently is trusted to still point at the same image
+RECENT_PULL_TTL = float(os.getenv("RECENT_PULL_TTL", "600"))
+
+# Engine pull statuses after which a layer's bytes are all on disk
+_LAYER_DONE = {"Download complete", "Pull complete", "Already exists"}
+
+
+class PullError(RuntimeError):
+    pass
+
+
+class PullProgress:
+    """Per-layer byte counters folded from the Engine API's streaming pull messages."""
+
+    def __init__(self, image_ref: str):
+        self.image_ref = image_ref
+        self.status = "starting"
+        self.digest = None
+        self.layers = {}  # layer id -> {"status", "downloaded", "total"}
+
+    def update(self, message: dict) -> bool:
+        """Applies one message; returns True if a layer finished (worth reporting right away)."""
+        if message.get("error"):
+            raise PullError(message.get("error"))
+
+        status = message.get("status") or ""
+        layer_id = message.get("id")
+        detail = message.get("progressDetail") or {}
+
+        if status.startswith("Digest: "):
+            self.digest = status[len("Digest: "):].strip()
+        # Messages about the image itself have no `id` ("Digest: ...") or carry the tag ("Pulling from ...")
+        if not layer_id or status.startswith("Pulling from"):
+            self.status = status or self.status
+            return False
+
+        layer = self.layers.setdefault(layer_id, {"status": status, "downloaded": 0, "total": None})
+        layer["status"] = status
+        if status == "Downloading":
+            layer["downloaded"] = detail.get("current") or layer["downloaded"]
+            layer["total"] = detail.get("total") or layer["total"]
+        elif status in _LAYER_DONE:
+            if layer["total"]:
+                layer["downloaded"] = layer["total"]
+            return True
+        self.status = "downloading"
+        return False
+
+    def snapshot(self) -> dict:
+        # Copied first: other callers' threads may read while the pulling thread updates
+        layers = [{"id": i, **l} for i, l in list(self.layers.items())]
+        downloaded = sum(l["downloaded"] for l in layers)
+        total = sum(l["total"] or 0 for l in layers)
+        done = sum(1 for l in layers if l["status"] in _LAYER_DONE)
+        return {
+            "image": self.image_ref,
+            "status": self.status,
+            "layers_total": len(layers),
+            "layers_done": done,
+            "bytes_downloaded": downloaded,
+            # Only counts layers whose size the engine has announced so far
+            "bytes_total": total,
+            "percent": round(100 * downloaded / total, 1) if total else None,
+            "layers": layers,
+        }
+
+
+class PullManager:
+    """
+    Image pulls shared across requests:
+    - concurrent pulls of the same reference run once; every caller gets the progress and the result
+    - a recently pulled reference whose image is still local is answered without asking the registry
+    """
+
+    def __init__(self):
+        self._flight = SingleFlight()
+        self._recent = LRUCache(maxsize=256, ttl=RECENT_PULL_TTL)
+        self._listeners = {}  # reference -> [callback, ...]
+        self._progress = {}  # reference -> PullProgress while in flight
+        self._lock = threading.Lock()
+
+    def pull(self, image_ref: str, on_progress=None, platform: str = None) -> dict:
+        """`platform` ("linux/arm64") picks the image out of a multi-arch reference instead of the daemon's default."""
+        ref = canonical_reference(image_ref)
+        if platform:
+            ref = f"{ref} ({platform})"
+        client = get_docker_client()
+
+        recent = self._recent_entry(ref, client)
+        if recent is not None:
+            return {**recent, "cached": True}
+
+        with self._lock:
+            if on_progress:
+                self._listeners.setdefault(ref, []).append(on_progress)
+            progress = self._progress.get(ref)
+        if on_progress and progress is not None:
+            # Joining a pull already under way: catch up right away
+            _notify(on_progress, progress.snapshot())
+
+        try:
+            return {**self._flight.do(ref, lambda: self._pull(client, image_ref, ref, platform)), "cached": False}
+        finally:
+            if on_progress:
+                with self._lock:
+                    listeners = self._listeners.get(ref, [])
+                    if on_progress in listeners:
+                        listeners.remove(on_progress)
+                    if not listeners:
+                        self._listeners.pop(ref, None)
+
+    def recent(self, image_ref: str, client=None):
+        """The last pull of this reference if it's recent and its image is still local, else None."""
+        return self._recent_entry(canonical_reference(image_ref), client)
+
+    def _recent_entry(self, ref: str, client=None):
+        recent = self._recent.get(ref)
+        if recent is not None and _is_local(client or get_docker_client(), recent["image_id"]):
+            return recent
+        return None
+
+    def in_flight(self) -> dict:
+        with self._lock:
+            return {ref: p.snapshot() for ref, p in self._progress.items()}
+
+    def _pull(self, client, image_ref: str, ref: str, platform: str = None) -> dict:
+        progress = PullProgress(image_ref)
+        with self._lock:
+            self._progress[ref] = progress
+        started = time.monotonic()
+        last_sent = 0.0
+        try:
+            print(f"Pulling image: {image_ref}...")
+            try:
+                for message in client.api.pull(image_ref, stream=True, decode=True, platform=platform):
+                    layer_done = progress.update(message)
+                    now = time.monotonic()
+                    if layer_done or now - last_sent >= PULL_PROGRESS_INTERVAL:
+                        last_sent = now
+                        self._broadcast(ref, progress.snapshot())
+                image = client.images.get(image_ref)
+            except PullError:
+                raise
+            except Exception as e:
+                raise PullError(f"Failed to pull {image_ref}: {e}")
+
+            progress.status = "complete"
+            self._broadcast(ref, progress.snapshot())
+            result = {
+                "image": image_ref,
+                "image_id": image.id,
+                "digest": progress.digest,
+                "bytes_downloaded": progress.snapshot()["bytes_downloaded"],
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            }
+            self._recent.set(ref, result)
+            # The tag may have moved to this image (or off another): re-list on next use
+            get_image_metadata_cache().invalidate()
+            return result
+        finally:
+            with self._lock:
+                self._progress.pop(ref, None)
+
+    def _broadcast(self, ref: str, snapshot: dict):
+        with self._lock:
+            listeners = list(self._listeners.get(ref, []))
+        for callback in listeners:
+            _notify(callback, snapshot)
+
+
+def canonical_reference(image_ref: str) -> str:
+    """One key per image however it's written: "node:20" == "docker.io/library/node:20"."""
+    registry, repository, reference = parse_reference(image_ref)
+    separator = "@" if reference.startswith("sha256:") else ":"
+    return f"{registry}/{repository}{separator}{reference}"
+
+
+def _notify(callback, snapshot: dict):
+    try:
+        callback(snapshot)
+    except Exception as e:
+        print(f"Pull progress handler error: {e}")
+
+
+def _is_local(client, image_id: str) -> bool:
+    try:
+        client.images.get(image_id)
+        return True
+    except Exception:
+        return False
+
+
+_manager = PullManager()
+
+
+def get_pull_manager() -> PullManager:
+    return _manager
@@ -0,0 +1,53 @@
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.disk_cache import DiskCache
+
+def _cache(tmp, **kwargs):
+    return DiskCache("test", path=os.path.join(tmp, "cache.db"), **kwargs)
+
+def test_roundtrip_and_tag_invalidation():
+    print("Testing disk cache roundtrip...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp)
+        report = {"Results": [{"Target": "alpine", "Vulnerabilities": [{"VulnerabilityID": "CVE-1"}]}]}
+        cache.set("sha256:abc", report, tag="db-1")
+
+        assert cache.get("sha256:abc", tag="db-1") == report
+        assert cache.get("sha256:missing") is None
+        # A different DB version must not be served
+        assert cache.get("sha256:abc", tag="db-2") is None
+
+        cache.set("sha256:old", {}, tag="db-1")
+        cache.set("sha256:new", {}, tag="db-2")
+        assert cache.invalidate_tags_except("db-2") == 1
+        assert cache.keys() == ["sha256:new"]
+
+def test_ttl_and_lru_eviction():
+    print("Testing disk cache eviction...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = _cache(tmp, ttl=0.05)
+        cache.set("k", 1)
+        time.sleep(0.1)
+        assert cache.get("k") is None, "Expired entry should not be returned"
+
+        cache = DiskCache("lru", path=os.path.join(tmp, "cache.db"), max_entries=2)
+        cache.set("a", 1)
+        time.sleep(0.01)
+        cache.set("b", 2)
+        time.sleep(0.01)
+        cache.get("a")  # 'a' is now more recently used than 'b'
+        time.sleep(0.01)
+        cache.set("c", 3)
+        assert sorted(cache.keys()) == ["a", "c"]
+
+if __name__ == "__main__":
+    try:
+        test_roundtrip_and_tag_invalidation()
+        test_ttl_and_lru_eviction()
+        print("--- DISK CACHE TEST PASSED ---")
+    except AssertionError as e:
+        print(f"--- TEST FAILED: {e} ---")
+        sys.exit(1)
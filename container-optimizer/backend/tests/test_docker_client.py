@@ -0,0 +1,105 @@
+import sys
+import os
+import gc
+import time
+import weakref
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.docker.client import DockerClientManager
+
+class FakeDockerClient:
+    def __init__(self, n):
+        self.n = n
+        self.healthy = True
+        self.closed = False
+
+    def ping(self):
+        if not self.healthy:
+            raise ConnectionError("daemon went away")
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def call(self):
+        # Stands in for an API call or stream another thread has in progress
+        assert not self.closed, "client closed while in use"
+        return self.n
+
+def _manager():
+    manager = DockerClientManager(health_interval=0)
+    created = []
+
+    def connect():
+        time.sleep(0.01)
+        created.append(FakeDockerClient(len(created)))
+        return created[-1]
+
+    manager._connect = connect
+    return manager, created
+
+def test_reconnect_under_concurrent_use():
+    print("Testing Docker client reconnect under load...")
+    manager, created = _manager()
+    old = manager.get()
+    stop = threading.Event()
+    errors = []
+
+    def busy_user():
+        # Holds the client it was handed across many calls, like a stats stream does
+        client = manager.get()
+        try:
+            while not stop.is_set():
+                client.call()
+        except Exception as e:
+            errors.append(e)
+
+    users = [threading.Thread(target=busy_user) for _ in range(4)]
+    for t in users:
+        t.start()
+    time.sleep(0.02)
+
+    old.healthy = False
+    results = []
+    getters = [threading.Thread(target=lambda: results.append(manager.get())) for _ in range(8)]
+    for t in getters:
+        t.start()
+    for t in getters:
+        t.join()
+    time.sleep(0.02)
+    stop.set()
+    for t in users:
+        t.join()
+
+    # One replacement for all concurrent callers, and the old client was never closed under its users
+    assert errors == []
+    assert len(created) == 2 and all(r is created[1] for r in results)
+    assert not old.closed
+
+    # Nothing in the manager keeps the replaced client alive once its users are done with it
+    ref = weakref.ref(old)
+    del old, users, created[0]
+    gc.collect()
+    assert ref() is None
+    print("✅ Docker client reconnect under load passed")
+
+def test_failed_reconnect_keeps_retrying():
+    print("Testing Docker client reconnect failure...")
+    manager, created = _manager()
+    old = manager.get()
+    old.healthy = False
+    manager._connect = lambda: (_ for _ in ()).throw(ConnectionError("no socket"))
+    try:
+        manager.get()
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+
+    # Daemon back: the existing client passes its ping again and is reused
+    old.healthy = True
+    assert manager.get() is old
+    print("✅ Docker client reconnect failure passed")
+
+if __name__ == "__main__":
+    test_reconnect_under_concurrent_use()
+    test_failed_reconnect_keeps_retrying()
@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.dockerfile_parser import parse_dockerfile
+from app.core.dockerfile_analyzer import analyze_dockerfile_content
+
+DOCKERFILE = """# escape=`
+ARG VERSION=1.22
+FROM --platform=linux/amd64 golang:${VERSION} AS build
+RUN curl -fsSL https://example.com/install.sh#v2 | sh && `
+    # comments inside a continuation are dropped
+
+    go build -o /out/app
+FROM alpine:3.19
+COPY --from=build --chown=app:app /out/app /app
+RUN <<EOF
+apk add --no-cache ca-certificates
+adduser -D app
+EOF
+USER app
+CMD ["/app", "--port", "8080"]
+"""
+
+def test_parse_structure():
+    print("Testing Dockerfile parser...")
+    ast = parse_dockerfile(DOCKERFILE)
+    assert ast.escape == "`"
+    assert [a.value for a in ast.global_args] == ["VERSION=1.22"]
+
+    run = ast.find("RUN")[0]
+    # '#' inside a URL is not a comment, and the continuation is joined
+    assert run.value == "curl -fsSL https://example.com/install.sh#v2 | sh && go build -o /out/app"
+    assert (run.line, run.end_line) == (4, 7)
+
+    heredoc = ast.find("RUN")[1]
+    assert heredoc.heredocs[0].body == "apk add --no-cache ca-certificates\nadduser -D app"
+
+    cmd = ast.find("CMD")[0]
+    assert cmd.form == "exec" and cmd.args == ["/app", "--port", "8080"]
+    assert run.form == "shell"
+
+    build, final = ast.stages
+    assert build.name == "build" and build.platform == "linux/amd64"
+    assert final.depends_on == [0]
+    assert ast.find("COPY")[0].flags == {"from": "build", "chown": "app:app"}
+
+def test_heredoc_only_as_unquoted_word():
+    print("Testing heredoc detection...")
+    # A quoted "<<EOF" is an argument, not a heredoc: the CMD after it is still an instruction
+    ast = parse_dockerfile('FROM alpine\nRUN echo "<<EOF" && ls\nCMD ["sh"]\n')
+    assert [i.keyword for i in ast.instructions] == ["FROM", "RUN", "CMD"]
+    assert not ast.find("RUN")[0].heredocs
+
+    # No terminator: roll back instead of swallowing the rest of the file as a body
+    ast = parse_dockerfile("FROM alpine\nRUN cat <<EOF\nUSER app\n")
+    assert not ast.find("RUN")[0].heredocs
+    assert ast.find("USER")[0].value == "app"
+
+    ast = parse_dockerfile("FROM alpine\nRUN <<A cat - <<-\"B\"\none\nA\n\ttwo\n\tB\nUSER app\n")
+    assert [(h.name, h.body) for h in ast.find("RUN")[0].heredocs] == [("A", "one"), ("B", "two")]
+    assert ast.find("USER")[0].line == 7
+
+def test_heredoc_only_as_unquoted_word():
+    print("Testing heredoc detection...")
+    # A quoted "<<EOF" is an argument, not a heredoc: the CMD after it is still an instruction
+    ast = parse_dockerfile('FROM alpine\nRUN echo "<<EOF" && ls\nCMD ["sh"]\n')
+    assert [i.keyword for i in ast.instructions] == ["FROM", "RUN", "CMD"]
+    assert not ast.find("RUN")[0].heredocs
+
+    # No terminator: roll back instead of swallowing the rest of the file as a body
+    ast = parse_dockerfile("FROM alpine\nRUN cat <<EOF\nUSER app\n")
+    assert not ast.find("RUN")[0].heredocs
+    assert ast.find("USER")[0].value == "app"
+
+    ast = parse_dockerfile("FROM alpine\nRUN <<A cat - <<-\"B\"\none\nA\n\ttwo\n\tB\nUSER app\n")
+    assert [(h.name, h.body) for h in ast.find("RUN")[0].heredocs] == [("A", "one"), ("B", "two")]
+    assert ast.find("USER")[0].line == 7
+
+def test_analyzer_uses_shared_parse():
+    print("Testing static analysis on the AST...")
+    analysis = analyze_dockerfile_content(DOCKERFILE)
+    assert analysis["base_image"] == "alpine:3.19"
+    assert analysis["runtime_analysis"]["runs_as_root"] is False
+    assert [l["instruction"] for l in analysis["layers"]][:3] == ["ARG", "FROM", "RUN"]
+    assert "adduser -D app" in analysis["layers"][5]["command"]
+    assert analysis["runtime"] == "go"
+
+if __name__ == "__main__":
+    test_parse_structure()
+    test_heredoc_only_as_unquoted_word()
+    test_heredoc_only_as_unquoted_word()
+    test_analyzer_uses_shared_parse()
+    print("All Dockerfile parser tests passed!")
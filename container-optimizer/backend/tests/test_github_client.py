@@ -0,0 +1,152 @@
+import sys
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import github_client
+from app.core.github_client import GitHubClient, RateLimitExceeded
+from app.core.memo import LRUCache
+
+class GitHubStandIn(BaseHTTPRequestHandler):
+    """
+    Serves /repo and /blob/<n> (an n-byte body) with ETags, and /limited as rate-limited
+    until `limited_for` requests have been refused.
+    """
+    requests = []
+    limited_for = 0
+    retry_after = "0"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        GitHubStandIn.requests.append((self.path, self.headers.get("If-None-Match")))
+        budget = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999",
+                  "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+        if self.path == "/repo":
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self._send(304, headers=budget)
+            return self._send(200, json.dumps({"name": "r"}).encode(), {"ETag": '"v1"', **budget})
+        if self.path.startswith("/blob/"):
+            etag = f'"{self.path}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers=budget)
+            return self._send(200, b"x" * int(self.path.rsplit("/", 1)[1]), {"ETag": etag, **budget})
+        if self.path == "/limited":
+            if GitHubStandIn.limited_for > 0:
+                GitHubStandIn.limited_for -= 1
+                return self._send(429, b'{"message": "slow down"}', {"Retry-After": GitHubStandIn.retry_after})
+            return self._send(200, b'{"ok": true}', budget)
+        self._send(404)
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GitHubStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_conditional_get_served_from_cache():
+    print("Testing ETag revalidation...")
+    server, base = _serve()
+    try:
+        client = GitHubClient("t")
+        GitHubStandIn.requests.clear()
+        first = client.get(f"{base}/repo")
+        second = client.get(f"{base}/repo")
+        assert first.status_code == second.status_code == 200
+        assert second.json() == {"name": "r"} and second.headers["ETag"] == '"v1"'
+        # The second request revalidated (and got a 304) instead of downloading again
+        assert GitHubStandIn.requests == [("/repo", None), ("/repo", '"v1"')]
+        assert client.rate_limit["remaining"] == 4999
+    finally:
+        server.shutdown()
+    print("✅ ETag revalidation passed")
+
+def test_rate_limited_requests_back_off():
+    print("Testing rate-limit backoff...")
+    server, base = _serve()
+    try:
+        client = GitHubClient("t")
+        GitHubStandIn.limited_for, GitHubStandIn.retry_after = 2, "0"
+        resp = client.get(f"{base}/limited")
+        assert resp.status_code == 200 and GitHubStandIn.limited_for == 0
+
+        # A reset further away than we're willing to wait fails fast instead of sleeping
+        GitHubStandIn.limited_for, GitHubStandIn.retry_after = 1, str(int(github_client.GITHUB_MAX_RATE_LIMIT_WAIT) + 60)
+        try:
+            client.get(f"{base}/limited")
+            assert False, "expected RateLimitExceeded"
+        except RateLimitExceeded:
+            pass
+
+        # Nearly out of budget with a long window left: refuse rather than pace for minutes
+        client.rate_limit = {"limit": 5000, "remaining": 1, "reset": int(time.time()) + 3600}
+        try:
+            client.get(f"{base}/repo")
+            assert False, "expected RateLimitExceeded"
+        except RateLimitExceeded:
+            pass
+    finally:
+        GitHubStandIn.limited_for = 0
+        server.shutdown()
+    print("✅ Rate-limit backoff passed")
+
+def test_clients_bounded_per_token():
+    print("Testing per-token client cache...")
+    original = github_client._clients
+    github_client._clients = LRUCache(maxsize=2, ttl=60)
+    try:
+        a = github_client.get_github_client("token-a")
+        assert github_client.get_github_client("token-a") is a
+        github_client.get_github_client("token-b")
+        github_client.get_github_client("token-c")
+        assert len(github_client._clients) == 2
+        # Least recently used token was evicted; its next call gets a fresh client
+        assert github_client.get_github_client("token-a") is not a
+        assert "token-a" not in github_client._clients
+    finally:
+        github_client._clients = original
+    print("✅ Per-token client cache passed")
+
+def test_etag_cache_bounded_by_bytes():
+    print("Testing ETag cache size limits...")
+    server, base = _serve()
+    originals = (github_client.GITHUB_ETAG_CACHE_BYTES, github_client.GITHUB_ETAG_MAX_BODY)
+    github_client.GITHUB_ETAG_CACHE_BYTES, github_client.GITHUB_ETAG_MAX_BODY = 250, 200
+    try:
+        client = GitHubClient("t")
+        # Over the per-body limit: never cached, so never revalidated
+        GitHubStandIn.requests.clear()
+        client.get(f"{base}/blob/300")
+        client.get(f"{base}/blob/300")
+        assert GitHubStandIn.requests == [("/blob/300", None), ("/blob/300", None)]
+        assert len(client._etags) == 0
+
+        # Under it, but together over the byte budget: the least recently used body goes
+        client.get(f"{base}/blob/100")
+        client.get(f"{base}/blob/120")
+        client.get(f"{base}/blob/101")
+        assert len(client._etags) == 2 and client._etags._bytes == 221
+        GitHubStandIn.requests.clear()
+        assert client.get(f"{base}/blob/101").content == b"x" * 101
+        client.get(f"{base}/blob/100")
+        assert GitHubStandIn.requests == [("/blob/101", '"/blob/101"'), ("/blob/100", None)]
+    finally:
+        github_client.GITHUB_ETAG_CACHE_BYTES, github_client.GITHUB_ETAG_MAX_BODY = originals
+        server.shutdown()
+    print("✅ ETag cache size limits passed")
+
+if __name__ == "__main__":
+    test_conditional_get_served_from_cache()
+    test_rate_limited_requests_back_off()
+    test_clients_bounded_per_token()
+    test_etag_cache_bounded_by_bytes()
@@ -0,0 +1,122 @@
+import sys
+import os
+import base64
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import github_service, repo_scanner
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+class FakeGitHub:
+    """Contents API of a repo whose `feature` branch has a Dockerfile the default branch lacks."""
+    def __init__(self):
+        self.calls = []
+
+    def get(self, path, params=None, **kwargs):
+        self.calls.append((path, params))
+        files = {
+            (None, "Dockerfile"): "FROM python:3.11\n",
+            ("feature", "Dockerfile"): "FROM python:3.12\n",
+            ("feature", "svc/Dockerfile"): "FROM node:20\n",
+        }
+        ref = (params or {}).get("ref")
+        content = files.get((ref, path.split("/contents/", 1)[1]))
+        if content is None:
+            return FakeResponse(404, {"message": "Not Found"})
+        return FakeResponse(200, {"content": base64.b64encode(content.encode()).decode()})
+
+class FakeBlobs:
+    """GraphQL serves blob text (truncating big blobs, like GitHub does); REST /git/blobs serves it whole."""
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.queries = []
+        self.rest = []
+
+    def graphql(self, query, variables=None):
+        self.queries.append(query)
+        repository = {}
+        for i, sha in enumerate(self.batch):
+            if f'oid: "{sha}"' in query:
+                text = self.blobs[sha]
+                repository[f"b{i}"] = {"text": text[:100], "isBinary": False, "isTruncated": len(text) > 100}
+        return {"data": {"repository": repository}}
+
+    def get(self, path, params=None, **kwargs):
+        sha = path.rsplit("/", 1)[1]
+        self.rest.append(sha)
+        if sha not in self.blobs:
+            return FakeResponse(404, {"message": "Not Found"})
+        return FakeResponse(200, {"encoding": "base64", "content": base64.b64encode(self.blobs[sha].encode()).decode()})
+
+def _patched(module, **values):
+    originals = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    return lambda: [setattr(module, name, value) for name, value in originals.items()]
+
+def test_file_content_at_ref():
+    print("Testing file content at a ref...")
+    github = FakeGitHub()
+    restore = _patched(github_service, get_github_client=lambda token=None: github)
+    try:
+        assert github_service.get_file_content("o", "r", "Dockerfile") == "FROM python:3.11\n"
+        assert github_service.get_file_content("o", "r", "Dockerfile", ref="feature") == "FROM python:3.12\n"
+        assert github_service.get_file_content("o", "r", "svc/Dockerfile") is None
+        assert github.calls[0] == ("/repos/o/r/contents/Dockerfile", None)
+        assert github.calls[1] == ("/repos/o/r/contents/Dockerfile", {"ref": "feature"})
+    finally:
+        restore()
+    print("✅ File content at a ref passed")
+
+def test_repository_scan_reads_the_branch():
+    print("Testing repository scan on a branch...")
+    github = FakeGitHub()
+    restore_service = _patched(github_service, get_github_client=lambda token=None: github)
+    restore_scanner = _patched(
+        repo_scanner,
+        find_dockerfile_entries=lambda owner, repo, token=None, ref=None: [],
+        get_blobs=lambda owner, repo, shas, token=None: {},
+        build_static_report=lambda content: {"content": content},
+    )
+    try:
+        # Explicit paths outside the discovered tree fall back to the contents API, on the same branch
+        result = repo_scanner.scan_repository("o", "r", "feature", "https://github.com/o/r/tree/feature",
+                                              paths=["svc/Dockerfile"])
+        [scanned] = result["results"]
+        assert scanned["status"] == "ok"
+        assert scanned["report"]["original_content"] == "FROM node:20\n"
+    finally:
+        restore_scanner()
+        restore_service()
+    print("✅ Repository scan on a branch passed")
+
+def test_truncated_graphql_blobs_fall_back_to_rest():
+    print("Testing truncated GraphQL blobs...")
+    small, large = "a" * 40, "b" * 40
+    blobs = FakeBlobs({small: "FROM alpine\n", large: "FROM python:3.12\n" + "RUN true\n" * 100})
+    restore = _patched(github_service, get_github_client=lambda token=None: blobs, _blob_cache=github_service.LRUCache())
+    try:
+        blobs.batch = [small, large]
+        found = github_service.get_blobs("o", "r", [small, large], token="t")
+        assert found == {small: "FROM alpine\n", large: blobs.blobs[large]}
+        assert "isTruncated" in blobs.queries[0]
+        assert blobs.rest == [large]
+
+        # No valid SHA in the batch: no (invalid, empty) GraphQL query at all
+        blobs.batch = ["not-a-sha"]
+        blobs.queries.clear()
+        assert github_service.get_blobs("o", "r", ["not-a-sha"], token="t") == {}
+        assert blobs.queries == []
+    finally:
+        restore()
+    print("✅ Truncated GraphQL blobs passed")
+
+if __name__ == "__main__":
+    test_file_content_at_ref()
+    test_repository_scan_reads_the_branch()
+    test_truncated_graphql_blobs_fall_back_to_rest()
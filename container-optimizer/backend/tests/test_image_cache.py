@@ -0,0 +1,103 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.docker import pull_manager
+from app.docker.image_cache import ImageMetadataCache
+from app.docker.pull_manager import PullManager
+
+class FakeImage:
+    id = "sha256:new"
+
+class FakeImages:
+    def get(self, ref):
+        return FakeImage()
+
+class FakeApi:
+    """Lists `listed` ({image_id: tags}) from /images/json and counts the calls."""
+    def __init__(self, listed):
+        self.listed = listed
+        self.listings = 0
+
+    def images(self, all=False):
+        self.listings += 1
+        return [{"Id": i, "RepoTags": tags, "Size": 1024} for i, tags in self.listed.items()]
+
+    def pull(self, ref, stream=False, decode=False, platform=None):
+        self.listed["sha256:new"] = [ref]
+        return iter([{"status": "Digest: sha256:feed"}])
+
+class FakeClient:
+    def __init__(self, listed):
+        self.api = FakeApi(listed)
+        self.images = FakeImages()
+
+def test_index_refresh():
+    print("Testing image metadata cache refresh...")
+    client = FakeClient({"sha256:a": ["web:1"], "sha256:b": ["<none>:<none>"]})
+    cache = ImageMetadataCache(ttl=0.05)
+    index = cache.get_index(client)
+    assert index == {"sha256:a": {"tags": ["web:1"], "size": 1024}, "sha256:b": {"tags": [], "size": 1024}}
+    cache.get_index(client)
+    assert client.api.listings == 1
+
+    # Expired, forced or invalidated: listed again
+    time.sleep(0.06)
+    cache.get_index(client)
+    assert client.api.listings == 2
+    cache.get_index(client, force=True)
+    assert client.api.listings == 3
+    cache.invalidate()
+    cache.get_index(client)
+    assert client.api.listings == 4
+    print("✅ Image metadata cache refresh passed")
+
+def test_lookup_refreshes_once_per_unknown_image():
+    print("Testing image metadata cache lookups...")
+    client = FakeClient({"sha256:a": ["web:1"]})
+    cache = ImageMetadataCache(ttl=60)
+    cache.get_index(client)
+
+    # A just-pulled image isn't listed yet: one refresh picks it up
+    client.api.listed["sha256:c"] = ["worker:1"]
+    assert cache.lookup(client, {"sha256:a", "sha256:c"})["sha256:c"]["tags"] == ["worker:1"]
+    assert client.api.listings == 2
+
+    # A container whose image is gone (or has no ImageID) refreshes once, not on every listing
+    for _ in range(3):
+        index = cache.lookup(client, {"sha256:a", "sha256:gone", None})
+    assert "sha256:gone" not in index and client.api.listings == 3
+
+    # ... while a different unknown image still gets its refresh
+    cache.lookup(client, {"sha256:a", "sha256:gone", "sha256:other"})
+    assert client.api.listings == 4
+    cache.lookup(client, {"sha256:gone"})
+    assert client.api.listings == 4
+
+    # Misses only last until the next load: once the index expires, it's re-checked
+    cache.ttl = 0
+    cache.lookup(client, {"sha256:gone"})
+    assert client.api.listings == 5
+    print("✅ Image metadata cache lookups passed")
+
+def test_pull_invalidates_index():
+    print("Testing image metadata cache invalidation on pull...")
+    client = FakeClient({"sha256:a": ["app:latest"]})
+    cache = ImageMetadataCache(ttl=60)
+    originals = (pull_manager.get_docker_client, pull_manager.get_image_metadata_cache)
+    pull_manager.get_docker_client = lambda: client
+    pull_manager.get_image_metadata_cache = lambda: cache
+    try:
+        assert "sha256:new" not in cache.get_index(client)
+        PullManager().pull("app:latest")
+        # Moved tags show up without waiting for the TTL
+        assert cache.get_index(client)["sha256:new"]["tags"] == ["app:latest"]
+        assert client.api.listings == 2
+    finally:
+        pull_manager.get_docker_client, pull_manager.get_image_metadata_cache = originals
+    print("✅ Image metadata cache invalidation on pull passed")
+
+if __name__ == "__main__":
+    test_index_refresh()
+    test_lookup_refreshes_once_per_unknown_image()
+    test_pull_invalidates_index()
@@ -0,0 +1,138 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import jobs
+from app.core.jobs import JobManager, QueueFullError, dedupe_key
+from app.api import jobs as jobs_api
+from app.api.jobs import stream_job
+
+def _blocking(release, calls=None):
+    def fn(job):
+        if calls is not None:
+            calls.append(job.id)
+        job.stage_event("scan", "start", {})
+        release.wait(5)
+        job.stage_event("scan", "done", {"findings": 2})
+        return {"ok": True}
+    return fn
+
+def _read_stream(job):
+    async def collect():
+        return [chunk async for chunk in stream_job(job).body_iterator]
+    events = []
+    for chunk in asyncio.run(collect()):
+        event, data = chunk.strip().split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def test_identical_jobs_deduplicated():
+    print("Testing job deduplication...")
+    manager = JobManager(workers=2, queue_limit=2)
+    release, calls = threading.Event(), []
+    try:
+        payload = {"repo_url": "https://github.com/o/r", "token": "ghp_secret"}
+        first = manager.submit("scan", payload, _blocking(release, calls))
+        assert manager.submit("scan", dict(payload), _blocking(release, calls)) is first
+        # Another token (or none) never joins a job started with someone else's credentials
+        other = manager.submit("scan", {**payload, "token": "ghp_other"}, _blocking(release, calls))
+        assert other is not first
+        release.set()
+        assert first.future.result(5) == {"ok": True}
+        other.future.result(5)
+        assert len(calls) == 2
+
+        # Finished: the same request runs again instead of returning the old job
+        assert manager.submit("scan", payload, _blocking(release, calls)) is not first
+    finally:
+        release.set()
+
+    # The token is only part of the key as a keyed hash
+    key = dedupe_key("scan", {"token": "ghp_secret"})
+    assert "ghp_secret" not in key and key == dedupe_key("scan", {"token": "ghp_secret"})
+    assert key != dedupe_key("scan", {"token": "ghp_other"}) != dedupe_key("scan", {"token": None})
+    print("✅ Job deduplication passed")
+
+def test_queue_limit_rejects_excess_jobs():
+    print("Testing job queue limit...")
+    manager = JobManager(workers=1, queue_limit=1)
+    release = threading.Event()
+    try:
+        running = manager.submit("scan", {"n": 1}, _blocking(release))
+        queued = manager.submit("scan", {"n": 2}, _blocking(release))
+        try:
+            manager.submit("scan", {"n": 3}, _blocking(release))
+            assert False, "expected QueueFullError"
+        except QueueFullError:
+            pass
+        # A duplicate of a pending job is not a new job, so it isn't refused
+        assert manager.submit("scan", {"n": 2}, _blocking(release)) is queued
+
+        release.set()
+        running.future.result(5), queued.future.result(5)
+        time.sleep(0.05)
+        assert manager.submit("scan", {"n": 3}, _blocking(release)).future.result(5) == {"ok": True}
+    finally:
+        release.set()
+    print("✅ Job queue limit passed")
+
+def test_finished_jobs_expire():
+    print("Testing job result TTL...")
+    original = jobs.JOB_RESULT_TTL
+    manager = JobManager(workers=1, queue_limit=1)
+    release = threading.Event()
+    release.set()
+    try:
+        done = manager.submit("scan", {"n": 1}, _blocking(release))
+        done.future.result(5)
+        jobs.JOB_RESULT_TTL = 60
+        manager.submit("scan", {"n": 2}, _blocking(release)).future.result(5)
+        assert manager.get(done.id) is done
+
+        # Past the TTL the next submission collects it; still-running jobs are never collected
+        time.sleep(0.05)
+        jobs.JOB_RESULT_TTL = 0.01
+        release.clear()
+        running = manager.submit("scan", {"n": 3}, _blocking(release))
+        time.sleep(0.05)
+        manager.submit("scan", {"n": 4}, _blocking(release))
+        assert manager.get(done.id) is None
+        assert manager.get(running.id) is running
+    finally:
+        jobs.JOB_RESULT_TTL = original
+        release.set()
+    print("✅ Job result TTL passed")
+
+def test_event_stream_replays_from_start():
+    print("Testing job SSE replay...")
+    original = jobs_api.EVENT_POLL_INTERVAL
+    jobs_api.EVENT_POLL_INTERVAL = 0.01
+    manager = JobManager(workers=1, queue_limit=1)
+    release = threading.Event()
+    try:
+        job = manager.submit("scan", {"n": 1}, _blocking(release))
+        # Subscribed while running: earlier events are replayed, later ones follow live
+        threading.Timer(0.1, release.set).start()
+        live = _read_stream(job)
+        assert [e for e, _ in live] == ["status", "status", "stage", "stage", "status", "result"]
+        assert [d.get("status") for e, d in live if e == "status"] == ["queued", "running", "done"]
+        assert (live[3][1]["stage"], live[3][1]["status"], live[3][1]["findings"]) == ("scan", "done", 2)
+        assert [d["seq"] for e, d in live if e != "result"] == [0, 1, 2, 3, 4]
+        assert live[-1][1]["result"] == {"ok": True}
+
+        # A late subscriber gets the identical history
+        late = _read_stream(job)
+        assert [(e, d.get("seq")) for e, d in late] == [(e, d.get("seq")) for e, d in live]
+    finally:
+        jobs_api.EVENT_POLL_INTERVAL = original
+        release.set()
+    print("✅ Job SSE replay passed")
+
+if __name__ == "__main__":
+    test_identical_jobs_deduplicated()
+    test_queue_limit_rejects_excess_jobs()
+    test_finished_jobs_expire()
+    test_event_stream_replays_from_start()
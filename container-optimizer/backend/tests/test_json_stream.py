@@ -0,0 +1,46 @@
+import sys
+import os
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.json_stream import JSONObjectStream
+
+ANSWER = {
+    "optimized_dockerfile": "FROM python:3.12-slim\nRUN echo \"hi\" \\\n  && rm -rf /tmp/*\nUSER app",
+    "dockerignore": ".git/\nvenv/\n",
+    "explanation": ["Pinned the base image, see [1]", {"nested": [1, 2]}],
+    "security_warnings": [],
+    "score": 7,
+}
+
+def _feed_in_chunks(text, size):
+    parser = JSONObjectStream()
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    return parser, events
+
+def test_incremental_parse_matches_json_loads():
+    print("Testing incremental JSON parsing...")
+    # Providers sometimes wrap the object in a code fence; escaped unicode must survive chunk splits
+    for text in ("```json\n" + json.dumps(ANSWER, indent=2) + "\n```", json.dumps({**ANSWER, "note": "café \U0001F433"})):
+        for size in (1, 3, 16):
+            parser, events = _feed_in_chunks(text, size)
+            assert parser.done
+            assert parser.result == json.loads(text[text.index("{"):text.rindex("}") + 1])
+
+            streamed = "".join(e["text"] for e in events if e["type"] == "delta" and e["field"] == "optimized_dockerfile")
+            assert streamed == ANSWER["optimized_dockerfile"]
+            items = [e["value"] for e in events if e["type"] == "item" and e["field"] == "explanation"]
+            assert items == ANSWER["explanation"]
+
+def test_items_arrive_before_object_completes():
+    print("Testing early array items...")
+    parser = JSONObjectStream()
+    events = parser.feed('{"explanation": ["first", "sec')
+    assert [e["value"] for e in events if e["type"] == "item"] == ["first"]
+    assert not parser.done
+
+if __name__ == "__main__":
+    test_incremental_parse_matches_json_loads()
+    test_items_arrive_before_object_completes()
+    print("All JSON stream tests passed!")
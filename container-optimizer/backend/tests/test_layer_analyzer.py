@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.layer_analyzer import analyze_layers, _map_diff_ids
+
+MB = 1024 * 1024
+
+def _entry(created_by, size=0):
+    return {"CreatedBy": created_by, "Size": size}
+
+class FakeApi:
+    def __init__(self, history):
+        self._history = history
+
+    def history(self, image_id):
+        return self._history
+
+class FakeClient:
+    def __init__(self, history):
+        self.api = FakeApi(history)
+
+class FakeImage:
+    def __init__(self, diff_ids):
+        self.id = "sha256:img"
+        self.attrs = {"RootFS": {"Layers": diff_ids}}
+
+def test_classic_builder_history():
+    print("Testing diff ID mapping for classic builder history...")
+    oldest_first = [
+        _entry("/bin/sh -c #(nop) ADD file:abc in / ", 70 * MB),
+        _entry("/bin/sh -c #(nop)  CMD [\"bash\"]"),
+        _entry("/bin/sh -c #(nop)  ENV LANG=C.UTF-8"),
+        # A RUN that changed nothing still records an (empty) layer
+        _entry("/bin/sh -c mkdir -p /app"),
+        _entry("/bin/sh -c #(nop) COPY dir:def in /app "),
+        _entry("/bin/sh -c #(nop)  USER app"),
+    ]
+    assert _map_diff_ids(oldest_first, ["sha256:a", "sha256:b", "sha256:c"]) == \
+        ["sha256:a", None, None, "sha256:b", "sha256:c", None]
+    print("✅ Classic builder diff IDs passed")
+
+def test_buildkit_history():
+    print("Testing diff ID mapping for BuildKit history...")
+    oldest_first = [
+        _entry("/bin/sh -c #(nop) ADD file:abc in / ", 70 * MB),
+        _entry("ARG VERSION=1"),
+        _entry("ENV PATH=/app/bin:$PATH"),
+        _entry("WORKDIR /app"),
+        _entry("RUN /bin/sh -c pip install -r requirements.txt # buildkit", 30 * MB),
+        _entry("COPY . . # buildkit", 2 * MB),
+        _entry("EXPOSE map[8000/tcp:{}]"),
+        _entry("CMD [\"python\" \"app.py\"]"),
+    ]
+    assert _map_diff_ids(oldest_first, ["sha256:a", "sha256:b", "sha256:c", "sha256:d"]) == \
+        ["sha256:a", None, None, "sha256:b", "sha256:c", "sha256:d", None, None]
+    print("✅ BuildKit diff IDs passed")
+
+def test_size_fallback():
+    print("Testing diff ID mapping fallback...")
+    # BuildKit skips the layer for a WORKDIR that already exists, so inference finds one too many;
+    # the entries that actually have bytes line up with the diff IDs
+    oldest_first = [
+        _entry("/bin/sh -c #(nop) ADD file:abc in / ", 70 * MB),
+        _entry("WORKDIR /"),
+        _entry("RUN /bin/sh -c apt-get update # buildkit", 20 * MB),
+        _entry("CMD [\"sh\"]"),
+    ]
+    assert _map_diff_ids(oldest_first, ["sha256:a", "sha256:b"]) == ["sha256:a", None, "sha256:b", None]
+
+    # Neither inference nor sizes fit: no digests rather than wrong ones
+    assert _map_diff_ids(oldest_first, ["sha256:a"]) == [None] * 4
+    assert _map_diff_ids([], []) == []
+    print("✅ Diff ID mapping fallback passed")
+
+def test_analyze_layers_order_and_flags():
+    print("Testing layer analysis...")
+    newest_first = [
+        _entry("CMD [\"sh\"]"),
+        _entry("RUN /bin/sh -c make # buildkit", 60 * MB),
+        _entry("WORKDIR /src"),
+        _entry("/bin/sh -c #(nop) ADD file:abc in / ", 5 * MB),
+    ]
+    layers = analyze_layers(FakeClient(newest_first), FakeImage(["sha256:a", "sha256:b", "sha256:c"]))
+    # Same order as `docker history`, newest first
+    assert [l["digest"] for l in layers] == [None, "sha256:c", "sha256:b", "sha256:a"]
+    assert [l["empty"] for l in layers] == [True, False, False, False]
+    assert [l["is_large"] for l in layers] == [False, True, False, False]
+    assert layers[1]["size_mb"] == 60.0 and layers[1]["command"] == "RUN /bin/sh -c make # buildkit"
+    print("✅ Layer analysis passed")
+
+if __name__ == "__main__":
+    test_classic_builder_history()
+    test_buildkit_history()
+    test_size_fallback()
+    test_analyze_layers_order_and_flags()
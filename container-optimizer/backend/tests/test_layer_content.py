@@ -0,0 +1,81 @@
+import sys
+import os
+import io
+import json
+import tarfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.layer_content import analyze_layer_contents, DUPLICATE_MIN_BYTES
+
+BIG = os.urandom(DUPLICATE_MIN_BYTES + 1024)
+
+def _tar(files):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as t:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def _fake_client(archive):
+    class Image:
+        id = "sha256:test"
+
+    class Api:
+        def get_image(self, image_id):
+            return (archive[i:i + 4096] for i in range(0, len(archive), 4096))
+
+    class Images:
+        def get(self, ref):
+            return Image()
+
+    class Client:
+        api = Api()
+        images = Images()
+
+    return Client()
+
+def test_layer_waste_findings():
+    print("Testing layer content analysis...")
+    base = _tar([
+        ("etc/os-release", b"x"),
+        ("var/lib/apt/lists/main", b"a" * 5000),
+        ("app/big.bin", BIG),
+        ("app/config.txt", b"o" * 100),
+        ("opt/plugins/old.so", b"p" * 10),
+    ])
+    top = _tar([
+        ("app/config.txt", b"n" * 50),
+        ("app/.wh.big.bin", b""),
+        ("opt/plugins/.wh..wh..opq", b""),
+        ("opt/plugins/new.so", b"q"),
+        ("srv/big.bin", BIG),
+        ("srv/static/big.bin", BIG),
+    ])
+    # The archive lists the upper layer first; the manifest gives the real order
+    archive = _tar([
+        ("blobs/sha256/top", top),
+        ("blobs/sha256/base", base),
+        ("blobs/sha256/config", b'{"config": {}}'),
+        ("manifest.json", json.dumps([{"Layers": ["blobs/sha256/base", "blobs/sha256/top"]}]).encode()),
+    ])
+
+    progress = []
+    report = analyze_layer_contents(_fake_client(archive), "test:latest", on_progress=progress.append)
+    findings = {(f["type"], f["path"] if "path" in f else f["category"]): f for f in report["findings"]}
+
+    assert [layer["archive_path"] for layer in report["layers"]] == ["blobs/sha256/base", "blobs/sha256/top"]
+    assert len(progress) == 2
+    assert len(top) + len(base) < report["bytes_streamed"] <= len(archive)
+    assert findings[("cache", "apt_lists")]["size_bytes"] == 5000
+    assert findings[("deleted", "/app/big.bin")]["by_layer"] == 1
+    assert findings[("deleted", "/opt/plugins/old.so")]["size_bytes"] == 10
+    assert findings[("shadowed", "/app/config.txt")]["size_bytes"] == 100
+    # /app/big.bin moved to /srv/big.bin is already counted as deleted, so only the second live copy is a duplicate
+    assert ("duplicate", "/srv/big.bin") not in findings
+    assert findings[("duplicate", "/srv/static/big.bin")]["same_as"] == {"layer": 1, "path": "/srv/big.bin"}
+    assert report["wasted_by_type"] == {"cache": 5000, "deleted": len(BIG) + 10, "shadowed": 100, "duplicate": len(BIG)}
+    print("✅ Layer content analysis passed")
+
+if __name__ == "__main__":
+    test_layer_waste_findings()
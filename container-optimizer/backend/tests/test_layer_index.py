@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.docker.layer_index import HostLayerIndex, chain_ids
+from app.docker.image_cache import get_image_metadata_cache
+
+MB = 1024 * 1024
+
+def _image(image_id, tag, layers):
+    """layers: [(diff_id, size_bytes)] oldest first."""
+    return {
+        "id": image_id,
+        "tag": tag,
+        "inspect": {"RootFS": {"Layers": [d for d, _ in layers]}},
+        # History is newest first; each layer-producing entry carries the layer's size
+        "history": [{"CreatedBy": "/bin/sh -c #(nop)  CMD [\"sh\"]", "Size": 0}]
+                   + [{"CreatedBy": f"RUN step {d}", "Size": size} for d, size in reversed(layers)],
+    }
+
+class FakeApi:
+    def __init__(self, images):
+        self.images_by_id = {i["id"]: i for i in images}
+        self.inspects = 0
+
+    def images(self, all=False):
+        return [{"Id": i["id"], "RepoTags": [i["tag"]], "Size": sum(s["Size"] for s in i["history"])}
+                for i in self.images_by_id.values()]
+
+    def inspect_image(self, image_id):
+        self.inspects += 1
+        return self.images_by_id[image_id]["inspect"]
+
+    def history(self, image_id):
+        return self.images_by_id[image_id]["history"]
+
+class FakeClient:
+    def __init__(self, images):
+        self.api = FakeApi(images)
+
+BASE = [("sha256:base", 80 * MB), ("sha256:deps", 40 * MB)]
+IMAGES = [
+    _image("sha256:aaa", "web:1", BASE + [("sha256:web", 10 * MB)]),
+    _image("sha256:bbb", "worker:1", BASE + [("sha256:worker", 5 * MB)]),
+    # Same diff as web's layer but on a different parent: a separate layer on disk
+    _image("sha256:ccc", "other:1", [("sha256:alpine", 7 * MB), ("sha256:web", 10 * MB)]),
+]
+
+def test_shared_and_reclaimable_bytes():
+    print("Testing host layer index...")
+    client = FakeClient(IMAGES)
+    cache = get_image_metadata_cache()
+    ttl, cache.ttl = cache.ttl, 0
+    try:
+        _check_index(client)
+    finally:
+        cache.ttl = ttl
+    print("✅ Host layer index passed")
+
+def _check_index(client):
+    index = HostLayerIndex()
+
+    summary = index.summary(client)
+    images = {i["tags"][0]: i for i in summary["images"]}
+    assert images["web:1"]["unique_bytes"] == 10 * MB
+    assert images["web:1"]["shared_bytes"] == 120 * MB
+    assert images["other:1"]["reclaimable_bytes"] == 17 * MB
+    assert summary["totals"]["disk_bytes"] == 120 * MB + 10 * MB + 5 * MB + 17 * MB
+    assert summary["totals"]["saved_by_sharing_bytes"] == 120 * MB
+    assert {l["diff_id"] for l in summary["shared_layers"]} == {"sha256:base", "sha256:deps"}
+
+    # Removing both images that share the base frees the base too
+    removal = index.reclaimable(client, ["web:1", "worker"])
+    assert removal["unknown"] == ["worker"]
+    removal = index.reclaimable(client, ["web:1", "worker:1"])
+    assert removal["reclaimable_bytes"] == 135 * MB
+
+    # Incremental: a refresh with no changes inspects nothing; removals drop layers
+    inspects = client.api.inspects
+    assert index.refresh(client) is False
+    assert client.api.inspects == inspects
+    del client.api.images_by_id["sha256:bbb"]
+    assert index.refresh(client) is True
+    assert client.api.inspects == inspects
+    web = next(i for i in index.summary(client)["images"] if i["id"] == "sha256:aaa")
+    assert web["unique_bytes"] == 130 * MB
+
+def test_chain_ids():
+    print("Testing chain IDs...")
+    a = chain_ids(["sha256:x", "sha256:y"])
+    b = chain_ids(["sha256:z", "sha256:y"])
+    assert a[0] == "sha256:x"
+    assert a[1] != b[1]
+    print("✅ Chain IDs passed")
+
+if __name__ == "__main__":
+    test_shared_and_reclaimable_bytes()
+    test_chain_ids()
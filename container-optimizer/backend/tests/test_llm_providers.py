@@ -0,0 +1,264 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import ai_service, llm_providers, security_scanner
+from app.core.report import report_builder
+from app.core.llm_providers import (LLMRouter, StubProvider, OpenAICompatibleProvider, CircuitOpenError,
+                                    ProviderError, DeadlineExceeded)
+from app.core.disk_cache import DiskCache
+from app.core.singleflight import SingleFlight
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+def _no_backoff():
+    original = llm_providers.RETRY_BASE_DELAY
+    llm_providers.RETRY_BASE_DELAY = 0
+    return lambda: setattr(llm_providers, "RETRY_BASE_DELAY", original)
+
+def test_retries_then_fails_over_in_order():
+    print("Testing LLM retries and failover...")
+    restore = _no_backoff()
+    try:
+        # Recovers within its retries: the fallback is never asked
+        flaky = StubProvider("flaky", failures=2, answer={"from": "flaky"})
+        fallback = StubProvider("fallback", answer={"from": "fallback"})
+        router = LLMRouter([flaky, fallback], max_retries=2)
+        provider, text = router.complete_with_provider(MESSAGES)
+        assert provider is flaky and json.loads(text) == {"from": "flaky"}
+        assert flaky.calls == 3 and fallback.calls == 0
+
+        # Out of retries: next provider in order answers
+        down = StubProvider("down", failures=99)
+        fallback = StubProvider("fallback", answer={"from": "fallback"})
+        router = LLMRouter([down, fallback], max_retries=1)
+        assert router.complete_with_provider(MESSAGES)[0] is fallback
+        assert down.calls == 2 and fallback.calls == 1
+    finally:
+        restore()
+    print("✅ LLM retries and failover passed")
+
+def test_circuit_breaker_trips_and_recovers():
+    print("Testing LLM circuit breakers...")
+    restore = _no_backoff()
+    try:
+        down = StubProvider("down", failures=3)
+        router = LLMRouter([down], max_retries=0)
+        router.breakers["down"].failure_threshold = 3
+        router.breakers["down"].reset_timeout = 0.2
+        for _ in range(3):
+            try:
+                router.complete(MESSAGES)
+                assert False, "expected a ProviderError"
+            except CircuitOpenError:
+                assert False, "circuit opened too early"
+            except ProviderError:
+                pass
+        assert router.status()[0]["circuit"] == "open"
+
+        # Open: refused without calling the provider
+        try:
+            router.complete(MESSAGES)
+            assert False, "expected CircuitOpenError"
+        except CircuitOpenError:
+            pass
+        assert down.calls == 3
+
+        # Half-open after the reset timeout: one trial call, which succeeds and closes it
+        time.sleep(0.25)
+        assert router.status()[0]["circuit"] == "half_open"
+        router.complete(MESSAGES)
+        assert down.calls == 4 and router.status()[0]["circuit"] == "closed"
+    finally:
+        restore()
+    print("✅ LLM circuit breakers passed")
+
+def test_hedged_request_takes_the_faster_answer():
+    print("Testing LLM request hedging...")
+    slow = StubProvider("slow", delay=1.0, answer={"from": "slow"})
+    fast = StubProvider("fast", answer={"from": "fast"})
+    router = LLMRouter([slow, fast], hedge_after=0.05)
+    started = time.monotonic()
+    provider, text = router.complete_with_provider(MESSAGES)
+    assert provider is fast and json.loads(text) == {"from": "fast"}
+    assert time.monotonic() - started < 0.5
+    assert slow.calls == 1 and fast.calls == 1
+
+    # A primary answering within the hedge delay never triggers the duplicate
+    quick = StubProvider("quick")
+    spare = StubProvider("spare")
+    assert LLMRouter([quick, spare], hedge_after=0.5).complete_with_provider(MESSAGES)[0] is quick
+    assert spare.calls == 0
+    print("✅ LLM request hedging passed")
+
+def test_response_cached_under_the_answering_model():
+    print("Testing LLM response cache keys...")
+    restore_backoff = _no_backoff()
+    primary = StubProvider("groq", model="primary-model", failures=99)
+    fallback = StubProvider("fallback", model="fallback-model", answer={"explanation": ["from fallback"]})
+    router = LLMRouter([primary, fallback], max_retries=0)
+    originals = (llm_providers._router, ai_service._llm_cache, ai_service._inflight)
+    llm_providers._router = router
+    ai_service._llm_cache = DiskCache("llm_response", path=os.path.join(tempfile.mkdtemp(), "cache.db"))
+    ai_service._inflight = SingleFlight()
+    context = {"image": "app", "runtime": "python", "misconfigurations": []}
+    try:
+        assert ai_service.optimize_with_ai(context, "FROM python:3.12\n") == {"explanation": ["from fallback"]}
+        assert ai_service._llm_cache.get(ai_service.llm_cache_key(context, "FROM python:3.12\n", model="fallback-model"))
+        assert ai_service._llm_cache.get(ai_service.llm_cache_key(context, "FROM python:3.12\n")) is None
+
+        # Primary back and healthy: the fallback's answer isn't served in its place
+        router.breakers["groq"].record_success()
+        primary.failures = 0
+        assert ai_service.optimize_with_ai(context, "FROM python:3.12\n") == StubProvider.DEFAULT_ANSWER
+    finally:
+        llm_providers._router, ai_service._llm_cache, ai_service._inflight = originals
+        restore_backoff()
+    print("✅ LLM response cache keys passed")
+
+def test_static_report_uses_only_the_llm_cache():
+    print("Testing static report AI answers...")
+    restore_backoff = _no_backoff()
+    primary = StubProvider("groq", model="primary-model", failures=1)
+    fallback = StubProvider("fallback", model="fallback-model", answer={"explanation": ["from fallback"]})
+    router = LLMRouter([primary, fallback], max_retries=0)
+    originals = (llm_providers._router, ai_service._llm_cache, ai_service._inflight,
+                 ai_service.LLM_CACHE_ENABLED, security_scanner.subprocess.run)
+    llm_providers._router = router
+    ai_service._llm_cache = DiskCache("llm_response", path=os.path.join(tempfile.mkdtemp(), "cache.db"))
+    ai_service._inflight = SingleFlight()
+
+    def no_trivy(cmd, **kwargs):
+        raise FileNotFoundError("trivy")
+    security_scanner.subprocess.run = no_trivy
+    dockerfile = "FROM python:3.12\nRUN pip install flask\n"
+    try:
+        assert report_builder.build_static_report(dockerfile)["recommendation"] == {"explanation": ["from fallback"]}
+        # Primary healthy again: the fallback's answer is not replayed from a report-level cache
+        router.breakers["groq"].record_success()
+        assert report_builder.build_static_report(dockerfile)["recommendation"] == StubProvider.DEFAULT_ANSWER
+
+        # With the LLM cache off, every report asks the provider
+        ai_service.LLM_CACHE_ENABLED = False
+        calls = primary.calls
+        report_builder.build_static_report(dockerfile)
+        report_builder.build_static_report(dockerfile)
+        assert primary.calls == calls + 2
+    finally:
+        (llm_providers._router, ai_service._llm_cache, ai_service._inflight,
+         ai_service.LLM_CACHE_ENABLED, security_scanner.subprocess.run) = originals
+        restore_backoff()
+    print("✅ Static report AI answers passed")
+
+class MaxBackoff:
+    """Stands in for `random` so every retry waits the full backoff."""
+    @staticmethod
+    def uniform(a, b):
+        return b
+
+def test_deadline_bounds_retries_and_failover():
+    print("Testing LLM deadlines...")
+    # Each attempt is cut to what's left of the deadline; nothing retries or fails over after it
+    slow = StubProvider("slow", delay=5.0)
+    spare = StubProvider("spare")
+    router = LLMRouter([slow, spare], max_retries=2)
+    started = time.monotonic()
+    try:
+        router.complete(MESSAGES, deadline=time.monotonic() + 0.2)
+        assert False, "expected DeadlineExceeded"
+    except DeadlineExceeded:
+        pass
+    assert time.monotonic() - started < 1.0
+    assert slow.calls == 1 and spare.calls == 0
+    # Our own budget running out is not held against the provider
+    assert router.status()[0]["circuit"] == "closed" and router.breakers["slow"]._failures == 0
+
+    # A backoff that would outlast the deadline isn't slept: the next provider is tried instead
+    original_random = llm_providers.random
+    llm_providers.random = MaxBackoff
+    try:
+        flaky = StubProvider("flaky", failures=99)
+        fallback = StubProvider("fallback", answer={"from": "fallback"})
+        router = LLMRouter([flaky, fallback], max_retries=2)
+        started = time.monotonic()
+        provider, _ = router.complete_with_provider(MESSAGES, deadline=time.monotonic() + 0.3)
+        assert provider is fallback and flaky.calls == 1
+        assert time.monotonic() - started < 0.3
+    finally:
+        llm_providers.random = original_random
+
+    # Hedged requests stop waiting at the deadline as well
+    router = LLMRouter([StubProvider("a", delay=5.0), StubProvider("b", delay=5.0)], hedge_after=0.05)
+    started = time.monotonic()
+    try:
+        router.complete(MESSAGES, deadline=time.monotonic() + 0.2)
+        assert False, "expected DeadlineExceeded"
+    except DeadlineExceeded:
+        pass
+    assert time.monotonic() - started < 1.0
+    print("✅ LLM deadlines passed")
+
+class ChatStandIn(BaseHTTPRequestHandler):
+    """Streams an event that isn't JSON first (/broken) or after one good delta (/midway)."""
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        events = ['data: {"choices": [{"delta": {"content": "{"}}]}'] if self.path == "/midway" else []
+        body = "\n\n".join(events + ["data: {not json", "data: [DONE]"]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def test_transport_errors_become_provider_errors():
+    print("Testing LLM provider error conversion...")
+    restore = _no_backoff()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        # Not a ConnectionError/Timeout (a malformed URL): still fails over and counts for the breaker
+        misconfigured = OpenAICompatibleProvider("bad", "not-a-url", None, "m")
+        fallback = StubProvider("fallback", answer={"from": "fallback"})
+        router = LLMRouter([misconfigured, fallback], max_retries=0)
+        assert router.complete_with_provider(MESSAGES)[0] is fallback
+        assert router.breakers["bad"]._failures == 1
+
+        # A garbled stream before the first token fails over too
+        broken = OpenAICompatibleProvider("broken", f"{base}/broken", None, "m")
+        router = LLMRouter([broken, StubProvider("fallback", answer={"from": "fallback"})], max_retries=0)
+        provider, chunks = router.open_stream(MESSAGES)
+        assert provider.name == "fallback" and json.loads("".join(chunks)) == {"from": "fallback"}
+        assert router.breakers["broken"]._failures == 1
+
+        # ... and after it, surfaces as a ProviderError that counts against the breaker
+        midway = OpenAICompatibleProvider("midway", f"{base}/midway", None, "m")
+        router = LLMRouter([midway], max_retries=0)
+        provider, chunks = router.open_stream(MESSAGES)
+        assert next(chunks) == "{"
+        try:
+            list(chunks)
+            assert False, "expected a ProviderError"
+        except ProviderError:
+            pass
+        assert router.breakers["midway"]._failures == 1
+    finally:
+        server.shutdown()
+        restore()
+    print("✅ LLM provider error conversion passed")
+
+if __name__ == "__main__":
+    test_retries_then_fails_over_in_order()
+    test_circuit_breaker_trips_and_recovers()
+    test_hedged_request_takes_the_faster_answer()
+    test_response_cached_under_the_answering_model()
+    test_static_report_uses_only_the_llm_cache()
+    test_deadline_bounds_retries_and_failover()
+    test_transport_errors_become_provider_errors()
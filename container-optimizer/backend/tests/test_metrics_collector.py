@@ -0,0 +1,207 @@
+import sys
+import os
+import time
+import queue
+import tempfile
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import metrics_collector
+from app.core.metrics_collector import MetricsCollector
+
+MB = 1024 * 1024
+
+def _stats(total_usage, system_usage, usage=300 * MB, inactive_file=100 * MB):
+    return {
+        "cpu_stats": {"cpu_usage": {"total_usage": total_usage}, "system_cpu_usage": system_usage, "online_cpus": 2},
+        "precpu_stats": {"cpu_usage": {"total_usage": 0}, "system_cpu_usage": 0},
+        "memory_stats": {"usage": usage, "limit": 1024 * MB, "stats": {"inactive_file": inactive_file}},
+    }
+
+class FakeApi:
+    """`running` is what /containers/json lists; each stats stream yields from its own queue until None."""
+    def __init__(self, running):
+        self.running = dict(running)
+        self.feeds = {}
+        self.streams_opened = []
+
+    def containers(self):
+        return [{"Id": cid, "Names": ["/" + name]} for cid, name in self.running.items()]
+
+    def stats(self, cid, stream=False, decode=False):
+        self.streams_opened.append(cid)
+        feed = self.feeds.setdefault(cid, queue.Queue())
+        while True:
+            item = feed.get(timeout=5)
+            if item is None:
+                return
+            yield item
+
+class FakeClient:
+    def __init__(self, running):
+        self.api = FakeApi(running)
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def _stream_threads(cid):
+    return [t for t in threading.enumerate() if t.name == f"stats-{cid[:12]}" and t.is_alive()]
+
+def _latest(collector, cid):
+    return next((s["latest"] for s in collector.snapshot() if s["id"] == cid), None)
+
+def _patched(module, **values):
+    originals = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    return lambda: [setattr(module, name, value) for name, value in originals.items()]
+
+def _cgroup(root, cid, usage_usec, memory, limit="max"):
+    path = os.path.join(root, "system.slice", f"docker-{cid}.scope")
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "cpu.stat"), "w") as f:
+        f.write(f"usage_usec {usage_usec}\nuser_usec 0\n")
+    with open(os.path.join(path, "memory.current"), "w") as f:
+        f.write(str(memory))
+    with open(os.path.join(path, "memory.max"), "w") as f:
+        f.write(limit)
+
+def test_stream_mode_lifecycle():
+    print("Testing metrics stream mode...")
+    client = FakeClient({"aaa111": "web", "bbb222": "worker"})
+    restore = _patched(metrics_collector, get_docker_client=lambda: client)
+    collector = MetricsCollector(source="api")
+    try:
+        collector._discover()
+        assert {s["name"] for s in collector.snapshot()} == {"web", "worker"}
+        assert _wait_for(lambda: _stream_threads("aaa111") and _stream_threads("bbb222"))
+
+        # One sample per stats message; page cache isn't counted as used memory (as `docker stats`)
+        client.api.feeds["aaa111"].put(_stats(2 * 10 ** 8, 10 ** 9))
+        assert _wait_for(lambda: _latest(collector, "aaa111") is not None)
+        latest = _latest(collector, "aaa111")
+        assert latest["cpu_percent"] == 40.0 and latest["memory_mb"] == 200.0 and latest["memory_percent"] == 19.53
+
+        # Rediscovery doesn't open a second stream for a container that already has one
+        collector._discover()
+        assert client.api.streams_opened.count("aaa111") == 1
+
+        # Container stopped: dropped at once, and its stream thread exits at the next message
+        del client.api.running["bbb222"]
+        collector._discover()
+        assert [s["id"] for s in collector.snapshot()] == ["aaa111"]
+        client.api.feeds["bbb222"].put(_stats(1, 1))
+        assert _wait_for(lambda: not _stream_threads("bbb222"))
+        assert "bbb222" not in collector._streams
+
+        # Stream ended while the container still runs: forgotten, then restarted by discovery
+        client.api.feeds["aaa111"].put(None)
+        assert _wait_for(lambda: not _stream_threads("aaa111") and "aaa111" not in collector._streams)
+        assert collector.snapshot() == []
+        collector._discover()
+        assert _wait_for(lambda: _stream_threads("aaa111"))
+        assert client.api.streams_opened.count("aaa111") == 2
+    finally:
+        collector.stop()
+        for feed in client.api.feeds.values():
+            feed.put(None)
+        restore()
+    assert _wait_for(lambda: not _stream_threads("aaa111"))
+    print("✅ Metrics stream mode passed")
+
+def test_cgroup_mode_sampling():
+    print("Testing metrics cgroup mode...")
+    root = tempfile.mkdtemp()
+    _cgroup(root, "ccc333", usage_usec=1000, memory=64 * MB)
+    client = FakeClient({"ccc333": "db", "ddd444": "no-cgroup"})
+    restore = _patched(metrics_collector, get_docker_client=lambda: client, CGROUP_ROOT=root)
+    collector = MetricsCollector(source="cgroup")
+    try:
+        collector._discover()
+        # Containers with a visible cgroup are read from files; the rest fall back to a stats stream
+        assert _wait_for(lambda: client.api.streams_opened == ["ddd444"])
+        assert set(collector._streams) == {"ddd444"}
+
+        series = collector._series["ccc333"]
+        collector._sample_cgroup(series)
+        # The first read only sets the CPU baseline
+        assert _latest(collector, "ccc333") is None
+        time.sleep(0.01)
+        _cgroup(root, "ccc333", usage_usec=6000, memory=96 * MB)
+        collector._sample_cgroup(series)
+        latest = _latest(collector, "ccc333")
+        assert latest["cpu_percent"] > 0 and latest["memory_mb"] == 96.0
+        # memory.max "max" means no limit
+        assert latest["memory_limit_mb"] is None and latest["memory_percent"] is None
+
+        _cgroup(root, "ccc333", usage_usec=7000, memory=128 * MB, limit=str(512 * MB))
+        collector._sample_cgroup(series)
+        assert _latest(collector, "ccc333")["memory_percent"] == 25.0
+
+        # Gone: its CPU baseline goes with it
+        del client.api.running["ccc333"]
+        collector._discover()
+        assert "ccc333" not in collector._series and "ccc333" not in collector._cgroup_prev
+    finally:
+        collector.stop()
+        for feed in client.api.feeds.values():
+            feed.put(None)
+        restore()
+    print("✅ Metrics cgroup mode passed")
+
+def test_background_threads():
+    print("Testing metrics background threads...")
+    root = tempfile.mkdtemp()
+    _cgroup(root, "eee555", usage_usec=1000, memory=32 * MB)
+    client = FakeClient({"eee555": "api"})
+    restore = _patched(metrics_collector, get_docker_client=lambda: client, CGROUP_ROOT=root,
+                       METRICS_DISCOVERY_INTERVAL=0.02, METRICS_CGROUP_INTERVAL=0.02)
+    collector = MetricsCollector(source="cgroup")
+
+    def loops():
+        return [t for t in threading.enumerate()
+                if t.name in ("metrics-discovery", "metrics-cgroup") and t.is_alive()]
+    try:
+        collector.start()
+        collector.start()
+        assert len(loops()) == 2
+        assert _wait_for(lambda: _latest(collector, "eee555") is not None)
+
+        # Containers that start or stop are picked up by the discovery loop on its own
+        _cgroup(root, "fff666", usage_usec=1000, memory=16 * MB)
+        client.api.running["fff666"] = "new"
+        assert _wait_for(lambda: _latest(collector, "fff666") is not None)
+        del client.api.running["eee555"]
+        assert _wait_for(lambda: [s["id"] for s in collector.snapshot()] == ["fff666"])
+        assert client.api.streams_opened == []
+    finally:
+        collector.stop()
+        restore()
+    assert _wait_for(lambda: not loops())
+    print("✅ Metrics background threads passed")
+
+def test_source_detection():
+    print("Testing metrics source detection...")
+    root = tempfile.mkdtemp()
+    restore = _patched(metrics_collector, CGROUP_ROOT=root)
+    try:
+        assert MetricsCollector(source="auto").source == "api"
+        # cgroup v2 alone isn't enough: the containers' cgroups must be visible too
+        open(os.path.join(root, "cgroup.controllers"), "w").close()
+        assert MetricsCollector(source="auto").source == "api"
+        os.makedirs(os.path.join(root, "system.slice"))
+        assert MetricsCollector(source="auto").source == "cgroup"
+        assert MetricsCollector(source="api").source == "api"
+    finally:
+        restore()
+    print("✅ Metrics source detection passed")
+
+if __name__ == "__main__":
+    test_stream_mode_lifecycle()
+    test_cgroup_mode_sampling()
+    test_background_threads()
+    test_source_detection()
@@ -0,0 +1,70 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.report.pipeline import Stage, StageError, run_pipeline
+
+def test_independent_stages_run_in_parallel():
+    print("Testing parallel stage execution...")
+
+    def slow(value):
+        def _fn(**_):
+            time.sleep(0.3)
+            return value
+        return _fn
+
+    started = time.monotonic()
+    results, timings = run_pipeline([
+        Stage("a", slow(1)),
+        Stage("b", slow(2)),
+        Stage("c", slow(3)),
+        Stage("sum", lambda a, b: a + b, deps=("a", "b")),
+    ])
+    elapsed = time.monotonic() - started
+
+    assert results == {"a": 1, "b": 2, "c": 3, "sum": 3}
+    assert all(t["status"] == "ok" for t in timings.values())
+    # Three 0.3s stages in parallel should take ~0.3s, not ~0.9s
+    assert elapsed < 0.75, f"Stages did not overlap (took {elapsed:.2f}s)"
+
+def test_timeout_and_failure_fall_back():
+    print("Testing stage timeouts and fallbacks...")
+
+    def boom():
+        raise ValueError("nope")
+
+    results, timings = run_pipeline([
+        Stage("slow", lambda: time.sleep(2) or "late", timeout=0.1, fallback="fallback"),
+        Stage("broken", boom, fallback=lambda error: f"recovered from {error}"),
+        Stage("after", lambda broken: broken.upper(), deps=("broken",)),
+    ])
+
+    assert results["slow"] == "fallback"
+    assert timings["slow"]["status"] == "timeout"
+    assert results["broken"] == "recovered from nope"
+    assert timings["broken"]["status"] == "error"
+    assert results["after"] == "RECOVERED FROM NOPE"
+
+def test_required_stage_failure_keeps_partial_results():
+    print("Testing required stage failure...")
+
+    def boom(ok):
+        raise RuntimeError("image not found")
+
+    try:
+        run_pipeline([Stage("ok", lambda: 1), Stage("required", boom, deps=("ok",))])
+        assert False, "Required stage failure should raise"
+    except StageError as e:
+        assert e.stage == "required"
+        assert isinstance(e.error, RuntimeError)
+        assert e.results == {"ok": 1}
+
+if __name__ == "__main__":
+    try:
+        test_independent_stages_run_in_parallel()
+        test_timeout_and_failure_fall_back()
+        test_required_stage_failure_keeps_partial_results()
+        print("--- PIPELINE TEST PASSED ---")
+    except AssertionError as e:
+        print(f"--- TEST FAILED: {e} ---")
+        sys.exit(1)
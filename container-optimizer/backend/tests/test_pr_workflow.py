@@ -0,0 +1,157 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import pr_workflow
+from app.core.pr_workflow import full_bulk_pr_workflow, WorkflowStepError
+from app.core.memo import LRUCache
+
+UPDATES = [{"path": "Dockerfile", "content": "FROM python:3.12-slim\n"}]
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class FakeGitHub:
+    """Upstream o/r (read-only for us, so the workflow forks to me/r); `fail_commits` commit POSTs fail."""
+    def __init__(self):
+        self.calls = []
+        self.forks = 0
+        self.prs = []
+        self.fail_commits = 0
+
+    def get(self, path, **kwargs):
+        self.calls.append(("GET", path))
+        if path == "/repos/o/r":
+            return FakeResponse(200, {"default_branch": "main", "permissions": {"push": False}})
+        if path == "/repos/me/r":
+            return FakeResponse(200, {})
+        if path == "/repos/o/r/git/refs/heads/main":
+            return FakeResponse(200, {"object": {"sha": "upstream-head"}})
+        if path == "/repos/o/r/git/commits/upstream-head":
+            return FakeResponse(200, {"tree": {"sha": "base-tree"}})
+        return FakeResponse(404, {"message": "Not Found"})
+
+    def post(self, path, json=None, **kwargs):
+        self.calls.append(("POST", path))
+        if path.endswith("/git/trees"):
+            return FakeResponse(201, {"sha": "new-tree"})
+        if path.endswith("/git/commits"):
+            if self.fail_commits:
+                self.fail_commits -= 1
+                return FakeResponse(502, {"message": "Bad Gateway"})
+            self.commit_parents = json["parents"]
+            return FakeResponse(201, {"sha": "new-commit"})
+        return FakeResponse(201, {})
+
+    def patch(self, path, json=None, **kwargs):
+        self.calls.append(("PATCH", path))
+        return FakeResponse(200, {})
+
+def _install(gh, states=None):
+    def fork(owner, repo, token=None):
+        gh.forks += 1
+
+    def pull_request(owner, repo, title, body, head, base, token=None):
+        gh.prs.append((head, base))
+        return FakeResponse(201, {"html_url": "https://github.com/o/r/pull/1"})
+
+    return _patched(
+        pr_workflow,
+        get_github_client=lambda token=None: gh,
+        get_authenticated_user=lambda token=None: "me",
+        fork_repo=fork,
+        create_pull_request=pull_request,
+        get_token=lambda: "t",
+        _states=states if states is not None else LRUCache(maxsize=16, ttl=60),
+    )
+
+def _patched(module, **values):
+    originals = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    return lambda: [setattr(module, name, value) for name, value in originals.items()]
+
+def _run(events=None):
+    on_event = (lambda step, status, info: events.append((step, status))) if events is not None else None
+    return full_bulk_pr_workflow("o", "r", UPDATES, branch_name="optimize", token="t", on_event=on_event)
+
+def test_resumes_after_failed_commit():
+    print("Testing PR workflow resume...")
+    gh = FakeGitHub()
+    gh.fail_commits = 1
+    restore = _install(gh)
+    try:
+        try:
+            _run()
+            assert False, "expected WorkflowStepError"
+        except WorkflowStepError as e:
+            assert e.step == "commit"
+        assert gh.forks == 1 and gh.calls.count(("POST", "/repos/me/r/git/trees")) == 1
+
+        # Same request again: picks up at the commit, no second fork, tree or base lookup
+        gh.calls.clear()
+        events = []
+        assert _run(events) == "https://github.com/o/r/pull/1"
+        assert gh.forks == 1
+        assert [s for s, status in events if status == "skipped"] == ["lookup", "fork", "base", "tree"]
+        assert ("POST", "/repos/me/r/git/trees") not in gh.calls
+        assert not any(path.startswith("/repos/o/r") for _, path in gh.calls)
+        assert gh.calls == [("POST", "/repos/me/r/git/commits"), ("POST", "/repos/me/r/git/refs")]
+        assert gh.prs == [("me:optimize", "main")]
+
+        # Finished: its state is dropped, so the next identical request starts from scratch
+        _run()
+        assert gh.forks == 2
+    finally:
+        restore()
+    print("✅ PR workflow resume passed")
+
+def test_state_expires_after_ttl():
+    print("Testing PR workflow state TTL...")
+    gh = FakeGitHub()
+    gh.fail_commits = 1
+    restore = _install(gh, states=LRUCache(maxsize=16, ttl=0.05))
+    try:
+        try:
+            _run()
+            assert False, "expected WorkflowStepError"
+        except WorkflowStepError:
+            pass
+        time.sleep(0.1)
+        events = []
+        _run(events)
+        # Expired: every step runs again, including the fork
+        assert not any(status == "skipped" for _, status in events)
+        assert gh.forks == 2
+    finally:
+        restore()
+    print("✅ PR workflow state TTL passed")
+
+def test_commit_parent_is_upstream_head():
+    print("Testing PR workflow base ref...")
+    gh = FakeGitHub()
+    restore = _install(gh)
+    try:
+        _run()
+        # The fork may be stale: the parent comes from the upstream branch, not the fork's copy
+        assert ("GET", "/repos/o/r/git/refs/heads/main") in gh.calls
+        assert not any(path.startswith("/repos/me/r/git/refs/heads/main") for _, path in gh.calls)
+        assert gh.commit_parents == ["upstream-head"]
+        assert gh.prs == [("me:optimize", "main")]
+    finally:
+        restore()
+    print("✅ PR workflow base ref passed")
+
+if __name__ == "__main__":
+    test_resumes_after_failed_commit()
+    test_state_expires_after_ttl()
+    test_commit_parent_is_upstream_head()
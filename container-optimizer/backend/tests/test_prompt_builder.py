@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.prompt_builder import build_prompt, compact_findings, collapse_run_chains, _trim_middle, estimate_tokens
+
+CONTEXT = {"image": "app", "runtime": "python", "misconfigurations": []}
+
+def _dockerfile(comment_lines=0, chain=0, filler=0):
+    lines = ["FROM python:3.12-slim"]
+    lines += [f"# note {i}: explains the next step in far more words than anyone needs" for i in range(comment_lines)]
+    if chain:
+        lines.append("RUN " + " && \\\n    ".join(f"step-{i} --with-some-flags" for i in range(chain)))
+    lines += [f"ENV SETTING_{i}=value-{i}" for i in range(filler)]
+    lines += ["USER app", 'CMD ["python", "app.py"]']
+    return "\n".join(lines)
+
+def test_compact_findings_dedupes_with_counts():
+    print("Testing findings compaction...")
+    misconfigs = [
+        {"id": "DS002", "severity": "LOW", "message": "no healthcheck"},
+        {"id": "DS001", "severity": "HIGH", "message": "runs as root", "recommendation": "add USER"},
+        {"id": "DS002", "severity": "LOW", "message": "no healthcheck"},
+        {"id": "DS001", "severity": "HIGH", "message": "runs as root", "recommendation": "add USER"},
+        {"id": "DS001", "severity": "HIGH", "message": "runs as root", "recommendation": "add USER"},
+        {"id": "DS003", "severity": "CRITICAL", "message": "secret in ENV"},
+    ]
+    assert compact_findings(misconfigs) == [
+        "F1 [CRITICAL] DS003: secret in ENV",
+        "F2 [HIGH] DS001: runs as root -> add USER (x3)",
+        "F3 [LOW] DS002: no healthcheck (x2)",
+    ]
+    print("✅ Findings compaction passed")
+
+def test_run_chain_keeps_head_and_tail():
+    print("Testing RUN chain collapsing...")
+    lines = _dockerfile(chain=12).splitlines()
+    out, collapsed = collapse_run_chains(lines, keep=2)
+    assert collapsed == 1
+    assert out == [
+        "FROM python:3.12-slim",
+        "RUN step-0 --with-some-flags && step-1 --with-some-flags && ... 8 commands omitted ... "
+        "&& step-10 --with-some-flags && step-11 --with-some-flags",
+        "USER app",
+        'CMD ["python", "app.py"]',
+    ]
+
+    # `&&` inside quotes is part of one command; short chains are left as written
+    quoted = ['RUN a && echo "b && c" && d && f', "RUN sh -c 'x && y && z' && w && v && u"]
+    assert collapse_run_chains(quoted, keep=1) == (
+        ['RUN a && ... 2 commands omitted ... && f', "RUN sh -c 'x && y && z' && ... 2 commands omitted ... && u"], 2)
+    assert collapse_run_chains(['RUN a && echo "b && c && d" && e'], keep=1) == (['RUN a && echo "b && c && d" && e'], 0)
+
+    # Heredoc bodies are file content, never collapsed
+    heredoc = ["RUN <<EOF", "a && b && c && d && e", "EOF"]
+    assert collapse_run_chains(heredoc, keep=1) == (heredoc, 0)
+    print("✅ RUN chain collapsing passed")
+
+def test_trim_middle_keeps_head_and_tail():
+    print("Testing Dockerfile middle trimming...")
+    lines = [f"line {i:02d}" for i in range(40)]
+    out, trimmed = _trim_middle(lines, token_budget=40)
+    assert trimmed > 0 and len(out) == 40 - trimmed + 1
+    marker = out.index(f"# [... {trimmed} lines omitted to fit the prompt budget ...]")
+    head, tail = out[:marker], out[marker + 1:]
+    assert head == lines[:len(head)] and tail == lines[-len(tail):]
+    # Roughly three head lines for every two tail lines
+    assert len(head) > len(tail) > 0
+    assert _trim_middle(lines[:3], token_budget=1000) == (lines[:3], 0)
+    print("✅ Dockerfile middle trimming passed")
+
+def test_budget_cutoffs_escalate_only_as_needed():
+    print("Testing prompt budget cut-offs...")
+    fixed = estimate_tokens(build_prompt(CONTEXT, " ")[0])
+
+    # Fits as is: nothing dropped
+    dockerfile = _dockerfile(comment_lines=3, chain=12)
+    prompt, metrics = build_prompt(CONTEXT, dockerfile, budget=fixed + 1000)
+    assert "# note 0" in prompt and "step-5" in prompt
+    assert metrics["run_chains_collapsed"] == metrics["lines_trimmed"] == 0 and metrics["within_budget"]
+
+    # Dropping comments is enough: the chain stays whole
+    without_comments = _dockerfile(chain=12)
+    prompt, metrics = build_prompt(CONTEXT, dockerfile, budget=fixed + estimate_tokens(without_comments) + 5)
+    assert "# note" not in prompt and "step-5" in prompt
+    assert metrics["run_chains_collapsed"] == 0 and metrics["within_budget"]
+
+    # Comments gone and the chain still too long: collapsed, but nothing trimmed
+    prompt, metrics = build_prompt(CONTEXT, dockerfile, budget=fixed + 70)
+    assert "commands omitted" in prompt and "step-0" in prompt and "step-11" in prompt
+    assert metrics["run_chains_collapsed"] == 1 and metrics["lines_trimmed"] == 0 and metrics["within_budget"]
+
+    # Still over: the middle goes, FROM and the final USER/CMD stay
+    prompt, metrics = build_prompt(CONTEXT, _dockerfile(filler=60), budget=fixed + 120)
+    assert metrics["lines_trimmed"] > 0 and metrics["within_budget"]
+    assert "FROM python:3.12-slim" in prompt and 'CMD ["python", "app.py"]' in prompt and "USER app" in prompt
+
+    # Findings past their share of the budget are summarized, most severe kept
+    context = dict(CONTEXT, misconfigurations=[
+        {"id": f"DS{i:03d}", "severity": "HIGH" if i == 99 else "LOW", "message": f"issue number {i} " * 5}
+        for i in range(100)
+    ])
+    prompt, metrics = build_prompt(context, None, budget=1000)
+    assert metrics["findings_in"] == 100 and metrics["findings_out"] < 100
+    assert "F1 [HIGH] DS099" in prompt
+    assert f"... and {101 - metrics['findings_out']} more lower-severity findings" in prompt
+    print("✅ Prompt budget cut-offs passed")
+
+if __name__ == "__main__":
+    test_compact_findings_dedupes_with_counts()
+    test_run_chain_keeps_head_and_tail()
+    test_trim_middle_keeps_head_and_tail()
+    test_budget_cutoffs_escalate_only_as_needed()
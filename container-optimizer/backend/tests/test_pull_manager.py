@@ -0,0 +1,104 @@
+import sys
+import os
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.docker import pull_manager
+from app.docker.pull_manager import PullManager, PullProgress, PullError, canonical_reference
+
+PULL_STREAM = [
+    {"status": "Pulling from library/node", "id": "20"},
+    {"status": "Pulling fs layer", "id": "aaa"},
+    {"status": "Already exists", "id": "bbb"},
+    {"status": "Downloading", "progressDetail": {"current": 100, "total": 400}, "id": "aaa"},
+    {"status": "Downloading", "progressDetail": {"current": 300, "total": 400}, "id": "aaa"},
+    {"status": "Download complete", "id": "aaa"},
+    {"status": "Pull complete", "id": "aaa"},
+    {"status": "Digest: sha256:feed"},
+    {"status": "Status: Downloaded newer image for node:20"},
+]
+
+class FakeImage:
+    id = "sha256:nodeimage"
+
+class FakeClient:
+    def __init__(self, release):
+        self.release = release
+        self.pulls = 0
+        self.api = self
+        self.images = self
+
+    def pull(self, ref, stream=False, decode=False, platform=None):
+        self.pulls += 1
+        for i, message in enumerate(PULL_STREAM):
+            if i == 4:
+                # Hold the pull open so the second caller joins it mid-flight
+                self.release.wait(5)
+            yield message
+
+    def get(self, ref):
+        return FakeImage()
+
+def test_progress_counters():
+    print("Testing pull progress parsing...")
+    progress = PullProgress("node:20")
+    finished = [progress.update(m) for m in PULL_STREAM]
+    snapshot = progress.snapshot()
+    assert finished.count(True) == 3
+    assert snapshot["bytes_downloaded"] == 400 and snapshot["bytes_total"] == 400
+    assert snapshot["layers_total"] == 2 and snapshot["layers_done"] == 2
+    assert progress.digest == "sha256:feed"
+    try:
+        progress.update({"error": "manifest for node:99 not found", "errorDetail": {}})
+        assert False, "expected a PullError"
+    except PullError:
+        pass
+    print("✅ Pull progress parsing passed")
+
+def test_concurrent_pulls_coalesce():
+    print("Testing single-flight pulls...")
+    release = threading.Event()
+    client = FakeClient(release)
+    original = pull_manager.get_docker_client
+    pull_manager.get_docker_client = lambda: client
+    try:
+        manager = PullManager()
+        events = {"a": [], "b": []}
+        results = {}
+
+        def run(name, ref):
+            results[name] = manager.pull(ref, on_progress=events[name].append)
+
+        first = threading.Thread(target=run, args=("a", "node:20"))
+        first.start()
+        while not manager.in_flight():
+            pass
+        # Same image written differently joins the pull already under way
+        second = threading.Thread(target=run, args=("b", "docker.io/library/node:20"))
+        second.start()
+        while not events["b"]:
+            pass
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        assert client.pulls == 1
+        assert results["a"]["image_id"] == results["b"]["image_id"] == "sha256:nodeimage"
+        assert events["a"][-1]["status"] == events["b"][-1]["status"] == "complete"
+        assert events["b"][-1]["bytes_downloaded"] == 400
+
+        # Recently pulled and still local: no second pull
+        assert manager.pull("node:20")["cached"] is True
+        assert client.pulls == 1
+    finally:
+        release.set()
+        pull_manager.get_docker_client = original
+    print("✅ Single-flight pulls passed")
+
+def test_canonical_reference():
+    assert canonical_reference("node:20") == canonical_reference("docker.io/library/node:20")
+    assert canonical_reference("localhost:5000/app") == "localhost:5000/app:latest"
+
+if __name__ == "__main__":
+    test_progress_counters()
+    test_concurrent_pulls_coalesce()
+    test_canonical_reference()
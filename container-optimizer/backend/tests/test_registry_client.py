@@ -0,0 +1,239 @@
+import sys
+import os
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import registry_client
+from app.core.registry_client import parse_reference, fetch_image_metadata, RegistryError, MANIFEST_V2, MANIFEST_LIST
+from app.core.image_analyzer import analyze_registry_image
+from app.core.analyzers.runtime_analyzer import analyze_registry_runtime
+from app.core.disk_cache import DiskCache
+
+def _digest(body: bytes) -> str:
+    return "sha256:" + hashlib.sha256(body).hexdigest()
+
+CONFIG = json.dumps({
+    "architecture": "amd64",
+    "os": "linux",
+    "config": {"User": "app", "Env": ["PATH=/usr/bin", "PYTHON_VERSION=3.12.1"]},
+    "rootfs": {"type": "layers", "diff_ids": ["sha256:d1", "sha256:d2"]},
+    "history": [
+        {"created_by": "/bin/sh -c #(nop) ADD file:abc in / "},
+        {"created_by": "/bin/sh -c #(nop)  ENV PYTHON_VERSION=3.12.1", "empty_layer": True},
+        {"created_by": "RUN /bin/sh -c pip install -r requirements.txt # buildkit"},
+        {"created_by": "USER app", "empty_layer": True},
+    ],
+}).encode()
+MANIFEST = json.dumps({
+    "schemaVersion": 2,
+    "mediaType": MANIFEST_V2,
+    "config": {"mediaType": "application/vnd.docker.container.image.v1+json", "digest": _digest(CONFIG), "size": len(CONFIG)},
+    "layers": [
+        {"digest": "sha256:l1", "size": 30 * 1024 * 1024},
+        {"digest": "sha256:l2", "size": 60 * 1024 * 1024},
+    ],
+}).encode()
+INDEX = json.dumps({
+    "schemaVersion": 2,
+    "mediaType": MANIFEST_LIST,
+    "manifests": [
+        {"digest": "sha256:" + "0" * 64, "platform": {"os": "linux", "architecture": "arm64"}},
+        {"digest": _digest(MANIFEST), "platform": {"os": "linux", "architecture": "amd64"}},
+    ],
+}).encode()
+
+class RegistryStandIn(BaseHTTPRequestHandler):
+    """Just enough of registry:2 behind a token server: manifests, manifest lists and blobs."""
+    requests = []
+    authorizations = []
+    # Overrides the token realm advertised in challenges (default: this server)
+    realm = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        RegistryStandIn.requests.append(self.path)
+        RegistryStandIn.authorizations.append((self.path, self.headers.get("Authorization")))
+        port = self.server.server_address[1]
+        if self.path.startswith("/token"):
+            return self._send(200, json.dumps({"token": "t0k", "expires_in": 300}).encode())
+        if self.headers.get("Authorization") != "Bearer t0k":
+            realm = RegistryStandIn.realm or f"http://127.0.0.1:{port}/token"
+            return self._send(401, headers={"WWW-Authenticate":
+                f'Bearer realm="{realm}",service="stand-in",scope="repository:team/app:pull"'})
+
+        documents = {
+            "/v2/team/app/manifests/1.0": (MANIFEST, MANIFEST_V2),
+            "/v2/team/app/manifests/multi": (INDEX, MANIFEST_LIST),
+            f"/v2/team/app/manifests/{_digest(MANIFEST)}": (MANIFEST, MANIFEST_V2),
+            f"/v2/team/app/blobs/{_digest(CONFIG)}": (CONFIG, "application/octet-stream"),
+        }
+        if self.path not in documents:
+            return self._send(404, b'{"errors": [{"code": "MANIFEST_UNKNOWN"}]}')
+        body, media_type = documents[self.path]
+        self._send(200, body, {"Content-Type": media_type, "Docker-Content-Digest": _digest(body)})
+
+def test_parse_reference():
+    print("Testing image reference parsing...")
+    assert parse_reference("nginx") == ("docker.io", "library/nginx", "latest")
+    assert parse_reference("bitnami/redis:7") == ("docker.io", "bitnami/redis", "7")
+    assert parse_reference("localhost:5000/team/app") == ("localhost:5000", "team/app", "latest")
+    assert parse_reference("ghcr.io/o/app@sha256:abc") == ("ghcr.io", "o/app", "sha256:abc")
+    print("✅ Reference parsing passed")
+
+def test_fetch_metadata_without_pull():
+    print("Testing registry metadata fetch...")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RegistryStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache = registry_client._blob_cache
+    registry_client._blob_cache = DiskCache("registry_blob", path=os.path.join(tempfile.mkdtemp(), "cache.db"))
+    try:
+        ref = f"127.0.0.1:{server.server_address[1]}/team/app"
+
+        metadata = fetch_image_metadata(f"{ref}:multi")
+        assert metadata["index_digest"] == _digest(INDEX)
+        assert metadata["manifest_digest"] == _digest(MANIFEST)
+        assert metadata["image_id"] == _digest(CONFIG)
+
+        image = analyze_registry_image(metadata)
+        assert image["layer_count"] == 4
+        assert [l["digest"] for l in reversed(image["layers"])] == ["sha256:d1", None, "sha256:d2", None]
+        assert image["layers"][1]["is_large"] and image["layers"][1]["size_bytes"] == 60 * 1024 * 1024
+        assert image["total_size_bytes"] == 90 * 1024 * 1024
+        assert image["runtime"] == "python"
+        assert analyze_registry_runtime(metadata["config"])["runs_as_root"] is False
+
+        # Token reused, manifest and config served from the blob cache: one request for the tag
+        RegistryStandIn.requests.clear()
+        fetch_image_metadata(f"{ref}:1.0")
+        assert RegistryStandIn.requests == ["/v2/team/app/manifests/1.0"]
+
+        try:
+            fetch_image_metadata(f"{ref}:missing")
+            assert False, "expected a 404"
+        except RegistryError as e:
+            assert e.status == 404
+    finally:
+        registry_client._blob_cache = cache
+        server.shutdown()
+    print("✅ Registry metadata fetch passed")
+
+def test_credentials_scoped_to_their_registry():
+    print("Testing registry credential scoping...")
+    own = ThreadingHTTPServer(("127.0.0.1", 0), RegistryStandIn)
+    foreign = ThreadingHTTPServer(("127.0.0.1", 0), RegistryStandIn)
+    for server in (own, foreign):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    own_host = f"127.0.0.1:{own.server_address[1]}"
+    foreign_host = f"127.0.0.1:{foreign.server_address[1]}"
+
+    cache, clients, credentials = registry_client._blob_cache, dict(registry_client._clients), registry_client._credentials
+    registry_client._blob_cache = DiskCache("registry_blob", path=os.path.join(tempfile.mkdtemp(), "cache.db"))
+    registry_client._clients.clear()
+    registry_client._credentials = {own_host: ("bot", "s3cret")}
+    try:
+        # The configured registry gets its credentials, on the first request and at its own token realm
+        RegistryStandIn.authorizations.clear()
+        fetch_image_metadata(f"{own_host}/team/app:1.0")
+        assert RegistryStandIn.authorizations[0][0] == "/v2/team/app/manifests/1.0"
+        assert RegistryStandIn.authorizations[0][1].startswith("Basic ")
+        assert any(path.startswith("/token") and (auth or "").startswith("Basic ") for path, auth in RegistryStandIn.authorizations)
+
+        # Any other host, named by whoever submits the reference, gets nothing
+        RegistryStandIn.authorizations.clear()
+        fetch_image_metadata(f"{foreign_host}/team/app:1.0")
+        assert not any((auth or "").startswith("Basic ") for _, auth in RegistryStandIn.authorizations)
+
+        # Nor does a token realm the registry points at on a different host
+        registry_client._clients.clear()
+        RegistryStandIn.realm = f"http://localhost:{foreign.server_address[1]}/token"
+        RegistryStandIn.authorizations.clear()
+        fetch_image_metadata(f"{own_host}/team/app:1.0")
+        token_requests = [auth for path, auth in RegistryStandIn.authorizations if path.startswith("/token")]
+        assert token_requests == [None]
+    finally:
+        RegistryStandIn.realm = None
+        registry_client._blob_cache = cache
+        registry_client._clients.clear()
+        registry_client._clients.update(clients)
+        registry_client._credentials = credentials
+        own.shutdown()
+        foreign.shutdown()
+    print("✅ Registry credential scoping passed")
+
+def test_load_credentials():
+    print("Testing registry credential sources...")
+    config_dir = tempfile.mkdtemp()
+    with open(os.path.join(config_dir, "config.json"), "w") as f:
+        json.dump({"auths": {
+            "https://index.docker.io/v1/": {"auth": base64.b64encode(b"hub:pw").decode()},
+            "ghcr.io": {"auth": base64.b64encode(b"old:pw").decode()},
+        }}, f)
+    saved = registry_client.DOCKER_CONFIG, registry_client.REGISTRY_AUTH
+    registry_client.DOCKER_CONFIG = config_dir
+    registry_client.REGISTRY_AUTH = json.dumps({"ghcr.io": "octo:ghp", "https://registry.example.com/": {"username": "u", "password": "p"}})
+    try:
+        assert registry_client._load_credentials() == {
+            "docker.io": ("hub", "pw"),
+            "ghcr.io": ("octo", "ghp"),
+            "registry.example.com": ("u", "p"),
+        }
+    finally:
+        registry_client.DOCKER_CONFIG, registry_client.REGISTRY_AUTH = saved
+    print("✅ Registry credential sources passed")
+
+def test_security_stage_pulls_and_scans_by_digest():
+    print("Testing registry security stage pinning...")
+    from app.core import registry_service
+    calls = {}
+
+    class Puller:
+        def recent(self, ref):
+            return None
+
+        def pull(self, ref, on_progress=None, platform=None):
+            calls["pull"] = (ref, platform)
+
+    metadata = {"registry": "ghcr.io", "repository": "o/app", "manifest_digest": "sha256:m1",
+                "index_digest": "sha256:i1", "image_id": "sha256:c1", "config": {}}
+    patched = {
+        "fetch_image_metadata": lambda ref: metadata,
+        "get_pull_manager": lambda: Puller(),
+        "get_cached_scan": lambda digest: None,
+        "_is_local": lambda image_id: False,
+        "analyze_security": lambda name, digest=None: calls.setdefault("scan", (name, digest)),
+        "build_report": lambda name, on_event=None, sources=None, security_timeout=None: {"security": sources["security"]()},
+    }
+    originals = {name: getattr(registry_service, name) for name in patched}
+    for name, value in patched.items():
+        setattr(registry_service, name, value)
+    try:
+        report = registry_service.scan_registry_image("ghcr.io/o/app:latest")
+    finally:
+        for name, value in originals.items():
+            setattr(registry_service, name, value)
+    # Never by tag: the pulled and scanned image is the one whose digest the result is filed under
+    assert calls["pull"] == ("ghcr.io/o/app@sha256:m1", registry_client.REGISTRY_PLATFORM)
+    assert calls["scan"] == ("sha256:c1", "sha256:c1")
+    assert report["registry"]["pulled"] is True
+    print("✅ Registry security stage pinning passed")
+
+if __name__ == "__main__":
+    test_parse_reference()
+    test_fetch_metadata_without_pull()
+    test_credentials_scoped_to_their_registry()
+    test_load_credentials()
+    test_security_stage_pulls_and_scans_by_digest()
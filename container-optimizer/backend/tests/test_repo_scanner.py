@@ -0,0 +1,127 @@
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import repo_scanner, github_service
+from app.core.repo_scanner import scan_repository
+
+URL = "https://github.com/o/r"
+
+class FakeGitHub:
+    """A repo with Dockerfiles at `files` ({path: content}); blob SHAs are "sha-<path>"."""
+    def __init__(self, files, unreadable_blobs=()):
+        self.files = files
+        self.unreadable_blobs = set(unreadable_blobs)
+        self.blob_fetches = []
+        self.file_fetches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def find_dockerfile_entries(self, owner, repo, token=None, ref=None):
+        return [{"path": p, "sha": f"sha-{p}", "size": len(c)} for p, c in sorted(self.files.items())]
+
+    def get_blobs(self, owner, repo, shas, token=None):
+        self.blob_fetches.append(list(shas))
+        return {sha: self.files[sha[4:]] for sha in shas if sha not in self.unreadable_blobs}
+
+    def get_file_content(self, owner, repo, path, token=None, ref=None):
+        self.file_fetches.append(path)
+        return self.files.get(path)
+
+    def build_static_report(self, content):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return {"content": content}
+
+def _install(gh, **values):
+    return _patched(repo_scanner, **{
+        "find_dockerfile_entries": gh.find_dockerfile_entries,
+        "get_blobs": gh.get_blobs,
+        "get_file_content": gh.get_file_content,
+        "build_static_report": gh.build_static_report,
+        **values,
+    })
+
+def _patched(module, **values):
+    originals = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    return lambda: [setattr(module, name, value) for name, value in originals.items()]
+
+def test_bulk_scan_is_bounded():
+    print("Testing bounded bulk scan...")
+    files = {f"svc{i}/Dockerfile": f"FROM python:3.12-slim\n# {i}\n" for i in range(8)}
+    gh = FakeGitHub(files)
+    restore = _install(gh)
+    try:
+        streamed = []
+        result = scan_repository("o", "r", "main", URL, concurrency=2, on_result=streamed.append)
+        assert gh.max_in_flight == 2
+        # Every file is reported as it completes, and the final list is in path order
+        assert sorted(r["path"] for r in streamed) == sorted(files)
+        assert [r["path"] for r in result["results"]] == sorted(files)
+        assert all(r["status"] == "ok" for r in result["results"])
+        report = result["results"][0]["report"]
+        assert report["path"] == "svc0/Dockerfile" and report["original_content"] == files["svc0/Dockerfile"]
+        assert report["owner"] == "o" and report["branch"] == "main" and report["url"] == URL
+        # All contents came down in one bulk fetch
+        assert gh.blob_fetches == [[f"sha-{p}" for p in sorted(files)]] and gh.file_fetches == []
+    finally:
+        restore()
+
+    # Requested concurrency is capped
+    gh = FakeGitHub(files)
+    restore = _install(gh, GITHUB_SCAN_MAX_CONCURRENCY=3)
+    try:
+        scan_repository("o", "r", None, URL, concurrency=100)
+        assert gh.max_in_flight == 3
+    finally:
+        restore()
+    print("✅ Bounded bulk scan passed")
+
+def test_bulk_scan_per_file_fallbacks():
+    print("Testing bulk scan fallbacks...")
+    gh = FakeGitHub({"api/Dockerfile": "FROM node:20\n", "web/Dockerfile": "FROM nginx\n"},
+                    unreadable_blobs={"sha-web/Dockerfile"})
+    restore = _install(gh)
+    try:
+        # An unreadable blob is fetched by path; a path missing from the tree fails on its own
+        result = scan_repository("o", "r", "main", URL, paths=["web/Dockerfile", "gone/Dockerfile", "api/Dockerfile"])
+        by_path = {r["path"]: r for r in result["results"]}
+        assert by_path["web/Dockerfile"]["report"]["original_content"] == "FROM nginx\n"
+        assert by_path["api/Dockerfile"]["status"] == "ok"
+        assert by_path["gone/Dockerfile"] == {"path": "gone/Dockerfile", "status": "error",
+                                              "error": "Failed to fetch Dockerfile at gone/Dockerfile"}
+        assert sorted(gh.file_fetches) == ["gone/Dockerfile", "web/Dockerfile"]
+        assert result["paths"] == ["web/Dockerfile", "gone/Dockerfile", "api/Dockerfile"]
+    finally:
+        restore()
+    print("✅ Bulk scan fallbacks passed")
+
+def test_failed_discovery_returns_empty_results():
+    print("Testing bulk scan with failed discovery...")
+    gh = FakeGitHub({})
+    # The tree can't be read (404, rate limit, private repo without a token)
+    restore_index = _patched(github_service, get_repo_index=lambda owner, repo, ref=None, token=None: None)
+    restore = _install(gh, find_dockerfile_entries=github_service.find_dockerfile_entries)
+    try:
+        # An empty scan, not an error
+        on_result_calls = []
+        result = scan_repository("o", "r", None, URL, on_result=on_result_calls.append)
+        assert result["paths"] == [] and result["results"] == [] and result["multi_service"] is True
+        assert on_result_calls == [] and gh.file_fetches == []
+    finally:
+        restore()
+        restore_index()
+    print("✅ Bulk scan with failed discovery passed")
+
+if __name__ == "__main__":
+    test_bulk_scan_is_bounded()
+    test_bulk_scan_per_file_fallbacks()
+    test_failed_discovery_returns_empty_results()
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core.analyzers.matcher import PatternMatcher
+from app.core.analyzers.rules import split_instruction
+from app.core.analyzers.misconfig_analyzer import analyze_misconfig
+from app.core.dockerfile_analyzer import analyze_dockerfile_content
+
+def _ids(dockerfile):
+    analysis = analyze_dockerfile_content(dockerfile)
+    return [i["id"] for i in analyze_misconfig(analysis, analysis["runtime_analysis"])]
+
+def test_matcher_finds_overlapping_patterns():
+    print("Testing pattern matcher...")
+    matcher = PatternMatcher(["make", "makefile", "git", "gcc"])
+    assert matcher.find("cp makefile /src && gcc -o app") == {"make", "makefile", "gcc"}
+    assert matcher.find("apt-get install curl") == set()
+
+def test_history_commands_map_to_instructions():
+    print("Testing instruction detection for image history...")
+    assert split_instruction({"command": "/bin/sh -c #(nop)  HEALTHCHECK &{[\"CMD\"]}"})[0] == "HEALTHCHECK"
+    assert split_instruction({"command": "/bin/sh -c apt-get install -y gcc"})[0] == "RUN"
+    assert split_instruction({"command": "RUN /bin/sh -c make # buildkit"})[0] == "RUN"
+    assert split_instruction({"command": "EXPOSE 8000-9000"})[1] == "8000-9000"
+    assert split_instruction({"command": "COPY . . # buildkit"})[1] == ". ."
+
+def test_rules_single_pass():
+    print("Testing misconfiguration rules...")
+    ids = _ids("""
+FROM ubuntu
+ARG GIT_SHA
+VOLUME /var/run/docker.sock
+COPY . /app
+EXPOSE 1000-5000 80
+HEALTHCHECK CMD wget -q localhost
+""")
+    assert ids == ["RUN_AS_ROOT", "HEAVY_BASE_IMAGE", "SINGLE_STAGE", "DOCKER_SOCKET_MOUNT",
+                   "COPY_ALL", "EXCESSIVE_EXPOSE", "NO_VERSION_PINNING"], ids
+
+    # Build tools are only looked for in RUN instructions, and curl suppresses the rule (as before)
+    ids = _ids("FROM python:3.12-slim\nRUN pip install gitpython && curl -fsS x\nCOPY . .\nUSER app")
+    assert "BUILD_TOOLS_PRESENT" not in ids and "COPY_ALL" not in ids
+    assert "BUILD_TOOLS_PRESENT" in _ids("FROM python:3.12-slim\nRUN apt-get install -y build-essential")
+
+    # Image history: BuildKit's "# buildkit" marker is not a COPY destination
+    def history_ids(command):
+        analysis = {"base_image": "python:3.12-slim", "layers": [{"command": command}]}
+        return [i["id"] for i in analyze_misconfig(analysis, {})]
+    assert "COPY_ALL" not in history_ids("COPY . . # buildkit")
+    assert "COPY_ALL" in history_ids("COPY . /app # buildkit")
+
+if __name__ == "__main__":
+    test_matcher_finds_overlapping_patterns()
+    test_history_commands_map_to_instructions()
+    test_rules_single_pass()
+    print("All rule engine tests passed!")
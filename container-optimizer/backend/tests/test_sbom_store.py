@@ -0,0 +1,87 @@
+import sys
+import os
+import tempfile
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import sbom_store, security_scanner
+from app.core.disk_cache import DiskCache
+
+def _vuln(cve, pkg="openssl", severity="HIGH"):
+    return {"VulnerabilityID": cve, "PkgName": pkg, "InstalledVersion": "3.0.1", "FixedVersion": "3.0.9",
+            "Severity": severity, "Title": f"{pkg} issue"}
+
+SECRET = {"RuleID": "aws-access-key-id", "Title": "AWS Access Key ID", "Severity": "CRITICAL"}
+
+def _scan(*vulns, secrets=()):
+    results = [{"Target": "app (debian 12)", "Class": "os-pkgs", "Vulnerabilities": list(vulns)}]
+    if secrets:
+        results.append({"Target": "/app/.env", "Class": "secret", "Secrets": list(secrets)})
+    return {"ArtifactName": "app:1", "Results": results}
+
+def test_static_results_keep_only_db_independent_findings():
+    print("Testing SBOM static findings...")
+    kept = sbom_store.static_results(_scan(_vuln("CVE-1"), secrets=[SECRET]))
+    assert kept == [{"Target": "/app/.env", "Class": "secret", "Secrets": [SECRET]}]
+    print("✅ SBOM static findings passed")
+
+def test_db_update_reevaluates_from_sbom():
+    print("Testing SBOM re-evaluation...")
+    tmp = os.path.join(tempfile.mkdtemp(), "cache.db")
+    state = {"db": "v1", "image_scans": 0, "sbom_scans": []}
+    sbom_release = threading.Event()
+    vulns_by_db = {"v1": [_vuln("CVE-1")], "v2": [_vuln("CVE-1"), _vuln("CVE-2", "zlib", "CRITICAL")]}
+
+    patched = {
+        (security_scanner, "_scan_cache"): DiskCache("trivy_image_scan", path=tmp),
+        (security_scanner, "SBOM_REEVALUATE_ON_DB_UPDATE"): False,
+        (security_scanner, "get_trivy_db_version"): lambda refresh=False: state["db"],
+        (security_scanner, "_run_image_scan"): lambda name: state.update(image_scans=state["image_scans"] + 1)
+                                                or _scan(*vulns_by_db[state["db"]], secrets=[SECRET]),
+        (security_scanner, "_run_sbom_scan"): lambda record: state["sbom_scans"].append(record["digest"])
+                                               or {**_scan(*vulns_by_db[state["db"]]), "ArtifactName": record["image"]},
+        (sbom_store, "_store"): DiskCache("sbom", path=tmp),
+        (sbom_store, "_evaluations"): DiskCache("sbom_evaluation", path=tmp),
+        (sbom_store, "generate_sbom"): lambda name: sbom_release.wait(5)
+                                       and {"bomFormat": "CycloneDX", "components": [{"name": "openssl"}]},
+    }
+    originals = {key: getattr(*key) for key in patched}
+    for (module, name), value in patched.items():
+        setattr(module, name, value)
+    try:
+        # First scan: full image scan, returned without waiting for the SBOM generated behind it
+        first = security_scanner.scan_image("app:1", digest="sha256:app")
+        assert state["image_scans"] == 1
+        assert sbom_store.get_record("sha256:app") is None
+        pending = security_scanner.generate_sbom_later("app:1", "sha256:app", first, "v1")
+        assert list(security_scanner._sbom_pending.values()) == [pending]
+        sbom_release.set()
+        pending.result(timeout=5)
+        # Stored with the image's secret findings
+        assert sbom_store.get_record("sha256:app")["static_results"][0]["Secrets"] == [SECRET]
+        assert security_scanner.scan_image("app:1", digest="sha256:app") == first
+        assert state["image_scans"] == 1 and not state["sbom_scans"]
+        assert security_scanner.newly_vulnerable() == []
+
+        # New DB: every known image is re-scanned from its SBOM, never from its layers
+        state["db"] = "v2"
+        summary = security_scanner.reevaluate_known_images()
+        assert summary["evaluated"] == 1 and state["sbom_scans"] == ["sha256:app"]
+        assert state["image_scans"] == 1
+        [image] = summary["newly_vulnerable"]
+        assert image["previous_db_version"] == "v1"
+        assert [v["id"] for v in image["new"]] == ["CVE-2"]
+
+        # Already evaluated against v2: skipped, the diff is still reported, report scans hit the cache
+        summary = security_scanner.reevaluate_known_images()
+        assert summary["skipped"] == 1 and len(state["sbom_scans"]) == 1
+        assert [v["id"] for v in security_scanner.newly_vulnerable()[0]["new"]] == ["CVE-2"]
+        security_scanner.scan_image("app:1", digest="sha256:app")
+        assert len(state["sbom_scans"]) == 1 and state["image_scans"] == 1
+    finally:
+        for (module, name), value in originals.items():
+            setattr(module, name, value)
+    print("✅ SBOM re-evaluation passed")
+
+if __name__ == "__main__":
+    test_static_results_keep_only_db_independent_findings()
+    test_db_update_reevaluates_from_sbom()
@@ -0,0 +1,124 @@
+import sys
+import os
+import subprocess
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import security_scanner
+from app.core.trivy_server import TrivyTimeoutError
+from app.core.analyzers.security_analyzer import analyze_dockerfile_security
+from app.core.report import report_builder
+
+def test_failed_config_scan_is_not_cached_as_clean():
+    print("Testing failed Dockerfile config scans...")
+    calls = []
+
+    def failing_run(cmd, **kwargs):
+        calls.append(cmd)
+        raise subprocess.TimeoutExpired(cmd, kwargs.get("timeout"))
+
+    original = security_scanner.subprocess.run
+    security_scanner.subprocess.run = failing_run
+    try:
+        try:
+            security_scanner.scan_dockerfile("FROM alpine\n")
+            assert False, "expected a RuntimeError"
+        except RuntimeError:
+            pass
+
+        result = analyze_dockerfile_security("FROM alpine\n")
+        assert result["status"] == "error" and result["total_vulnerabilities"] == 0
+
+        # The static report's security stage keeps only successful scans: the next report retries
+        def no_ai(on_event, stream_ai):
+            def optimize(context, dockerfile):
+                raise RuntimeError("AI disabled in tests")
+            return optimize
+
+        original_ai = report_builder._ai_call
+        report_builder._ai_call = no_ai
+        try:
+            for _ in range(2):
+                report = report_builder.build_static_report("FROM busybox\nRUN echo hi\n")
+                assert report["security_analysis"]["status"] == "error"
+        finally:
+            report_builder._ai_call = original_ai
+        assert len(calls) == 4
+    finally:
+        security_scanner.subprocess.run = original
+    print("✅ Failed Dockerfile config scans passed")
+
+class FakeServer:
+    url = "http://trivy:4954"
+
+    def __init__(self, healthy):
+        self.healthy = healthy
+        self.marked = False
+
+    def client_url(self):
+        return None if self.marked else self.url
+
+    def is_healthy(self):
+        return self.healthy
+
+    def mark_unhealthy(self):
+        self.marked = True
+
+def test_client_mode_falls_back_only_when_server_is_down():
+    print("Testing Trivy client-mode fallback...")
+    calls = []
+    failure = {}
+
+    def run(cmd, **kwargs):
+        calls.append("--server" in cmd)
+        raise failure["error"](cmd)
+
+    originals = (security_scanner.subprocess.run, security_scanner.get_trivy_server)
+    security_scanner.subprocess.run = run
+    try:
+        # A bad image on a healthy server: one failure, no standalone re-run, server left alone
+        server = FakeServer(healthy=True)
+        security_scanner.get_trivy_server = lambda: server
+        failure["error"] = lambda cmd: subprocess.CalledProcessError(1, cmd)
+        try:
+            security_scanner._run_image_scan("missing:latest")
+            assert False, "expected a RuntimeError"
+        except RuntimeError:
+            pass
+        assert calls == [True] and not server.marked
+
+        # Timed out: the budget is spent, so no second 60s run either
+        calls.clear()
+        failure["error"] = lambda cmd: subprocess.TimeoutExpired(cmd, 60)
+        try:
+            security_scanner._run_image_scan("huge:latest")
+            assert False, "expected TrivyTimeoutError"
+        except TrivyTimeoutError:
+            pass
+        assert calls == [True] and not server.marked
+
+        # Server unreachable: marked for the supervisor and the scan re-run standalone
+        calls.clear()
+        server.healthy = False
+        failure["error"] = lambda cmd: subprocess.CalledProcessError(1, cmd)
+        try:
+            security_scanner._run_image_scan("app:1")
+        except RuntimeError:
+            pass
+        assert calls == [True, False] and server.marked
+
+        # trivy not installed at all: a controlled error, not a FileNotFoundError
+        calls.clear()
+        security_scanner.get_trivy_server = lambda: None
+        failure["error"] = lambda cmd: FileNotFoundError("trivy")
+        try:
+            security_scanner._run_image_scan("app:1")
+            assert False, "expected a RuntimeError"
+        except RuntimeError as e:
+            assert not isinstance(e, TrivyTimeoutError)
+        assert calls == [False]
+    finally:
+        security_scanner.subprocess.run, security_scanner.get_trivy_server = originals
+    print("✅ Trivy client-mode fallback passed")
+
+if __name__ == "__main__":
+    test_failed_config_scan_is_not_cached_as_clean()
+    test_client_mode_falls_back_only_when_server_is_down()
@@ -0,0 +1,162 @@
+import sys
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.core import trivy_server
+from app.core.trivy_server import TrivyServer
+
+class HealthStandIn(BaseHTTPRequestHandler):
+    healthy = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        status = 200 if self.path == "/healthz" and HealthStandIn.healthy else 503
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class FakeProcess:
+    """A `trivy server` process that runs until killed, or until the test makes it exit."""
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+    def terminate(self):
+        self.returncode = -15
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def _fast_supervisor():
+    originals = (trivy_server.HEALTH_CHECK_INTERVAL, trivy_server.TRIVY_SERVER_STARTUP_TIMEOUT,
+                 trivy_server.STARTUP_PROBE_INTERVAL)
+    trivy_server.HEALTH_CHECK_INTERVAL = 0.02
+    trivy_server.TRIVY_SERVER_STARTUP_TIMEOUT = 0.1
+    trivy_server.STARTUP_PROBE_INTERVAL = 0.02
+    def restore():
+        (trivy_server.HEALTH_CHECK_INTERVAL, trivy_server.TRIVY_SERVER_STARTUP_TIMEOUT,
+         trivy_server.STARTUP_PROBE_INTERVAL) = originals
+    return restore
+
+def _managed_server():
+    server = TrivyServer(listen="127.0.0.1:1")
+    server.processes = []
+    server.healthy = True
+
+    def start():
+        server.processes.append(FakeProcess())
+        server._proc = server.processes[-1]
+
+    server._start_process = start
+    server.is_healthy = lambda: server.healthy and server._proc is not None and server._proc.poll() is None
+    return server
+
+def test_external_server_follows_health_endpoint():
+    print("Testing external Trivy server health...")
+    restore = _fast_supervisor()
+    http = ThreadingHTTPServer(("127.0.0.1", 0), HealthStandIn)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_address[1]}"
+    server = TrivyServer(url=url)
+    try:
+        HealthStandIn.healthy = True
+        assert server.is_healthy()
+        server.client_url()
+        assert _wait_for(lambda: server.client_url() == url)
+
+        # An external server is never started or restarted by us, only followed
+        HealthStandIn.healthy = False
+        assert _wait_for(lambda: server.client_url() is None)
+        HealthStandIn.healthy = True
+        assert _wait_for(lambda: server.client_url() == url)
+        assert server._proc is None
+    finally:
+        server.stop()
+        http.shutdown()
+        HealthStandIn.healthy = True
+        restore()
+    print("✅ External Trivy server health passed")
+
+def test_managed_server_restarts_when_it_dies():
+    print("Testing Trivy server supervisor restarts...")
+    restore = _fast_supervisor()
+    server = _managed_server()
+    try:
+        server.client_url()
+        assert _wait_for(lambda: server.client_url() == server.url)
+        assert len(server.processes) == 1
+
+        # Process exits: the supervisor notices on its next check and starts a new one
+        server.processes[0].returncode = 1
+        assert _wait_for(lambda: len(server.processes) == 2)
+        assert _wait_for(lambda: server.client_url() == server.url)
+
+        # Still running but no longer answering: killed and replaced
+        server.healthy = False
+        assert _wait_for(lambda: server.client_url() is None)
+        server._restart_backoff = 0.05
+        assert _wait_for(lambda: server.processes[1].returncode == -9)
+        server.healthy = True
+        assert _wait_for(lambda: server.client_url() == server.url)
+        assert len(server.processes) >= 3
+    finally:
+        server.stop()
+        restore()
+    assert server.client_url() is None
+    assert all(p.returncode is not None for p in server.processes)
+    print("✅ Trivy server supervisor restarts passed")
+
+def test_failed_start_backs_off():
+    print("Testing Trivy server start backoff...")
+    restore = _fast_supervisor()
+    server = _managed_server()
+    server.healthy = False
+    server._restart_backoff = 0.05
+    try:
+        server.client_url()
+        assert _wait_for(lambda: len(server.processes) >= 2)
+        # Each failed start doubles the wait before the next one, up to the cap
+        assert server._restart_backoff >= 0.1
+        assert server.client_url() is None
+        server.healthy = True
+        assert _wait_for(lambda: server.client_url() == server.url)
+        assert server._restart_backoff == 5.0
+    finally:
+        server.stop()
+        restore()
+    print("✅ Trivy server start backoff passed")
+
+def test_disabled_modes():
+    print("Testing Trivy server modes...")
+    originals = (trivy_server.TRIVY_SERVER_MODE, trivy_server.TRIVY_SERVER_URL)
+    try:
+        trivy_server.TRIVY_SERVER_MODE = "off"
+        assert trivy_server.get_trivy_server() is None
+        trivy_server.TRIVY_SERVER_MODE, trivy_server.TRIVY_SERVER_URL = "external", None
+        assert trivy_server.get_trivy_server() is None
+    finally:
+        trivy_server.TRIVY_SERVER_MODE, trivy_server.TRIVY_SERVER_URL = originals
+    print("✅ Trivy server modes passed")
+
+if __name__ == "__main__":
+    test_external_server_follows_health_endpoint()
+    test_managed_server_restarts_when_it_dies()
+    test_failed_start_backs_off()
+    test_disabled_modes()